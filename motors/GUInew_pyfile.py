@@ -5,6 +5,9 @@ import tkinter as tk
 from PIL import Image, ImageTk, ImageDraw
 from io import BytesIO
 import movement as mvt
+from motionqueue import MotionExecutor
+from legs import moveArguments
+from tracing import traced
 
 class ChessGameGUI:
     def __init__(self, root):
@@ -29,6 +32,9 @@ class ChessGameGUI:
         # Coordinates of the origin based on the zero position
         origin = (1,2+9/16) # x,y inches
         self.realBoard = mvt.realBoard(origin)
+
+        # Physical moves run on a worker thread so the GUI stays responsive
+        self.motion = MotionExecutor(self.realBoard, self.root)
     
     def create_extra_images(self):
         def rgba(a,b,c,d):
@@ -84,6 +90,7 @@ class ChessGameGUI:
         for piece in ['p', 'n', 'b', 'r', 'q', 'k']:
             self.piece_images[piece] = Image.open(f"../pieces/PNG/black/{piece}.png")
 
+    @traced(category="gui")
     def draw_board(self):
         for row in range(8):
             for col in range(8):
@@ -92,6 +99,7 @@ class ChessGameGUI:
 
         self.update_board()
 
+    @traced(category="gui")
     def update_board(self):
         self.canvas.delete("pieces")
         self.canvas.delete("check")
@@ -113,6 +121,7 @@ class ChessGameGUI:
                     if square == king_square:
                         self.canvas.create_image(x,y,image = self.checkImage, tag = "check")
 
+    @traced(category="gui")
     def handle_click(self, event):
         file = event.x // self.square_size
         rank = 7 - (event.y // self.square_size)
@@ -121,6 +130,7 @@ class ChessGameGUI:
         if self.dragged_piece is None or (self.dragged_piece.color != self.board.turn):
             self.start_pos = None
 
+    @traced(category="gui")
     def handle_drag(self, event):
         if self.start_pos is not None:
             #Show valid moves with a dot or capture image
@@ -148,33 +158,49 @@ class ChessGameGUI:
             self.canvas.create_image(x, y, image=img_tk, tag="dragged_piece")
             self.canvas.image = img_tk
 
+    @traced(category="gui")
     def handle_release(self, event):
         if self.start_pos is not None:
             file = event.x // self.square_size
             rank = 7 - (event.y // self.square_size)
             end_pos = chess.square(file, rank)
             move = chess.Move(self.start_pos, end_pos)
+            if chess.Move(self.start_pos, end_pos, promotion=chess.QUEEN) in self.board.legal_moves:
+                move = chess.Move(self.start_pos, end_pos, promotion=chess.QUEEN) # always promote to a queen
             movingPiece = self.board.piece_at(self.start_pos).symbol()
             isCapture = self.board.is_capture(move)
-            if move in self.board.legal_moves:
+            if move in self.board.legal_moves and self.motion.full():
+                print("Board is still busy, move ignored")
+            elif move in self.board.legal_moves:
                 #print(self.start_pos, end_pos) #DEBUGGING
                 #print(isCapture) #DEBUGGING
                 #print(move)
                 print(movingPiece)
-                capturedPiece = None
-                if (isCapture):
-                    capturedPiece = self.board.piece_at(end_pos).symbol()
-                    
+                # The gantry routes around the pieces as they stand before the move
+                args, kwargs = moveArguments(self.board, move)
+
                 # Move piece on digital board, then physical board
                 self.board.push(move)
-                print("Debugging:", self.start_pos, end_pos, isCapture, capturedPiece)
-                self.realBoard.movePiece(self.start_pos, end_pos, movingPiece, isCapture, capturedPiece)
+                print("Debugging:", self.start_pos, end_pos, isCapture, args[4])
+                handle = self.motion.movePiece(*args, **kwargs)
+                handle.whenDone(self.handle_move_done)
             self.start_pos = None
             self.dragged_piece = None
             self.canvas.delete("dots")
             self.canvas.delete("capture")
             self.update_board()
 
+    @traced(category="gui")
+    def handle_move_done(self, handle):
+        # Runs on the Tk thread once the gantry has finished (or failed) a move
+        if handle.cancelled():
+            print(f"{handle.label} cancelled")
+        elif handle.exception() is not None:
+            print(f"{handle.label} failed: {handle.exception()}")
+        elif self.motion.pending() == 0:
+            # Wait for the next move over where it will probably start
+            self.motion.parkFor(self.board)
+
 #def main():
 #    return None
 
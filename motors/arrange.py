@@ -0,0 +1,178 @@
+import numpy as np
+import chess
+from bank import BANK_SIZE
+
+################
+# Setting up a whole position (a reset after a game, or a puzzle FEN).
+#
+#   1. Assignment: pieces of the same symbol are interchangeable, so for every symbol
+#      the physical pieces (on the board or in the bank) are matched to the target
+#      squares by a min-cost assignment (Hungarian algorithm) over a motor-time cost
+#      matrix. Pieces that aren't needed go back to the bank.
+#   2. Ordering: a piece can only move once its target square is empty. Moves whose
+#      target is free are done greedily, nearest pickup first. If every remaining move
+#      waits on another one (a cycle, e.g. two pieces swapping squares), one piece is
+#      parked in the bank to break it.
+################
+
+def pieceMap(position):
+    """
+    {square: symbol} of a position given as a chess.Board, a FEN or a dict
+    """
+    if isinstance(position, str):
+        position = chess.Board(position)
+    if isinstance(position, chess.BaseBoard):
+        return {sq: piece.symbol() for sq, piece in position.piece_map().items()}
+    return dict(position)
+
+
+def travelTimes(board, fromIndices, toIndices):
+    """
+    Motor time (s) of a straight move between every pair of squares / bank slots.
+    Outputs: (len(fromIndices) x len(toIndices)) array
+    """
+    a = board.squareCoords[np.asarray(fromIndices, dtype=int) + BANK_SIZE]
+    b = board.squareCoords[np.asarray(toIndices, dtype=int) + BANK_SIZE]
+    dx = b[None, :, 0] - a[:, None, 0]
+    dy = b[None, :, 1] - a[:, None, 1]
+    m = board.coreXY((dx*board.stepsPerInch, dy*board.stepsPerInch))
+    return np.max(np.abs(m), axis=0)/board.profile.vMax
+
+
+def assign(cost):
+    """
+    Minimum-cost assignment of rows to columns (Hungarian algorithm, shortest
+    augmenting paths with potentials, O(n^2 m)).
+    Inputs:
+        cost = (n x m) array
+    Outputs:
+        cols = int array, cols[i] is the column given to row i (-1 if there are more rows than columns)
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.shape[0] > cost.shape[1]:
+        rows = assign(cost.T)
+        cols = np.full(cost.shape[0], -1)
+        cols[rows] = np.arange(cost.shape[1])
+        return cols
+
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)   # p[j] = row (1-based) holding column j, 0 = none
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            cur = np.full(m + 1, np.inf)
+            cur[1:] = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv)
+            minv[better] = cur[better]
+            way[better] = j0
+            j1 = int(np.argmin(np.where(free, minv, np.inf)))
+            delta = minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.full(n, -1)
+    for j in range(1, m + 1):
+        if p[j]:
+            cols[p[j] - 1] = j - 1
+    return cols
+
+
+def planSetup(board, current, target):
+    """
+    Works out which physical piece goes where, and in which order.
+    Inputs:
+        board = realBoard (geometry, motion profile and piece bank)
+        current = what's physically on the board now (chess.Board, FEN or {square: symbol}).
+            Pieces in board.bank are used as well.
+        target = position to set up (chess.Board, FEN or {square: symbol})
+    Outputs:
+        moves = ordered list of (fromIndex, toIndex, symbol). Indices are squares or bank slots.
+        missing = {square: symbol} of target pieces there is no physical piece for
+    """
+    onBoard = pieceMap(current)
+    wanted = pieceMap(target)
+    bank = board.bank.copy()
+
+    #----- 1. Assignment, one symbol at a time
+    jobs = []     # (fromIndex, toIndex or None = bank)
+    missing = {}
+    for symbol in sorted(set(onBoard.values()) | set(bank.contents.values()) | set(wanted.values())):
+        sources = [sq for sq, sym in onBoard.items() if sym == symbol] + list(bank.stored.get(symbol, []))
+        targets = [sq for sq, sym in wanted.items() if sym == symbol]
+        spare = max(0, len(sources) - len(targets))
+        if len(sources) == 0:
+            missing.update({sq: symbol for sq in targets})
+            continue
+        cost = np.zeros((len(sources), len(targets) + spare))
+        if len(targets):
+            cost[:, :len(targets)] = travelTimes(board, sources, targets)
+        # Going back to the bank costs the trip to its nearest slot (nothing if already there)
+        colour = bank.colourOf(symbol)
+        toBank = np.array([0.0 if not 0 <= sq < 64 else bank.travel[colour][sq].min() for sq in sources])
+        cost[:, len(targets):] = toBank[:, None]
+        cols = assign(cost)
+        for i, j in enumerate(cols):
+            if j < 0:
+                continue
+            if j < len(targets):
+                if sources[i] != targets[j]:
+                    jobs.append([sources[i], targets[j], symbol])
+            elif 0 <= sources[i] < 64:
+                jobs.append([sources[i], None, symbol])
+        for j in range(len(targets)):
+            if j not in cols:
+                missing[targets[j]] = symbol
+
+    #----- 2. Ordering
+    occupied = set(onBoard)
+    here = np.array([board.currentX, board.currentY])
+    moves = []
+    while jobs:
+        ready = [job for job in jobs if job[1] is None or job[1] not in occupied]
+        parking = len(ready) == 0
+        if parking:
+            # Every move waits on another: park the piece nearest to the gantry
+            ready = [job for job in jobs if 0 <= job[0] < 64]
+        pickups = board.squareCoords[np.array([job[0] for job in ready]) + BANK_SIZE]
+        d = pickups - here
+        m = board.coreXY((d[:, 0], d[:, 1]))
+        job = ready[int(np.argmin(np.max(np.abs(m), axis=0)))]
+
+        src, dst, symbol = job
+        if parking or dst is None:
+            slot = bank.store(symbol, src)
+            moves.append((src, slot, symbol))
+            occupied.discard(src)
+            if parking:
+                job[0] = slot
+            else:
+                jobs.remove(job)
+            here = board.squareCoords[slot + BANK_SIZE]
+            continue
+        if not 0 <= src < 64:
+            bank.release(src)
+        moves.append((src, dst, symbol))
+        occupied.discard(src)
+        occupied.add(dst)
+        jobs.remove(job)
+        here = board.squareCoords[dst + BANK_SIZE]
+    return moves, missing
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from motionqueue import MotionExecutor
+
+class AsyncRealBoard():
+    ################
+    # asyncio front-end for a realBoard.
+    #
+    # Every operation is handed to a single hardware worker (a MotionExecutor), so
+    # the gantry still only ever does one thing at a time, and awaited from the
+    # event loop. That lets one loop serve network I/O, clocks and the board
+    # without a thread per request.
+    #   - Backpressure: at most maxPending operations are queued. Further callers
+    #     wait (asynchronously) for a free slot instead of piling up.
+    #   - Cancellation: cancelling an awaiting task drops the operation if it hasn't
+    #     started yet, or brings the pulse train to a stop if it has (the motors brake
+    #     along the rest of the path, see realBoard.runCompiled).
+    #     Every operation gets its own abort event, so a late cancel can never stop
+    #     the operation after it.
+    ################
+
+    def __init__(self, board, maxPending = 4):
+        """
+        Inputs:
+            board = realBoard (owned by the hardware worker from now on)
+            maxPending = operations allowed to wait for the gantry at once
+        """
+        s = self
+        s.board = board
+        s.executor = MotionExecutor(board, maxsize=maxPending)
+        s.slots = None
+        s.maxPending = maxPending
+
+    async def _run(self, fn, *args, label = None, **kwargs):
+        s = self
+        if s.slots is None:
+            # Created lazily so it belongs to the running loop
+            s.slots = asyncio.Semaphore(s.maxPending)
+        async with s.slots:
+            abort = threading.Event()
+            handle = s.executor.submit(s._guarded, abort, fn, *args, label=label, **kwargs)
+            try:
+                return await asyncio.wrap_future(handle)
+            except asyncio.CancelledError:
+                if not handle.cancel() and not handle.done():
+                    # Already on the gantry: abort the pulse train and wait for it to stop
+                    abort.set()
+                    try:
+                        await asyncio.shield(asyncio.wrap_future(handle))
+                    except Exception:
+                        pass
+                raise
+
+    def _guarded(self, abort, fn, *args, **kwargs):
+        """
+        Runs on the worker: hands the job its own abort event while it runs.
+        """
+        s = self
+        s.board.stopEvent = abort
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            s.board.stopEvent = None
+
+    #----- Awaitable operations
+    async def move_piece(self, startSquare, endSquare, movingPiece, isCapture = False, capturedPiece = None, **kwargs):
+        """
+        Awaitable realBoard.movePiece (keyword options like occupied, capturedSquare
+        and promotion are passed through)
+        """
+        return await self._run(self.board.movePiece, startSquare, endSquare, movingPiece, \
+            isCapture, capturedPiece, label=f"move_piece {startSquare}->{endSquare}", **kwargs)
+
+    def estimate_duration(self, move, board):
+        """
+        realBoard.estimateDuration: how long a chess move (chess.Move, played in the
+        chess.Board board) would take on the gantry, in microseconds, with a per-leg
+        breakdown. Doesn't wait for the gantry: it plans on copies of the gantry position
+        and the piece bank (taken under the bank's lock), so it's safe to call while the
+        worker moves pieces.
+        """
+        return self.board.estimateDuration(move, board)
+
+    async def move_to_square(self, square):
+        """
+        Awaitable realBoard.moveToSquare
+        """
+        return await self._run(self.board.moveToSquare, square, label=f"move_to_square {square}")
+
+    async def setup_position(self, fen, current):
+        """
+        Awaitable realBoard.setupPosition
+        """
+        return await self._run(self.board.setupPosition, fen, current, label="setup_position")
+
+    async def home(self):
+        """
+        Awaitable realBoard.calibrate
+        """
+        return await self._run(self.board.calibrate, label="home")
+
+    async def magnet(self, on):
+        """
+        Turns the electromagnet on (True) or off (False), in order with the queued moves
+        """
+        fn = self.board.turnMagnetOn if on else self.board.turnMagnetOff
+        return await self._run(fn, label=f"magnet {'on' if on else 'off'}")
+
+    async def close(self):
+        """
+        Cancels anything still queued, waits for the current operation and stops the worker
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
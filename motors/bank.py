@@ -0,0 +1,213 @@
+import threading
+import numpy as np
+
+################
+# Piece bank layout.
+#
+# Square indices 0-63 are the board. Captured pieces are stored off the board:
+#   - white's bank: indices -1 to -16
+#   - black's bank: indices 64 to 79
+# Each colour takes the first 16 cells of its preference list that the gantry can
+# reach (see bankLayout):
+#   - white: files -1 and -2 to the left (rank 0 to 7, nearest file first), then the
+#     row below the board (rank -1), then the row above it (rank 8)
+#   - black: files 8 and 9 to the right, then the row above the board, then the row below
+# With the board far enough from the limit switches (origin x more than 1.5 squares
+# past the switch clearance, see realBoard) every slot is in the side files. Closer in, as
+# with the GUI's origin, the unreachable side cells are skipped and the bank spills
+# into the rows above and below the board.
+################
+
+BANK_SIZE = 16
+WHITE_SLOTS = list(range(-1, -BANK_SIZE - 1, -1))
+BLACK_SLOTS = list(range(64, 64 + BANK_SIZE))
+ALL_INDICES = list(range(-BANK_SIZE, 64 + BANK_SIZE)) # every index getSquareCoords knows
+
+def squareCell(index):
+    """
+    (file, rank) of a board square (0-63), or the preferred cell of a bank slot
+    (negative = white, > 63 = black). The board's actual bank cells are in realBoard.cells.
+    """
+    if 0 <= index < 64:
+        return (index % 8, index // 8)
+    if -BANK_SIZE <= index < 0:
+        k = -index - 1
+        return (-1 - k // 8, k % 8)
+    if 64 <= index < 64 + BANK_SIZE:
+        k = index - 64
+        return (8 + k // 8, k % 8)
+    raise ValueError(f"{index} is neither a board square nor a bank slot")
+
+def bankLayout(reachable):
+    """
+    Places the bank slots on cells the gantry can reach.
+    Inputs:
+        reachable = function(file, rank) -> True if the gantry can reach that cell's center
+    Outputs:
+        {index: (file, rank)} for every board square and bank slot (ALL_INDICES)
+    Raises ValueError if there are fewer than BANK_SIZE reachable cells for a colour.
+    """
+    below = [(f, -1) for f in range(-2, 10)]
+    above = [(f, 8) for f in range(-2, 10)]
+    preferences = {True: [squareCell(i) for i in WHITE_SLOTS] + below + above, \
+                   False: [squareCell(i) for i in BLACK_SLOTS] + above[::-1] + below[::-1]}
+    slots = {True: WHITE_SLOTS, False: BLACK_SLOTS}
+    cells = {index: squareCell(index) for index in range(64)}
+    taken = set()
+    chosen = {True: [], False: []}
+
+    #----- Both colours pick in turn, one stage of their list at a time, so black's
+    # side files and row come before white's overflow into them (and vice versa)
+    for stage in (slice(0, BANK_SIZE), slice(BANK_SIZE, BANK_SIZE + 12), slice(BANK_SIZE + 12, None)):
+        for colour in (True, False):
+            for cell in preferences[colour][stage]:
+                if len(chosen[colour]) < BANK_SIZE and cell not in taken and reachable(*cell):
+                    chosen[colour].append(cell)
+                    taken.add(cell)
+
+    for colour in (True, False):
+        if len(chosen[colour]) < BANK_SIZE:
+            name = "white" if colour else "black"
+            raise ValueError(f"Only {len(chosen[colour])} reachable cells for the {name} piece bank, " \
+                             f"{BANK_SIZE} needed: move the board origin away from the limit switches")
+        cells.update(zip(slots[colour], chosen[colour]))
+    return cells
+
+
+class PieceBank():
+    ################
+    # Keeps track of which bank slot holds which captured piece.
+    #   - free[colour] is a boolean mask of that colour's empty slots
+    #   - stored[symbol] lists the slots holding that piece (e.g. "q"), so a promotion can
+    #     find a captured queen in O(1)
+    #   - travel[colour] is a precomputed (64 x 16) table of motor time from every board
+    #     square to every slot, so the nearest free slot is one masked argmin
+    # Changes and copies hold s.lock, so another thread (an estimate, a prefetch) can
+    # take a consistent copy() while the motion worker moves pieces in and out.
+    ################
+
+    def __init__(self, board):
+        """
+        Inputs:
+            board = realBoard (for square coordinates and motor timing)
+        """
+        s = self
+        s.board = board
+        s.slots = {True: np.array(WHITE_SLOTS), False: np.array(BLACK_SLOTS)}
+        s.travel = {}
+        squares = board.squareCoords[BANK_SIZE:BANK_SIZE + 64]
+        for colour, slots in s.slots.items():
+            bank = board.squareCoords[slots + BANK_SIZE]
+            dx = bank[None, :, 0] - squares[:, None, 0]
+            dy = bank[None, :, 1] - squares[:, None, 1]
+            m = board.coreXY((dx*board.stepsPerInch, dy*board.stepsPerInch))
+            s.travel[colour] = np.max(np.abs(m), axis=0)/board.profile.vMax
+        s.lock = threading.RLock()
+        s.clear()
+
+    def clear(self):
+        """
+        Empties both banks
+        """
+        s = self
+        with s.lock:
+            s.free = {True: np.ones(BANK_SIZE, dtype=bool), False: np.ones(BANK_SIZE, dtype=bool)}
+            s.contents = {}
+            s.stored = {}
+
+    @staticmethod
+    def colourOf(symbol):
+        # Same convention as chess: uppercase is white
+        return symbol.isupper()
+
+    def store(self, symbol, fromSquare):
+        """
+        Reserves the free slot nearest (in motor time) to fromSquare for a captured piece.
+        Inputs:
+            symbol = captured piece's symbol (uppercase = white)
+            fromSquare = board square (0-63) the piece is coming from
+        Outputs:
+            slot index
+        """
+        s = self
+        colour = s.colourOf(symbol)
+        with s.lock:
+            free = s.free[colour]
+            if not free.any():
+                raise RuntimeError(f"{'White' if colour else 'Black'}'s piece bank is full")
+            k = int(np.argmin(np.where(free, s.travel[colour][fromSquare], np.inf)))
+            slot = int(s.slots[colour][k])
+            s.put(slot, symbol)
+        return slot
+
+    def put(self, slot, symbol):
+        """
+        Records a piece in a given (free) slot
+        """
+        s = self
+        colour = s.colourOf(symbol)
+        with s.lock:
+            s.free[colour][s.slotNumber(slot)] = False
+            s.contents[slot] = symbol
+            s.stored.setdefault(symbol, []).append(slot)
+
+    def release(self, slot):
+        """
+        Records that the piece in a given slot has been taken out
+        Outputs:
+            symbol of the piece that was there
+        """
+        s = self
+        with s.lock:
+            symbol = s.contents.pop(slot)
+            s.stored[symbol].remove(slot)
+            s.free[slot < 0][s.slotNumber(slot)] = True
+        return symbol
+
+    @staticmethod
+    def slotNumber(slot):
+        # Position of a slot within its colour's bank (0-15)
+        return -slot - 1 if slot < 0 else slot - 64
+
+    def copy(self):
+        """
+        Independent copy of the bank's contents (the travel table is shared), for planning
+        """
+        s = self
+        other = PieceBank.__new__(PieceBank)
+        other.board = s.board
+        other.slots = s.slots
+        other.travel = s.travel
+        other.lock = threading.RLock()
+        with s.lock:
+            other.free = {colour: free.copy() for colour, free in s.free.items()}
+            other.contents = dict(s.contents)
+            other.stored = {symbol: list(slots) for symbol, slots in s.stored.items()}
+        return other
+
+    def find(self, symbol):
+        """
+        Slot holding a captured piece of this symbol, or None
+        """
+        slots = self.stored.get(symbol)
+        return slots[-1] if slots else None
+
+    def take(self, symbol):
+        """
+        Removes a piece of this symbol from the bank (e.g. for a promotion).
+        Outputs:
+            the slot it was in, or None if there isn't one
+        """
+        s = self
+        with s.lock:
+            slot = s.find(symbol)
+            if slot is None:
+                return None
+            s.release(slot)
+        return slot
+
+    def occupiedSlots(self):
+        """
+        Indices of every slot holding a piece (for routing around them)
+        """
+        return list(self.contents.copy())  # copy: the GUI thread may ask while the worker moves pieces
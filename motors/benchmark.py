@@ -0,0 +1,193 @@
+import sys
+import json
+import time
+import contextlib
+import argparse
+import numpy as np
+import chess
+import chess.pgn
+from movement import realBoard
+from pins import SimDriver
+from simclock import SimClock
+from validate import InvalidPlan
+from legs import moveArguments
+from tracing import tracer
+
+################
+# Physical move benchmark.
+#
+# Replays PGN games through realBoard.movePiece on the simulated gantry (pins.SimDriver
+# on a simclock.SimClock), so a game takes a fraction of a second, and measures every
+# move from the simulated pulse log:
+#   gantryS      = physical time of the move (virtual clock)
+#   magnetOnS    = time spent carrying pieces
+#   emptyIn      = distance travelled with the magnet off (inches)
+#   carryIn      = distance travelled with the magnet on (inches)
+#   steps        = step pulses sent to each motor
+#   computeMs    = real time movePiece spent routing, planning and compiling
+# plus per-game totals and p50/p95/max over every move, as JSON. The settings are
+# echoed in inches and seconds, like the command line options.
+#
+#   python benchmark.py games.pgn [more.pgn ...] --max-games 100 -o before.json
+#
+# Without -o the JSON is the only thing on stdout; messages go to stderr.
+#
+# Every game starts from its first position with an empty piece bank, the gantry
+# wherever the previous game left it.
+################
+
+GUI_ORIGIN = (1, 2 + 9/16) # x,y inches, as set up in GUInew_pyfile.py
+
+def measure(board, sim, t0, magnetStart):
+    """
+    Metrics of everything in the pulse log since the clock read t0 (ns)
+    Inputs:
+        magnetStart = magnet state at t0
+    """
+    times, pins, values = sim.pulses()
+    isMag = pins == board.magPin
+    isL, isR = pins == board.STEP_1, pins == board.STEP_2
+
+    #----- Magnet-on time: intervals between magnet changes, starting from magnetStart
+    edges = np.concatenate(([t0], times[isMag], [board.clock.now()]))
+    states = np.concatenate(([magnetStart], values[isMag].astype(bool)))
+    spans = np.diff(edges)
+    magnetOn = spans[states].sum()
+
+    #----- Travel: position after every tick, split by the magnet state at that tick
+    steps = np.where(values > 0, 1, -1)
+    dl = np.cumsum(np.where(isL, steps, 0))
+    dr = np.cumsum(np.where(isR, steps, 0))
+    magnet = states[np.cumsum(isMag)]
+    ticks = np.flatnonzero(isL | isR)
+    last = ticks[np.append(times[ticks][1:] != times[ticks][:-1], True)] # both motors pulse on one tick
+    x = -(dl[last] + dr[last])/2*board.inchPerStep # relative to the position at t0
+    y = (dr[last] - dl[last])/2*board.inchPerStep
+    d = np.hypot(np.diff(x, prepend=0.0), np.diff(y, prepend=0.0))
+    carried = magnet[last]
+    return {"gantryS": (board.clock.now() - t0)/1e9, "magnetOnS": magnetOn/1e9, \
+            "emptyIn": float(d[~carried].sum()), "carryIn": float(d[carried].sum()), \
+            "steps": {"left": int(isL.sum()), "right": int(isR.sum())}}
+
+
+def percentiles(values):
+    if len(values) == 0:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0, "mean": 0.0}
+    values = np.asarray(values)
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)), \
+            "max": float(values.max()), "mean": float(values.mean())}
+
+
+def runGame(board, sim, game, keepMoves = True):
+    """
+    Plays one game on the simulated board. Outputs: the game's report (dictionary)
+    """
+    position = game.board()
+    board.bank.clear()
+    moves = []
+    error = None
+    for move in game.mainline_moves():
+        args, kwargs = moveArguments(position, move)
+        san = position.san(move)
+        sim.clearLog()
+        t0 = board.clock.now()
+        wall = time.perf_counter()
+        try:
+            board.movePiece(*args, **kwargs)
+        except (InvalidPlan, RuntimeError) as e:
+            error = {"ply": len(moves), "san": san, "error": str(e)}
+            break
+        stats = measure(board, sim, t0, False)
+        stats["computeMs"] = (time.perf_counter() - wall)*1e3
+        stats["san"] = san
+        moves.append(stats)
+        position.push(move)
+
+    report = {"headers": {k: game.headers.get(k, "?") for k in ("Event", "White", "Black", "Result")}, \
+              "plies": len(moves), "error": error}
+    for metric in ("gantryS", "magnetOnS", "emptyIn", "carryIn", "computeMs"):
+        report[metric] = float(sum(m[metric] for m in moves))
+    report["steps"] = {motor: sum(m["steps"][motor] for m in moves) for motor in ("left", "right")}
+    if keepMoves:
+        report["moves"] = moves
+    return report, [m["gantryS"] for m in moves]
+
+
+def benchmark(pgnPaths, maxGames = None, keepMoves = True, **boardArgs):
+    """
+    Benchmarks every game of the PGN files. boardArgs go to realBoard (motion profile, etc.)
+    Outputs: the report (dictionary, see the top of this file)
+    """
+    boardArgs.setdefault("routeCacheFile", None)
+    sim = SimDriver()
+    board = realBoard(boardArgs.pop("origin", GUI_ORIGIN), stateFile=None, warmStart=False, \
+                      pins=sim, clock=SimClock(), **boardArgs)
+    games = []
+    latencies = []
+    wall = time.perf_counter()
+    for path in pgnPaths:
+        with open(path) as f:
+            while maxGames is None or len(games) < maxGames:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                report, moveTimes = runGame(board, sim, game, keepMoves)
+                report["file"] = path
+                games.append(report)
+                latencies += moveTimes
+
+    board.routeCache.save()
+
+    # In the units realBoard and the command line take (inches, seconds)
+    prof = board.profile
+    perInch = board.stepsPerInch
+    return {"settings": {"shape": prof.shape, "maxVelocity": prof.vMax/perInch, \
+                         "acceleration": prof.accel/perInch, "jerk": prof.jerk/perInch, \
+                         "startVelocity": prof.vStart/perInch, "stepsPerInch": perInch, \
+                         "settle": board.pipeline.settle, "origin": [board.xOrigin, board.yOrigin], \
+                         "squareSize": board.squareSize}, \
+            "summary": {"games": len(games), "moves": len(latencies), \
+                        "failedGames": sum(g["error"] is not None for g in games), \
+                        "gantryS": float(sum(latencies)), \
+                        "magnetOnS": float(sum(g["magnetOnS"] for g in games)), \
+                        "emptyIn": float(sum(g["emptyIn"] for g in games)), \
+                        "carryIn": float(sum(g["carryIn"] for g in games)), \
+                        "steps": {motor: sum(g["steps"][motor] for g in games) for motor in ("left", "right")}, \
+                        "moveGantryS": percentiles(latencies), \
+                        "gameGantryS": percentiles([g["gantryS"] for g in games]), \
+                        "wallS": time.perf_counter() - wall, \
+                        "routeCache": board.routeCache.stats()}, \
+            "games": games}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays PGN games on the simulated gantry and reports physical move times as JSON")
+    parser.add_argument("pgn", nargs="+", help="PGN files")
+    parser.add_argument("--max-games", type=int, default=None)
+    parser.add_argument("--profile", default="trapezoid", choices=("constant", "trapezoid", "scurve"))
+    parser.add_argument("--max-velocity", type=float, default=6.0, help="inches/s")
+    parser.add_argument("--acceleration", type=float, default=20.0, help="inches/s^2")
+    parser.add_argument("--jerk", type=float, default=400.0, help="inches/s^3")
+    parser.add_argument("--route-cache", default=None, help="route cache file prefix (default: none, every route is compiled)")
+    parser.add_argument("--summary-only", action="store_true", help="leave out the per-move reports")
+    parser.add_argument("-o", "--output", default=None, help="JSON file (default: stdout)")
+    parser.add_argument("--trace", default=None, help="also write a Chrome trace of every span (see tracing.py)")
+    options = parser.parse_args()
+
+    if options.trace is not None:
+        tracer.enable()
+
+    # Anything the board prints on the way is a diagnostic: keep stdout for the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = benchmark(options.pgn, options.max_games, not options.summary_only, \
+                           motionProfile=options.profile, maxVelocity=options.max_velocity, \
+                           acceleration=options.acceleration, jerk=options.jerk, \
+                           routeCacheFile=options.route_cache)
+    if options.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=1)
+    if options.trace is not None:
+        tracer.export(options.trace)
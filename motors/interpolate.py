@@ -0,0 +1,34 @@
+import numpy as np
+
+def lineSteps(lSteps, rSteps):
+    """
+    Two-axis line interpolator (Bresenham / DDA) for the coreXY motors.
+    Inputs:
+        lSteps: # of left-motor steps (sign is ignored)
+        rSteps: # of right-motor steps (sign is ignored)
+    Outputs:
+        (lMask, rMask): two boolean numpy arrays of length max(|lSteps|, |rSteps|).
+            - lMask[i] is True if the left motor should pulse on tick i
+            - rMask[i] is True if the right motor should pulse on tick i
+
+    The motor with the most steps (the "major" motor) pulses on every tick, and the
+    other motor's pulses are spread as evenly as possible between them, so the
+    gantry moves along a straight line in max(|lSteps|, |rSteps|) pulse periods.
+    """
+    a = abs(int(lSteps))
+    b = abs(int(rSteps))
+    n = max(a, b)
+    if n == 0:
+        empty = np.zeros(0, dtype=bool)
+        return empty, empty
+
+    #----- Error-accumulator form of Bresenham, evaluated for every tick at once.
+    # Motor with count c has taken floor((i*c + n/2)/n) steps after tick i,
+    # so it pulses on tick i whenever that number goes up.
+    ticks = np.arange(n + 1, dtype=np.int64)
+    half = n//2
+    lTaken = (ticks*a + half)//n
+    rTaken = (ticks*b + half)//n
+    lMask = np.diff(lTaken) > 0
+    rMask = np.diff(rTaken) > 0
+    return lMask, rMask
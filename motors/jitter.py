@@ -0,0 +1,111 @@
+import numpy as np
+
+class JitterRecorder():
+    ################
+    # Pulse timing recorder for StepExecutor (opt-in, see realBoard's jitter input).
+    #
+    # Every tick, the executor hands over its deadline and the time the STEP edge
+    # actually went out (both perf_counter_ns). They go into preallocated numpy ring
+    # buffers, so recording never allocates; once full, the oldest ticks are overwritten.
+    # Each pulse train gets a number, so periods are only measured within one train.
+    #
+    #   lateness     = edge - deadline
+    #   period error = (edge gap to the previous tick) - (deadline gap), i.e. how much
+    #                  longer (or shorter) a step period came out than planned
+    #   missed       = ticks later than missTolerance
+    #   stall        = the largest period error: the longest the motors went without
+    #                  the pulse they were due
+    ################
+
+    def __init__(self, capacity = 1 << 16, missTolerance = 0.00005):
+        """
+        Inputs:
+            capacity = ticks kept (the most recent ones)
+            missTolerance = lateness (s) above which a tick counts as a missed deadline
+        """
+        s = self
+        s.capacity = capacity
+        s.missNs = int(missTolerance*1e9)
+        s.deadlines = np.zeros(capacity, dtype=np.int64)
+        s.edges = np.zeros(capacity, dtype=np.int64)
+        s.trains = np.zeros(capacity, dtype=np.int64)
+        s.reset()
+
+    def reset(self):
+        s = self
+        s.count = 0   # ticks recorded since the reset (including overwritten ones)
+        s.train = 0
+
+    def startTrain(self):
+        self.train += 1
+
+    def record(self, deadline, edge):
+        s = self
+        i = s.count % s.capacity
+        s.deadlines[i] = deadline
+        s.edges[i] = edge
+        s.trains[i] = s.train
+        s.count += 1
+
+    #----- Analysis (after the move)
+    def arrays(self):
+        """
+        The recorded ticks, oldest first: deadlines, edges (ns) and train numbers
+        """
+        s = self
+        n = min(s.count, s.capacity)
+        order = (np.arange(n) + s.count - n) % s.capacity
+        return s.deadlines[order], s.edges[order], s.trains[order]
+
+    def periodErrors(self):
+        """
+        Period error (ns) of every tick that follows another tick of the same train
+        """
+        deadlines, edges, trains = self.arrays()
+        same = trains[1:] == trains[:-1]
+        return (np.diff(edges) - np.diff(deadlines))[same]
+
+    def histogram(self, bins = 50, limit = None):
+        """
+        Histogram of the period errors.
+        Inputs:
+            bins = number of bins
+            limit = bins cover -limit..limit microseconds (None = the full range)
+        Outputs: counts, bin edges (us)
+        """
+        errors = self.periodErrors()/1e3
+        if limit is None:
+            return np.histogram(errors, bins=bins)
+        return np.histogram(np.clip(errors, -limit, limit), bins=bins, range=(-limit, limit))
+
+    def report(self, bins = 20, limit = 100):
+        """
+        Summary of the recorded ticks (times in microseconds)
+        """
+        s = self
+        deadlines, edges, trains = s.arrays()
+        late = edges - deadlines
+        errors = s.periodErrors()
+        counts, binEdges = s.histogram(bins, limit)
+        out = {"ticks": int(s.count), "kept": int(len(late)), "trains": int(len(np.unique(trains))), \
+               "missed": int((late > s.missNs).sum()), "missToleranceUs": s.missNs/1e3, \
+               "lateUs": {"mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}, \
+               "periodErrorUs": {"mean": 0.0, "std": 0.0, "p99": 0.0}, \
+               "longestStallUs": 0.0, \
+               "histogram": {"counts": counts.tolist(), "edgesUs": binEdges.tolist()}}
+        if len(late):
+            out["lateUs"] = {"mean": float(late.mean()/1e3), "p50": float(np.percentile(late, 50)/1e3), \
+                             "p99": float(np.percentile(late, 99)/1e3), "max": float(late.max()/1e3)}
+        if len(errors):
+            out["periodErrorUs"] = {"mean": float(errors.mean()/1e3), "std": float(errors.std()/1e3), \
+                                    "p99": float(np.percentile(np.abs(errors), 99)/1e3)}
+            out["longestStallUs"] = float(max(errors.max(), 0)/1e3)
+        return out
+
+    def dump(self, path):
+        """
+        Saves the recorded ticks (oldest first) to a .npz file for offline analysis
+        """
+        deadlines, edges, trains = self.arrays()
+        np.savez_compressed(path, deadlines=deadlines, edges=edges, trains=trains, \
+                            missToleranceNs=self.missNs, ticks=self.count)
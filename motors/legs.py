@@ -0,0 +1,99 @@
+import chess
+
+################
+# From a chess move to the carries that play it.
+#
+# A leg is one magnet-on carry: (fromIndex, toIndex, symbol), with squares or bank
+# slots as indices (see bank.py). A move is one to four legs:
+#   - a capture first takes the captured piece to the nearest free bank slot
+#     (for en passant, from the square behind the end square)
+#   - the moving piece itself
+#   - castling: the rook
+#   - a promotion: the pawn goes to the bank and a piece of the new kind, if one was
+#     captured earlier, comes out of it
+# realBoard.movePiece, estimateDuration, validate and the benchmark all build their legs
+# here, so they agree on what a move does. The legs are in a valid order, not the
+# quickest one: sequencing.sequence reorders them.
+################
+
+def moveArguments(position, move):
+    """
+    realBoard.movePiece arguments for a chess move.
+    Inputs:
+        position = chess.Board before the move
+        move = chess.Move
+    Outputs: (args, kwargs)
+    """
+    isCapture = position.is_capture(move)
+    capturedPiece = None
+    capturedSquare = None
+    if isCapture:
+        # En passant captures a pawn that isn't on the end square
+        capturedSquare = move.to_square
+        if position.is_en_passant(move):
+            capturedSquare = chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square))
+        capturedPiece = position.piece_at(capturedSquare).symbol()
+    castlingRook = None
+    if position.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if position.is_kingside_castling(move):
+            castlingRook = (chess.square(7, rank), chess.square(5, rank))
+        else:
+            castlingRook = (chess.square(0, rank), chess.square(3, rank))
+    promotion = None
+    if move.promotion is not None:
+        promotion = chess.Piece(move.promotion, position.turn).symbol()
+    args = (move.from_square, move.to_square, position.piece_at(move.from_square).symbol(), \
+            isCapture, capturedPiece)
+    kwargs = {"occupied": position.occupied, "capturedSquare": capturedSquare, \
+              "promotion": promotion, "castlingRook": castlingRook}
+    return args, kwargs
+
+
+def pieceLegs(bank, startSquare, endSquare, movingPiece, isCapture, capturedPiece, \
+    capturedSquare = None, promotion = None, castlingRook = None, warn = False):
+    """
+    The legs of a move, reserving (and for promotions taking) bank slots in bank.
+    Inputs:
+        bank = PieceBank to reserve slots in (a copy, unless the move is really being played)
+        the rest = as in realBoard.movePiece
+        warn = print a message when the promoted piece isn't in the bank
+    Outputs: list of legs
+    """
+    legs = []
+    if isCapture:
+        # The captured piece goes to the nearest free bank slot
+        if capturedSquare is None:
+            capturedSquare = endSquare
+        slot = bank.store(capturedPiece, capturedSquare)
+        legs.append((capturedSquare, slot, capturedPiece))
+
+    legs.append((startSquare, endSquare, movingPiece))
+
+    if castlingRook is not None:
+        rook = "R" if movingPiece.isupper() else "r"
+        legs.append((castlingRook[0], castlingRook[1], rook))
+
+    if promotion is not None:
+        # Reserve the pawn's slot first so it can't be the one the new piece leaves
+        pawnSlot = bank.store(movingPiece, endSquare)
+        slot = bank.take(promotion)
+        if slot is None:
+            bank.release(pawnSlot)
+            if warn:
+                print(f"No {promotion} in the piece bank, swap the pawn on square {endSquare} by hand")
+        else:
+            legs.append((endSquare, pawnSlot, movingPiece))
+            legs.append((slot, endSquare, promotion))
+    return legs
+
+
+def moveLegs(position, move, bank):
+    """
+    The legs of a chess move, reserving bank slots in bank (see pieceLegs).
+    Inputs:
+        position = chess.Board before the move
+    """
+    args, kwargs = moveArguments(position, move)
+    del kwargs["occupied"]
+    return pieceLegs(bank, *args, **kwargs)
@@ -0,0 +1,259 @@
+import queue
+import threading
+from concurrent.futures import Future
+from parking import parkingSquare
+
+class MoveHandle(Future):
+    """
+    Future returned by MotionExecutor.submit. On top of the normal Future API:
+        progress = latest (fraction, label) reported by the job
+        whenProgress(cb) / whenDone(cb) = callbacks that run on the Tk thread
+            (or right away on the worker thread if the executor has no Tk root)
+    """
+    def __init__(self, executor, label):
+        super().__init__()
+        self.executor = executor
+        self.label = label
+        self.progress = (0.0, "queued")
+        self._progressCallbacks = []
+
+    def whenProgress(self, cb):
+        """
+        cb(handle, fraction, label) is called every time the job reports progress
+        """
+        self._progressCallbacks.append(cb)
+
+    def whenDone(self, cb):
+        """
+        cb(handle) is called once the job finishes, fails or is cancelled
+        """
+        self.add_done_callback(lambda f: self.executor._post(cb, f))
+
+    def _setProgress(self, fraction, label):
+        self.progress = (fraction, label)
+        for cb in self._progressCallbacks:
+            self.executor._post(cb, self, fraction, label)
+
+
+class MotionExecutor():
+    ################
+    # Owns a realBoard and runs every physical move on one worker thread.
+    #
+    # The GUI submits moves onto a bounded queue and gets a MoveHandle back straight
+    # away, so the Tk event loop never blocks on the gantry. Completion and progress
+    # callbacks are handed back to the Tk thread through root.after() polling
+    # (Tk isn't thread safe, so the worker never touches widgets itself).
+    #
+    # While idle the gantry can be parked where the next move will probably start
+    # (see parking.py). A park is only a guess, so any real job submitted after it
+    # cancels it, or stops it mid-way.
+    ################
+
+    def __init__(self, board, root = None, maxsize = 4, pollMs = 20):
+        """
+        Inputs:
+            board = realBoard. Once handed over, only the worker thread should use it.
+            root = Tk root used to run callbacks on the GUI thread (None = run on the worker)
+            maxsize = how many moves can wait in the queue
+            pollMs = how often the Tk thread checks for finished callbacks (ms)
+        """
+        s = self
+        s.board = board
+        s.root = root
+        s.pollMs = pollMs
+        s.jobs = queue.Queue(maxsize)
+        s.callbacks = queue.SimpleQueue()
+        s.current = None
+        s.parking = None
+        s.idle = True
+        s.running = True
+        s.worker = threading.Thread(target=s._work, name="motion", daemon=True)
+        s.worker.start()
+        if root is not None:
+            root.after(pollMs, s._drain)
+
+    #----- Submitting work
+    def full(self):
+        """
+        True if a new job would not fit in the queue
+        """
+        return self.jobs.full()
+
+    def pending(self):
+        """
+        Number of jobs waiting or running
+        """
+        return self.jobs.qsize() + (1 if self.current is not None else 0)
+
+    def submit(self, fn, *args, label = None, block = False, timeout = None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) to run on the worker thread.
+        While it runs, the board's progressHook reports into the returned handle.
+        Inputs:
+            label = name for the job (defaults to fn's name)
+            block, timeout = as in queue.Queue.put. With block=False a full queue raises queue.Full.
+        Outputs:
+            MoveHandle
+        """
+        s = self
+        if not s.running:
+            raise RuntimeError("MotionExecutor has been shut down")
+        handle = MoveHandle(s, label or getattr(fn, "__name__", "job"))
+        s.cancelPark()
+        s.jobs.put((handle, fn, args, kwargs), block, timeout)
+        return handle
+
+    def movePiece(self, startSquare, endSquare, movingPiece, isCapture, capturedPiece, **kwargs):
+        """
+        Queues realBoard.movePiece. Same inputs; returns a MoveHandle.
+        If the gantry is busy, the move's carries between board squares (the piece and a
+        castling rook, not capture or promotion legs) are compiled in the meantime (see pipeline.py).
+        """
+        s = self
+        busy = s.pending() > 0
+        handle = s.submit(s.board.movePiece, startSquare, endSquare, movingPiece, \
+            isCapture, capturedPiece, label=f"movePiece {startSquare}->{endSquare}", **kwargs)
+        pipeline = getattr(s.board, "pipeline", None)
+        if busy and pipeline is not None:
+            legs = [(startSquare, endSquare, movingPiece)]
+            rook = kwargs.get("castlingRook")
+            if rook is not None:
+                legs.append((rook[0], rook[1], "R" if movingPiece.isupper() else "r"))
+            occupied = kwargs.get("occupied")
+            if occupied is not None:
+                occupied = s.board.withBank(occupied)
+            pipeline.prefetch(legs, occupied)
+        return handle
+
+    def park(self, square):
+        """
+        Parks the gantry over a square while idle. Cancelled by the next submit.
+        Outputs: MoveHandle (None if the gantry is busy)
+        """
+        return self._startPark(self._park, square, label=f"park {square}")
+
+    def parkFor(self, position, ponder = None):
+        """
+        Parks the gantry where the next move in position will most likely start.
+        The square is picked on the worker thread, which owns the board and its bank.
+        Inputs:
+            position = chess.Board with the side to move about to play (copied, so the
+                caller can keep playing on it)
+            ponder = optional chess.Move an engine expects to be played next
+        Outputs: MoveHandle (None if the gantry is busy)
+        """
+        s = self
+        return s._startPark(s._parkFor, position.copy(stack=False), ponder, label="park for next move")
+
+    def cancelPark(self):
+        """
+        Drops a park that hasn't started, or brings one that has to a stop (the motors
+        brake along its path, see realBoard.runCompiled)
+        """
+        s = self
+        handle = s.parking
+        if handle is not None and not handle.cancel() and not handle.done():
+            handle.stop.set()
+        s.parking = None
+
+    def _startPark(self, fn, *args, label):
+        # Every park gets its own stop Event, so stopping a late one can't stop the next
+        s = self
+        if s.pending() > 0:
+            return None
+        stop = threading.Event()
+        handle = s.submit(fn, stop, *args, label=label)
+        handle.stop = stop
+        s.parking = handle
+        return handle
+
+    def shutdown(self, wait = True):
+        """
+        Cancels everything still queued and stops the worker after the current job.
+        """
+        s = self
+        s.running = False
+        while True:
+            try:
+                handle = s.jobs.get_nowait()[0]
+            except queue.Empty:
+                break
+            handle.cancel()
+        s.jobs.put(None)
+        if wait:
+            s.worker.join()
+
+    #----- Worker side
+    def _work(self):
+        s = self
+        while True:
+            job = s.jobs.get()
+            if job is None:
+                break
+            handle, fn, args, kwargs = job
+            if not handle.set_running_or_notify_cancel():
+                continue
+            if s.idle:
+                s._saveState(busy=True)
+                s.idle = False
+            s.current = handle
+            handle._setProgress(0.0, "running")
+            s.board.progressHook = handle._setProgress
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                handle.set_exception(e)
+            else:
+                handle._setProgress(1.0, "done")
+                handle.set_result(result)
+            finally:
+                s.board.progressHook = None
+                s.current = None
+            if s.jobs.empty():
+                # Nothing else to do: persist the position (see realBoard.saveState)
+                s._saveState()
+                s.idle = True
+
+    def _park(self, stop, square):
+        s = self
+        if not s.jobs.empty() or stop.is_set():
+            return None
+        s.board.stopEvent = stop
+        try:
+            s.board.moveToSquare(square)
+        except RuntimeError:
+            # Stopped by a real job (MoveAborted): the position is still up to date
+            if not stop.is_set():
+                raise
+        finally:
+            s.board.stopEvent = None
+
+    def _parkFor(self, stop, position, ponder):
+        square = parkingSquare(self.board, position, ponder)
+        if square is None:
+            return None
+        return self._park(stop, square)
+
+    def _saveState(self, busy = False):
+        try:
+            self.board.saveState(busy)
+        except OSError as e:
+            print(f"Could not save board state: {e}")
+
+    #----- Handing callbacks back to the GUI thread
+    def _post(self, cb, *args):
+        if self.root is None:
+            cb(*args)
+        else:
+            self.callbacks.put((cb, args))
+
+    def _drain(self):
+        s = self
+        while True:
+            try:
+                cb, args = s.callbacks.get_nowait()
+            except queue.Empty:
+                break
+            cb(*args)
+        if s.running or not s.callbacks.empty():
+            s.root.after(s.pollMs, s._drain)
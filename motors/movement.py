@@ -1,8 +1,30 @@
-from gpiozero import Button
-from time import sleep
-import RPi.GPIO as GPIO
+import os
+import json
+import atexit
 import numpy as np
 import threading
+from profiles import MotionProfile
+from planner import Planner
+from stepper import StepExecutor
+from routing import Router
+from bank import PieceBank, bankLayout, ALL_INDICES, BANK_SIZE
+from arrange import planSetup, pieceMap
+from sequencing import sequence
+from routecache import RouteCache
+from legs import pieceLegs, moveLegs
+from pipeline import LegPipeline
+from validate import validateLegs, InvalidPlan
+from pins import RPiDriver
+from simclock import WallClock
+from tracing import traced, span
+
+class MoveAborted(RuntimeError):
+    """
+    Raised when a move is stopped part way through (see realBoard.stopEvent).
+    The gantry position is still up to date with the steps that were made,
+    including the braking ramp.
+    """
+    pass
 
 class realBoard():
     ################
@@ -23,11 +45,20 @@ class realBoard():
     # and any dimension in "steps" works in the coreXY plane.
     ################
 
-    currentX = None #inches
-    currentY = None #inches
+    motorSteps = None #authoritative position: numpy int64 (left, right) motor steps from zero
+    stepResidual = np.zeros(2) #rounding error carried between relative moves (steps)
     zeroX    = None
     zeroY    = None
 
+    # Optional function(fraction, label) told how far along the current move is
+    # (set by MotionExecutor, see motionqueue.py)
+    progressHook = None
+
+    # Optional threading.Event: when set, the pulse train in progress ramps down to a
+    # stop along its path and the move raises MoveAborted (set by AsyncRealBoard, see
+    # asyncboard.py, and by MotionExecutor's parks)
+    stopEvent = None
+
     #----- Set left motor (1) variables
     DIR_1 = 23       # RaspPi pin attached to DIR on motor 1
     STEP_1 = 24      # RaspPi pin attached to STEP on motor 1
@@ -44,18 +75,29 @@ class realBoard():
 
     # Configure electromagnet pin
     magPin = 26
+
+    # Closest the gantry is allowed to a limit switch outside of homing (inches)
+    switchClearance = 0.25
     
     #----- General Variables
-    CW  = GPIO.HIGH  # Clockwise rotation
-    CCW = GPIO.LOW   # Counter-clockwise rotation
+    CW  = 1  # Clockwise rotation (GPIO.HIGH)
+    CCW = 0  # Counter-clockwise rotation (GPIO.LOW)
     
     
     def __init__(self, origin, squareSize = 1.75, beltPitch = 2, \
-        teethPerRev = 20, stepsPerRev = 1600, motDelay = 0.0001):
+        teethPerRev = 20, stepsPerRev = 1600, motDelay = 0.0001, \
+        motionProfile = "trapezoid", maxVelocity = 6.0, acceleration = 20.0, \
+        jerk = 400.0, startVelocity = 1.0, realtime = False, \
+        stateFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "board_state.json"), \
+        warmStart = True, \
+        routeCacheFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "route_cache"), \
+        debug = False, pins = None, clock = None, jitter = None):
         """
         Initializes a real board object. 
         Inputs: 
             origin =  tuple in the form (x,y) marking the real-world coordinates of the bottom-left edge of the board relative to the zeroed point (inches)
+                - The piece bank takes the reachable cells around the board (see bank.py):
+                  there must be 16 per colour, or a ValueError is raised
             squareSize = edge length of a square on the board (inches)
             beltPitch = distance between belt teeth (in MILLIMETERS)
             teethPerRev = number of teeth per full motor revolution
@@ -63,10 +105,33 @@ class realBoard():
             motDelay = # of seconds to wait between motor impulses.
                 - Reducing this number increases motor speed, but also increases
                   the risk of skipping steps.
+                - Only used by the "constant" motion profile.
+            motionProfile = "constant", "trapezoid" or "scurve" (see profiles.py)
+            maxVelocity = cruise speed of the busiest motor (inches/s)
+            acceleration = maximum acceleration (inches/s^2)
+            jerk = maximum jerk (inches/s^3), used by the "scurve" profile
+            startVelocity = speed moves start and stop at (inches/s)
+            realtime = if True, pulses are generated by a dedicated stepping process
+                (see rtstepper.py) instead of on the calling thread
+            stateFile = where the last idle position and calibration are saved (None = don't)
+            warmStart = if True and stateFile holds a trustworthy position, only check it
+                with one limit switch touch instead of running a full calibration
+            routeCacheFile = file prefix where compiled routes are kept between runs
+                (see routecache.py, None = keep them in memory only)
+            debug = print every leg, square and position along the way
+            pins = pin driver (see pins.py). Defaults to RPiDriver, the real hardware;
+                SimDriver runs the whole board against a simulated gantry.
+            clock = clock every pulse deadline and pause is timed on (see simclock.py).
+                Defaults to WallClock; with a SimClock (simulation only) moves take no
+                real time and clock.now() tells how long they would have taken.
+            jitter = optional jitter.JitterRecorder that every pulse's timing is recorded
+                into (see jitterReport). Not available with realtime = True.
 
         Sets the dimensions of the board so that the chessToReal function can do its job
         """
         s = self
+        s.debug = debug
+        s.clock = WallClock() if clock is None else clock
         s.squareSize = squareSize #inches
         motDelay = 0.00025
         s.motDelay   = motDelay
@@ -78,6 +143,16 @@ class realBoard():
         s.inchPerStep = 1/s.stepsPerInch
         print(s.inchPerStep*25.4*1600, "mm per revolution")
 
+        #----- Set motion profile
+        if motionProfile == "constant":
+            # One step every 2*motDelay seconds, from standstill to standstill
+            maxVelocity = 1/(2*s.motDelay)/s.stepsPerInch
+            startVelocity = maxVelocity
+        s.profile = MotionProfile(s.stepsPerInch, maxVelocity, acceleration, \
+            jerk, startVelocity, motionProfile)
+        s.planner = Planner(s.profile)
+        s.brake = s.profile.brakeDelays() # how a stopped train ramps down (see runCompiled)
+
         s.xOrigin = origin[0] #inches
         s.yOrigin = origin[1] #inches
 
@@ -87,66 +162,317 @@ class realBoard():
         s.xHiBound = s.xOrigin+s.squareSize*10 - tolerance #inches
         s.yLoBound = s.yOrigin-s.squareSize*1  + tolerance #inches
         s.yHiBound = s.yOrigin+s.squareSize*9  - tolerance #inches
+        # The limit switches are at x = 0 and y = 0: nothing behind them can be reached
+        s.xLoBound = max(s.xLoBound, s.switchClearance)
+        s.yLoBound = max(s.yLoBound, s.switchClearance)
+
+        #----- Piece bank cells (see bank.py): the slots go where the gantry can reach
+        def reachable(col, rank):
+            x, y = s.cellCenter(col, rank)
+            return s.xLoBound < x < s.xHiBound and s.yLoBound < y < s.yHiBound
+        s.cells = bankLayout(reachable)
+
+        #----- Precompute the center of every square and bank slot
+        s.squareCoords = np.zeros((len(ALL_INDICES), 2))
+        for index in ALL_INDICES:
+            s.squareCoords[index + BANK_SIZE] = s.cellCenter(*s.cells[index])
 
-        #----- Set Raspberry Pi pins to GPIO ready
-        GPIO.setmode(GPIO.BCM)
+        #----- Piece routing (A* between the other pieces, see routing.py)
+        s.router = Router(s)
+        s.bank = PieceBank(s)
+
+        #----- Compiled route cache. Trains start from a square center, found by its motor steps
+        s.centerIndex = {tuple(s.inchesToSteps(x, y)): index \
+                         for index, (x, y) in zip(ALL_INDICES, s.squareCoords)}
+        prof = s.profile
+        settings = [s.stepsPerInch, s.xOrigin, s.yOrigin, s.squareSize, prof.shape, prof.vMax, \
+                    prof.accel, prof.jerk, prof.vStart, s.planner.maxJump, \
+                    s.xLoBound, s.xHiBound, s.yLoBound, s.yHiBound]
+        s.routeCache = RouteCache(path=routeCacheFile, settings=settings)
+
+        #----- Carries are compiled one leg ahead of the motors (see pipeline.py)
+        s.pipeline = LegPipeline(s)
+
+        #----- Set Raspberry Pi pins to GPIO ready (through the pin driver, see pins.py)
+        if pins is None:
+            pins = RPiDriver()
+        s.pins = pins
+        pins.attach(s)
 
         # Open encode mode
-        GPIO.setup(s.EN_1,GPIO.OUT)
-        GPIO.setup(s.EN_2,GPIO.OUT)
+        pins.setupOutput(s.EN_1)
+        pins.setupOutput(s.EN_2)
         
         # Deactivate
-        GPIO.output(s.EN_1,GPIO.HIGH)
-        GPIO.output(s.EN_2,GPIO.HIGH)
+        pins.output(s.EN_1, pins.HIGH)
+        pins.output(s.EN_2, pins.HIGH)
         
         # Configure direction and step pins as outputs
-        GPIO.setup(s.DIR_1,GPIO.OUT)
-        GPIO.setup(s.DIR_2,GPIO.OUT)
-        GPIO.setup(s.STEP_1, GPIO.OUT)
-        GPIO.setup(s.STEP_2,GPIO.OUT)
+        pins.setupOutput(s.DIR_1)
+        pins.setupOutput(s.DIR_2)
+        pins.setupOutput(s.STEP_1)
+        pins.setupOutput(s.STEP_2)
         
         # Set the direction and step pins to low
-        GPIO.output(s.DIR_1, GPIO.LOW)
-        GPIO.output(s.DIR_2,GPIO.LOW)
-        GPIO.output(s.STEP_1, GPIO.LOW)
-        GPIO.output(s.STEP_2,GPIO.LOW)
+        pins.output(s.DIR_1, pins.LOW)
+        pins.output(s.DIR_2, pins.LOW)
+        pins.output(s.STEP_1, pins.LOW)
+        pins.output(s.STEP_2, pins.LOW)
         
         # Reactivate
-        GPIO.output(s.EN_1,GPIO.LOW)
-        GPIO.output(s.EN_2,GPIO.LOW)
+        pins.output(s.EN_1, pins.LOW)
+        pins.output(s.EN_2, pins.LOW)
 
         #Configure limit switches
-        s.xLimitSwitch = Button(s.xSwitchPin)
-        s.yLimitSwitch = Button(s.ySwitchPin)
+        s.xLimitSwitch = pins.switch(s.xSwitchPin)
+        s.yLimitSwitch = pins.switch(s.ySwitchPin)
         
         #Configure magPin as output
-        GPIO.setup(s.magPin, GPIO.OUT)
+        pins.setupOutput(s.magPin)
+
+        #----- Pulse scheduler (deadline based, see stepper.py)
+        if realtime:
+            from rtstepper import RealtimeStepper
+            if s.clock.virtual:
+                raise ValueError("the realtime stepping process runs on real time only")
+            if jitter is not None:
+                raise ValueError("jitter recording isn't available in the realtime stepping process")
+            if pins.stepperFactory is None:
+                raise ValueError(f"{type(pins).__name__} can't drive the realtime stepping process")
+            s.stepper = RealtimeStepper((s.STEP_1, s.STEP_2), (s.DIR_1, s.DIR_2), \
+                outputFactory=pins.stepperFactory)
+            # The stepping process and its shared memory outlive the board otherwise
+            atexit.register(s.close)
+        else:
+            s.stepper = StepExecutor(pins.output, (s.STEP_1, s.STEP_2), \
+                (s.DIR_1, s.DIR_2), pins.HIGH, pins.LOW, clock=s.clock, \
+                player=getattr(pins, "playTrain", None))
+            s.stepper.recorder = jitter
+        s.jitter = jitter
         
         #----- Calibration
-        self.calibrate()
+        s.stateFile = stateFile
+        s.stateIdle = True # s.stateFile may hold an idle save: mark it busy before moving (see markBusy)
+        if warmStart and stateFile is not None and s.loadState() and s.verifyState():
+            print("Restored saved position")
+        else:
+            s.calibrate()
+        s.saveState()
         
     def calibrate(self):
         """
-        Calibrates the x axis, then the y axis.
+        Homes both axes (see home), then moves to the center of square a1.
         """
         s = self
-        
-        # Calibrate y first
-        while s.yLimitSwitch.is_pressed == False:
-            
-            s.moveSteps(s.coreXY((0,-1)))
-        s.zeroY = 0
-        s.currentY = 0
-        
-        # Calibrate x second
-        while s.xLimitSwitch.is_pressed == False:
-            s.moveSteps(s.coreXY((-1,0)))
-        s.zeroX = 0
-        s.currentX = 0
+        s.home()
 
         #Move Gantry to the center of square a1
         s.moveInches(s.getSquareCoords(0))
-    
+
+    @traced()
+    def home(self, fastVelocity = 2.0, slowVelocity = 0.2, backoff = 0.25):
+        """
+        Finds the zero point with the limit switches, in two passes:
+            1) fast approach: diagonally towards the (0,0) corner, which only turns the
+               left motor, until one switch closes, then along the other axis until
+               the second one closes
+            2) back off diagonally so both switches open again
+            3) slow approach, same path as 1), for a precise zero
+        The switches' edge callbacks (when_pressed) stop the pulse train the moment
+        they close, so each approach is one continuous move rather than a step-and-poll loop.
+        Inputs:
+            fastVelocity = speed of the first approach (inches/s)
+            slowVelocity = speed of the final approach (inches/s)
+            backoff = distance to back off between the passes (inches)
+        """
+        s = self
+        s.motorSteps = None
+        accel = s.profile.accel*s.inchPerStep
+        fast = MotionProfile(s.stepsPerInch, fastVelocity, accel, \
+            startVelocity=min(slowVelocity*2, fastVelocity))
+        slow = MotionProfile(s.stepsPerInch, slowVelocity, shape="constant")
+        switches = (s.xLimitSwitch, s.yLimitSwitch)
+
+        for profile in (fast, slow):
+            s.approachSwitch(profile, (-1, -1), switches)
+            if not s.yLimitSwitch.is_pressed:
+                s.approachSwitch(profile, (0, -1), (s.yLimitSwitch,))
+            if not s.xLimitSwitch.is_pressed:
+                s.approachSwitch(profile, (-1, 0), (s.xLimitSwitch,))
+
+            if profile is fast:
+                planner = Planner(slow)
+                planner.addSegment(*s.coreXY((backoff*s.stepsPerInch, backoff*s.stepsPerInch)))
+                s.runTrain(planner.compile())
+                if s.xLimitSwitch.is_pressed or s.yLimitSwitch.is_pressed:
+                    raise RuntimeError("Limit switch still pressed after backing off")
+
+        s.zeroX = 0
+        s.zeroY = 0
+        s.setPosition(0, 0)
+
+    def approachSwitch(self, profile, direction, switches, reach = None):
+        """
+        Moves in a cartesian direction until one of the given limit switches closes.
+        Inputs:
+            profile = MotionProfile to move with
+            direction = (x, y) direction, e.g. (-1, 0)
+            switches = limit switches (gpiozero Buttons, or see pins.py). The move stops on the first one that's pressed.
+            reach = furthest distance to look for the switch (inches).
+                Defaults to far enough to cross the whole gantry area.
+        Outputs:
+            (x, y) inches actually moved
+        """
+        s = self
+        if reach is None:
+            reach = max(s.xHiBound - s.xLoBound, s.yHiBound - s.yLoBound) + 2*s.squareSize
+        steps = s.coreXY((direction[0]*reach*s.stepsPerInch, direction[1]*reach*s.stepsPerInch))
+        made, pressed = s.moveUntil(profile, steps, switches)
+        if not pressed:
+            raise RuntimeError(f"No limit switch found moving in direction {direction}")
+        return s.inverseCoreXY(made)*s.inchPerStep
+
+    def moveUntil(self, profile, steps, switches):
+        """
+        Makes one straight move of 'steps' (left, right) motor steps, stopping on the tick
+        any of the given limit switches closes (via their when_pressed callbacks).
+        No boundary checking or position updating.
+        Outputs:
+            (motor steps actually made as a numpy array, True if a switch is pressed)
+        """
+        s = self
+        planner = Planner(profile)
+        planner.addSegment(*steps)
+        train = planner.compile()
+
+        hit = threading.Event()
+        done = 0
+        try:
+            for switch in switches:
+                switch.when_pressed = hit.set
+            if not any(switch.is_pressed for switch in switches):
+                done = s.runTrain(train, hit)
+        finally:
+            for switch in switches:
+                switch.when_pressed = None
+        made = np.array(train.netSteps(done), dtype=np.int64)
+        return made, any(switch.is_pressed for switch in switches)
+
+    #----- Persisted calibration
+    def saveState(self, busy = False):
+        """
+        Writes the current position and board geometry to s.stateFile, so the next
+        start can skip homing (see warmStart). Written atomically. When idle, also saves
+        the routes found since the last call.
+        Inputs:
+            busy = True marks the gantry as about to move: if the power goes before the
+                next idle save, the saved position can't be trusted.
+        Every pulse train marks the file busy first (see markBusy), so an idle save is
+        only good until the next move: save again once the gantry stops (MotionExecutor
+        does when its queue runs empty).
+        """
+        s = self
+        if not busy and s.routeCache.dirty:
+            # Only appends the routes found since the last save (see routecache.py)
+            s.routeCache.save()
+        if s.stateFile is None or s.motorSteps is None:
+            return None
+        state = {"motorSteps": [int(m) for m in s.motorSteps], "busy": busy, \
+                 "origin": [s.xOrigin, s.yOrigin], "squareSize": s.squareSize, \
+                 "stepsPerInch": s.stepsPerInch, \
+                 "bounds": [s.xLoBound, s.xHiBound, s.yLoBound, s.yHiBound]}
+        tmp = s.stateFile + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, s.stateFile)
+        s.stateIdle = not busy
+
+    def markBusy(self):
+        """
+        Called before every pulse train: if s.stateFile still holds an idle save, marks
+        it busy (or removes it while homing, when there is no position to save), so a
+        restart after a crash or power cut mid-move never trusts a position the gantry
+        has left. Only writes once per idle save, however many trains follow.
+        """
+        s = self
+        if not s.stateIdle or s.stateFile is None:
+            return None
+        try:
+            if s.motorSteps is None:
+                if os.path.exists(s.stateFile):
+                    os.remove(s.stateFile)
+                s.stateIdle = False
+            else:
+                s.saveState(busy=True)
+        except OSError as e:
+            print(f"Could not mark board state busy: {e}")
+
+    def loadState(self):
+        """
+        Reads s.stateFile. The saved position is only used if it was saved while idle
+        and the board geometry still matches.
+        Outputs:
+            True if the position was restored
+        """
+        s = self
+        try:
+            with open(s.stateFile) as f:
+                state = json.load(f)
+            saved = state["origin"] + [state["squareSize"], state["stepsPerInch"]] + state["bounds"]
+            motorSteps = np.array(state["motorSteps"], dtype=np.int64)
+            busy = state["busy"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        current = [s.xOrigin, s.yOrigin, s.squareSize, s.stepsPerInch, \
+                   s.xLoBound, s.xHiBound, s.yLoBound, s.yHiBound]
+        if busy or not np.allclose(saved, current):
+            return False
+        s.motorSteps = motorSteps
+        s.stepResidual = np.zeros(2)
+        s.zeroX = 0
+        s.zeroY = 0
+        return True
+
+    def verifyState(self, margin = 0.25, tolerance = 0.05, slowVelocity = 0.2):
+        """
+        Checks a restored position with one quick touch of the y limit switch:
+        move quickly to 'margin' inches above y = 0, then creep down. The switch has
+        to close within 'tolerance' of where we think zero is. On success y is re-zeroed
+        on the switch and the gantry goes back where it was.
+        Outputs:
+            True if the position checked out
+        """
+        s = self
+        x, y = s.currentX, s.currentY
+        if y < margin or s.yLimitSwitch.is_pressed:
+            return False
+        switches = (s.yLimitSwitch,)
+        accel = s.profile.accel*s.inchPerStep
+        fast = MotionProfile(s.stepsPerInch, s.profile.vMax*s.inchPerStep, accel, \
+            startVelocity=s.profile.vStart*s.inchPerStep)
+        slow = MotionProfile(s.stepsPerInch, slowVelocity, shape="constant")
+
+        #----- Quick move down, then creep onto the switch
+        made, pressed = s.moveUntil(fast, s.inchesToSteps(x, margin) - s.motorSteps, switches)
+        s.motorSteps = s.motorSteps + made
+        if pressed:
+            s.motorSteps = None
+            return False
+        try:
+            moved = s.approachSwitch(slow, (0, -1), switches, reach=margin + 2*tolerance)
+        except RuntimeError:
+            s.motorSteps = None
+            return False
+        if abs(margin + moved[1]) > tolerance:
+            s.motorSteps = None
+            return False
+
+        #----- Re-zero y on the switch and go back
+        s.setPosition(x, 0)
+        s.moveStepPath([s.inchesToSteps(x, y) - s.motorSteps])
+        return True
+
+    @traced()
     def moveSteps(self, coords):
         """
         Moves the motors a given number of steps. 
@@ -156,76 +482,62 @@ class realBoard():
                 coords[1] = # of right-motor steps
                 - ^^ These can be computed using the coreXY function
 
-        NOTE: this function can only move along cartesian x or y lines or along diagonals.
+        NOTE: any combination of left/right steps moves the gantry in a straight line.
         WARNING: there is no error checking or position updating written into this function to ensure no boundary crossing. 
             - Normally, the moveInches function should be called instead (this has error checking).
         """
         s = self
 
-        lSteps, rSteps = int(coords[0]), int(coords[1])
-        #----- Set driver output pins
-        if lSteps > 0:
-            GPIO.output(s.DIR_1, s.CW)
-        else:
-            GPIO.output(s.DIR_1, s.CCW)
-        if rSteps > 0:
-            GPIO.output(s.DIR_2, s.CW)
-        else:
-            GPIO.output(s.DIR_2, s.CCW)
-        
-        #----- Make move
-        if lSteps == 0:
-            if rSteps == 0:
-                #Neither moves
-                return None
-            else: 
-                #Right moves, left doesn't
-                for step in range(abs(rSteps)):
-                    GPIO.output(s.STEP_2, GPIO.HIGH)
-                    sleep(s.motDelay)
-                    GPIO.output(s.STEP_2, GPIO.LOW)
-                    sleep(s.motDelay)
-        elif rSteps == 0: 
-            #Left moves, right doesn't
-            for step in range(abs(lSteps)):
-                GPIO.output(s.STEP_1, GPIO.HIGH)
-                sleep(s.motDelay)
-                GPIO.output(s.STEP_1, GPIO.LOW)
-                sleep(s.motDelay)
-        elif abs(lSteps) != abs(rSteps):
-            #If unequal step dimensions, move sequentially. 
-            #Move the left motor first
-            for step in range(abs(lSteps)):
-                GPIO.output(s.STEP_1, GPIO.HIGH)
-                sleep(s.motDelay)
-                GPIO.output(s.STEP_1, GPIO.LOW)
-                sleep(s.motDelay)
-            #Then right motor second
-            for step in range(abs(rSteps)):
-                    GPIO.output(s.STEP_2, GPIO.HIGH)
-                    sleep(s.motDelay)
-                    GPIO.output(s.STEP_2, GPIO.LOW)
-                    sleep(s.motDelay)
-            
-                
-                #Old error catcher:
-            #raise NameError(f"Invalid Move: the function 'moveGantry' can only perform \
-            #                moves along the cartesian x or y directions, or along diagonals. \
-            #                Data: \
-            #                    currentX = {s.currentX} inches \
-            #                    currentY = {s.currentY} inches \
-            #                    Attempted to move {lSteps} steps left and \
-            #                                      {rSteps} steps right.")
+        s.planner.clear()
+        s.planner.addSegment(coords[0], coords[1])
+        s.runTrain(s.planner.compile())
+
+    @traced()
+    def runTrain(self, train, stop = None):
+        """
+        Sends a compiled StepTrain (see planner.py) to the motors.
+        Inputs:
+            train: StepTrain with the tick times, step masks and directions of both motors
+            stop: optional threading.Event that aborts the train after the current tick
+        Outputs:
+            number of ticks that were sent
+
+        Pulses are timed on absolute deadlines by s.stepper; s.stepper.stats() reports
+        how late they actually went out.
+        WARNING: like moveSteps, this does no boundary checking or position updating.
+        The state file is marked busy first (see markBusy).
+        """
+        s = self
+        s.markBusy()
+        return s.stepper.run(train, stop)
+
+    def jitterReport(self, dumpPath = None, reset = False):
+        """
+        Pulse timing report of the jitter recorder (see jitter.py), or None if recording is off.
+        Inputs:
+            dumpPath = optional .npz file to save the raw tick times to
+            reset = clear the recorder afterwards (e.g. to report move by move)
+        """
+        s = self
+        if s.jitter is None:
             return None
-        else:
-            #Make simultaneous move
-            for step in range(abs(lSteps)):
-                GPIO.output(s.STEP_1, GPIO.HIGH)
-                GPIO.output(s.STEP_2, GPIO.HIGH)
-                sleep(s.motDelay)
-                GPIO.output(s.STEP_1, GPIO.LOW)
-                GPIO.output(s.STEP_2, GPIO.LOW)
-                sleep(s.motDelay)
+        report = s.jitter.report()
+        if dumpPath is not None:
+            s.jitter.dump(dumpPath)
+        if reset:
+            s.jitter.reset()
+        return report
+
+    def close(self):
+        """
+        Stops the realtime stepping process and frees its shared memory (registered
+        with atexit when realtime = True). The board can't move afterwards.
+        """
+        s = self
+        close = getattr(s.stepper, "close", None)
+        if close is not None:
+            close()
+        s.stepper = None
 
     def coreXY(self, xy):
         """
@@ -248,7 +560,21 @@ class realBoard():
         m1 = -x - y
         m2 = -x + y
         return np.array([m1,m2])
+
+    def inverseCoreXY(self, m):
+        """
+        Inverse of coreXY: translates motor steps back to a cartesian move (in steps).
+        Inputs:
+            m: 2-element sequence with (left motor steps, right motor steps)
+        Outputs:
+            (x, y) numpy array
+        """
+        m1, m2 = m
+        x = -(m1 + m2)/2
+        y = (m2 - m1)/2
+        return np.array([x, y])
     
+    @traced()
     def moveInches(self, deltas):
         """ 
         Moves the gantry. 
@@ -256,69 +582,255 @@ class realBoard():
             deltas: 2 element tuple with:
             deltas[0]: delta x. inches in the x direction to move
             deltas[1]: delta y: inches in the y direction to move
+        """
+        self.movePath([deltas])
 
-        NOTE: this function can only move along cartesian x or y lines or along diagonals.
+    def movePath(self, path):
+        """
+        Moves the gantry along a multi-leg path as one continuous motion.
+        Inputs:
+            path: list of 2 element tuples (delta x, delta y) in inches, one per leg
+
+        Every leg is queued in the look-ahead planner, so the gantry only slows down
+        as much as each corner requires instead of stopping after every leg.
+        The whole path is checked against the boundaries before anything moves.
         """
-        #NOTE: this code must involve:
-            #1) checking to make sure the bounds haven't been exceeded. 
-            #2) updating self.currentX and self.currentY
-        
         s = self
 
-        delx = deltas[0]
-        dely = deltas[1]
-
-        #----- Confirm move remains in boundaries
-        newX = s.currentX + delx
-        newY = s.currentY + dely
-        b1 = newX < s.xHiBound
-        b2 = newY < s.yHiBound
-        b3 = newX > s.xLoBound
-        b4 = newY > s.yLoBound
-        if b1 and b2 and b3 and b4:
-            #Move gantry
+        #----- Convert to whole motor steps, carrying the rounding error to the next leg
+        # (error diffusion), so chains of relative moves don't drift.
+        residual = s.stepResidual.copy()
+        legs = []
+        for delx, dely in path:
             xStepsCoreXY = delx*s.stepsPerInch#*np.sqrt(2)
             yStepsCoreXY = dely*s.stepsPerInch#*np.sqrt(2)
-            move = s.coreXY((xStepsCoreXY, yStepsCoreXY))
-            print(move)
-            s.moveSteps(move)
+            exact = s.coreXY((xStepsCoreXY, yStepsCoreXY)) + residual
+            move = np.rint(exact)
+            residual = exact - move
+            legs.append(move.astype(np.int64))
+
+        s.moveStepPath(legs)
+        s.stepResidual = residual
+
+    def moveThrough(self, points):
+        """
+        Moves the gantry through a list of absolute waypoints as one continuous motion.
+        Inputs:
+            points: list of (x, y) absolute positions in inches, e.g. a route from s.router
+        """
+        s = self
+        steps = s.motorSteps
+        legs = []
+        for x, y in points:
+            target = s.inchesToSteps(x, y)
+            legs.append(target - steps)
+            steps = target
+        s.moveStepPath(legs)
+        s.stepResidual = np.zeros(2)
 
-            #Update gantry location
-            s.currentX = newX
-            s.currentY = newY
+    def pathDuration(self, points, start = None):
+        """
+        How long moveThrough(points) would take (s), from the same planner model, without moving.
+        Inputs:
+            points: list of (x, y) absolute waypoints in inches
+            start: (x, y) to start from. Defaults to the current position.
+        """
+        s = self
+        if start is None:
+            steps = s.motorSteps
         else:
-            raise RuntimeError(f"""Attempted to move outside of boundary. Data:
-            current X = {s.currentX}
-            current Y = {s.currentY}
+            steps = s.inchesToSteps(*start)
+        planner = Planner(s.profile, s.planner.maxJump)
+        for x, y in points:
+            target = s.inchesToSteps(x, y)
+            planner.addSegment(*(target - steps))
+            steps = target
+        planner.plan()
+        return planner.duration()
+
+    def moveStepPath(self, legs):
+        """
+        Moves the gantry along a multi-leg path given in whole motor steps.
+        Inputs:
+            legs: list of (left motor steps, right motor steps), one per leg
+
+        movePath, moveThrough and moveToSquare all end up here (or in runCompiled):
+        compileStepPath checks the boundaries, runCompiled updates the position.
+        """
+        #NOTE: this code must involve:
+            #1) checking to make sure the bounds haven't been exceeded. 
+            #2) updating self.motorSteps (currentX and currentY follow from it)
+
+        s = self
+        s.runCompiled(s.compileStepPath(legs))
+
+    def compileStepPath(self, legs, start = None):
+        """
+        Checks a multi-leg path against the boundaries and compiles it into one StepTrain.
+        Inputs:
+            legs: list of (left motor steps, right motor steps), one per leg
+            start: motor steps the path starts from (defaults to the current position)
+        """
+        s = self
+        start = s.motorSteps if start is None else np.asarray(start, dtype=np.int64)
+
+        #----- Confirm every waypoint remains in boundaries
+        steps = start.copy()
+        for move in legs:
+            steps = steps + move
+            newX, newY = s.stepsToInches(steps)
+            b1 = newX < s.xHiBound
+            b2 = newY < s.yHiBound
+            b3 = newX > s.xLoBound
+            b4 = newY > s.yLoBound
+            if not (b1 and b2 and b3 and b4):
+                delx, dely = s.inverseCoreXY(move)*s.inchPerStep
+                x, y = s.stepsToInches(start)
+                raise RuntimeError(f"""Attempted to move outside of boundary. Data:
+            current X = {x}
+            current Y = {y}
             Attempted delX = {delx}
             Attempted delY = {dely}""")
 
+        #----- Queue and compile (own planner: the pipeline compiles on other threads)
+        planner = Planner(s.profile, s.planner.maxJump)
+        for move in legs:
+            if s.debug:
+                print(move)
+            planner.addSegment(move[0], move[1])
+        return planner.compile()
+
+    @traced()
+    def runCompiled(self, train):
+        """
+        Sends a compiled StepTrain to the motors and updates the position.
+        If s.stopEvent gets set, the motors brake along the rest of the path (see
+        StepTrain.stoppingTail) and MoveAborted is raised, unless braking took them all
+        the way to the end.
+        """
+        s = self
+        done = s.runTrain(train, s.stopEvent)
+        made = np.array(train.netSteps(done), dtype=np.int64)
+        if done < len(train):
+            #----- Stopped: ramp down along the same path rather than halting at full speed
+            tail = train.stoppingTail(done, s.brake)
+            made = made + np.array(tail.netSteps(s.runTrain(tail)), dtype=np.int64)
+            done += len(tail)
+
+        #----- Update gantry location from the steps actually made
+        s.motorSteps = s.motorSteps + made
+        s.stepResidual = np.zeros(2)
+        if done < len(train):
+            raise MoveAborted(f"Move stopped after {done} of {len(train)} steps")
+
+    @traced()
+    def compileCarry(self, fromIndex, toIndex, symbol, occupied = None):
+        """
+        StepTrain from one square / bank slot center to another, from the route cache
+        if it's there (see routecache.py).
+        Inputs:
+            symbol = piece being carried, or None for a magnet-off hop (straight line)
+            occupied = set of occupied squares and bank slots to route around (None = unknown)
+        """
+        s = self
+        start = s.inchesToSteps(*s.squareCoords[fromIndex + BANK_SIZE])
+        key = s.routeCache.key(fromIndex, toIndex, symbol, None if symbol is None else occupied)
+        train, waypoints = s.routeCache.get(key, start)
+        if train is not None:
+            return train
+        if waypoints is None:
+            if symbol is None:
+                points = [tuple(s.squareCoords[toIndex + BANK_SIZE])]
+            else:
+                points = s.router.fastest(fromIndex, toIndex, symbol, occupied)[1:]
+            waypoints = [s.inchesToSteps(x, y) for x, y in points]
+        legs = []
+        steps = start
+        for target in waypoints:
+            target = np.asarray(target, dtype=np.int64)
+            legs.append(target - steps)
+            steps = target
+        train = s.compileStepPath(legs, start)
+        s.routeCache.put(key, start, waypoints, train)
+        return train
+
+    #----- Position. The integer motor step count is authoritative; inches are derived from it.
+    @property
+    def currentX(self):
+        if self.motorSteps is None:
+            return None
+        return self.stepsToInches(self.motorSteps)[0]
+
+    @property
+    def currentY(self):
+        if self.motorSteps is None:
+            return None
+        return self.stepsToInches(self.motorSteps)[1]
+
+    def stepsToInches(self, steps):
+        """
+        Absolute motor steps (left, right) -> absolute cartesian position (x, y) in inches
+        """
+        return self.inverseCoreXY(steps)*self.inchPerStep
+
+    def inchesToSteps(self, x, y):
+        """
+        Absolute cartesian position in inches -> nearest absolute motor steps (left, right)
+        """
+        s = self
+        return np.rint(s.coreXY((x*s.stepsPerInch, y*s.stepsPerInch))).astype(np.int64)
+
+    def setPosition(self, x, y):
+        """
+        Tells the board where the gantry is (inches), e.g. after homing
+        """
+        s = self
+        s.motorSteps = s.inchesToSteps(x, y)
+        s.stepResidual = np.zeros(2)
+
+    def reportProgress(self, fraction, label):
+        """
+        Passes move progress (0-1) on to progressHook, if anyone is listening.
+        """
+        if self.progressHook is not None:
+            self.progressHook(fraction, label)
+
+    @traced()
     def turnMagnetOn(self):
-        GPIO.output(self.magPin, GPIO.HIGH)
+        self.pins.output(self.magPin, self.pins.HIGH)
 
+    @traced()
     def turnMagnetOff(self):
-        GPIO.output(self.magPin, GPIO.LOW)
+        self.pins.output(self.magPin, self.pins.LOW)
     
+    def cellCenter(self, col, rank):
+        """
+        Absolute (x, y) inches of the center of a (file, rank) cell, board or not
+        """
+        s = self
+        return ((col + 0.5)*s.squareSize + s.xOrigin, (rank + 0.5)*s.squareSize + s.yOrigin)
+
     def getSquareCoords(self, square):
         """
         Translates a chess move to real coordinates (units: steps from the origin)
         Inputs: 
-            square: numerical index of piece's square (0-63)
+            square: numerical index of piece's square (0-63),
+                or of a piece bank slot (-1 to -16 = white, 64 to 79 = black, placed by bank.bankLayout)
         Outputs:
             coord: tuple with the absolute coordinates of the center of the square (units: inches) 
                 - Ranks and columns range from 0 to 6
                 - Rank 0 = 1, Rank 1 = 2, etc.
                 - File 0 = a, File 1 = b, etc.
         """
-        #JWP TO DO: handle capture bank. Easiest would be use negative numbers
-        rank = (square // 8)
-        col  = (square %  8)
-
-        x = (col  + 0.5)*self.squareSize + self.xOrigin #inches
-        y = (rank + 0.5)*self.squareSize + self.yOrigin #inches
-        print(f"getSquareCoords({square}) = {(x, y)}") #DDEBUGGING
+        if not -BANK_SIZE <= square < 64 + BANK_SIZE:
+            raise ValueError(f"{square} is neither a board square nor a bank slot")
+        x, y = self.squareCoords[square + BANK_SIZE] #inches
+        x, y = float(x), float(y)
+        if self.debug:
+            print(f"getSquareCoords({square}) = {(x, y)}") #DDEBUGGING
         return (x, y)
 
+    @traced()
     def moveToSquare(self, square):
         """
         Moves the gantry to the inputted square (0-63)
@@ -329,12 +841,23 @@ class realBoard():
         delx = coords[0] - s.currentX
         dely = coords[1] - s.currentY
         deltas = (delx, dely)
-        print(f"moveToSquare deltas = {deltas}") #DEBUGGING
-        print(f"CurrentX = {s.currentX}, currentY = {s.currentY}")
-        s.moveInches(deltas)
-        print(f"Successfully moved to square {square}")
+        if s.debug:
+            print(f"moveToSquare deltas = {deltas}") #DEBUGGING
+            print(f"CurrentX = {s.currentX}, currentY = {s.currentY}")
+        here = s.centerIndex.get(tuple(s.motorSteps))
+        if here is not None:
+            # From one center to another: the hop can come from the route cache
+            s.runCompiled(s.compileCarry(here, square, None))
+        else:
+            # Absolute target in whole steps: lands exactly on the square, whatever came before
+            move = s.inchesToSteps(coords[0], coords[1]) - s.motorSteps
+            s.moveStepPath([move])
+        if s.debug:
+            print(f"Successfully moved to square {square}")
 
-    def movePiece(self, startSquare, endSquare, movingPiece, isCapture, capturedPiece):
+    @traced()
+    def movePiece(self, startSquare, endSquare, movingPiece, isCapture, capturedPiece, occupied = None, \
+        capturedSquare = None, promotion = None, castlingRook = None):
         """
         Moves a piece based off the following inputs: 
             startSquare    = starting square (0-63)
@@ -342,58 +865,156 @@ class realBoard():
             movingPiece    = symbol of the piece that's being moved
             isCapture      = notes that the move involves capturing a piece
             capturedPiece  = which piece was captured, for correct storage in the piece bank
+            occupied       = optional board occupancy BEFORE the move (chess.Board, occupancy mask or squares).
+                             When given, pieces are routed around every other piece (see routing.py)
+            capturedSquare = where the captured piece stands, if not endSquare (en passant)
+            promotion      = symbol of the piece a pawn promotes to. It is fetched from the
+                             piece bank if one is stored there.
+            castlingRook   = (rookStart, rookEnd) squares when castling
+        The carries (see legs.py) are then put in the order with the least empty travel (see sequencing.py)
+        and dry-run (see validate.py): InvalidPlan is raised before anything moves if a leg
+        would leave the boundaries or run into another piece.
         """
         s = self
         
-        #PIECE BANK: negative indices are white's piece bank off to the left. 
-        # indices greater than 63 are black's piece bank off to the right. 
-        
-        if isCapture:
-            #s.movePiece(endSquare, #PIECEBANK#, "x", False, capturedPiece)
-            pass
-        else:
-        
-            # Move to starting square
-            s.moveToSquare(startSquare)
-            sleep(0.15)
-            
-            #To keep the magnet on while moving the gantry, we use threading:
-            pieceIsMoving = True
-            try:
-                while pieceIsMoving:
-                    magnet_thread = threading.Thread(target=s.turnMagnetOn())
-                    magnet_thread.start()
-                    
-                    if movingPiece.lower() == "n":
-                        #Knight routine
-                        coords = s.getSquareCoords(endSquare)
-                        delx = coords[0] - s.currentX
-                        dely = coords[1] - s.currentY 
-                        if delx>dely:
-                            #move 1/2 square y
-                            s.moveInches((0, dely/2))
-                            #move delx
-                            s.moveInches((delx, 0))
-                            #move 1/2 square y
-                            s.moveInches((0,dely/2))
-                            
-                        elif dely>delx:
-                            #move 1.2 square x
-                            s.moveInches((delx/2,0))
-                            #move dely
-                            s.moveInches((0,dely))
-                            #move 1.2 squre x
-                            s.moveInches((delx/2,0))
-                        else:
-                            raise RuntimeError("Knight movement error")
-                            
-                    else: 
-                        s.moveToSquare(endSquare)
-                    
-                    pieceIsMoving = False
-                    magnet_thread.join()
-                    s.turnMagnetOff()
-            except KeyboardInterrupt:
-                s.turnMagnetOff()
-                print("Movement aborted")
-                GPIO.cleanup()
+        #PIECE BANK: negative indices are white's piece bank,
+        # indices greater than 63 are black's piece bank (see bank.py).
+        if occupied is not None:
+            occupied = s.withBank(occupied)
+
+        # Slots are picked on a copy: s.bank only changes as each leg is put down (see
+        # bankLeg), so a move that is stopped or fails part way leaves it true to the board
+        legs = pieceLegs(s.bank.copy(), startSquare, endSquare, movingPiece, isCapture, capturedPiece, \
+            capturedSquare, promotion, castlingRook, warn=True)
+
+        with span("sequence", legs=len(legs)):
+            legs, expected, naive = sequence(s, legs)
+        if s.debug and len(legs) > 1:
+            print(f"{len(legs)} carries, expected {expected:.2f}s (in the order given: {naive:.2f}s)")
+
+        # Dry run first: nothing moves unless every leg stays in bounds and clear of the other pieces
+        with span("validate"):
+            problems = validateLegs(s, legs, occupied)
+        if problems:
+            raise InvalidPlan("; ".join(problems))
+        s.runLegs(legs, occupied, s.bankLeg)
+
+    def bankLeg(self, i, leg):
+        """
+        runLegs onLeg callback: records a piece that was just taken out of or put into
+        the piece bank
+        """
+        s = self
+        fromIndex, toIndex, symbol = leg
+        if not 0 <= fromIndex < 64:
+            s.bank.release(fromIndex)
+        if not 0 <= toIndex < 64:
+            s.bank.put(toIndex, symbol)
+
+    @traced()
+    def runLegs(self, legs, occupied = None, onLeg = None):
+        """
+        Carries pieces one after the other. The next leg is routed and compiled while
+        the current one is pulsed (see pipeline.py).
+        Inputs:
+            legs = list of (fromIndex, toIndex, symbol)
+            occupied = optional set of occupied squares and bank slots, kept up to date as pieces move
+            onLeg = optional onLeg(i, leg), called once leg i has been put down
+        """
+        s = self
+        try:
+            s.pipeline.run(legs, occupied, onLeg)
+        except KeyboardInterrupt:
+            s.turnMagnetOff()
+            print("Movement aborted")
+            s.pins.cleanup()
+
+    def estimateDuration(self, move, position, start = None):
+        """
+        How long movePiece would take to play a chess move, without moving: the same
+        legs, leg order, routes and planner timing (cached trains are timed exactly).
+        Inputs:
+            move = chess.Move
+            position = chess.Board before the move
+            start = (x, y) gantry position in inches (defaults to the current position)
+        Outputs:
+            {"total": us, "legs": [{"from", "to", "symbol", "hop", "settle", "carry"}, ...]}
+            with every duration in microseconds
+        """
+        s = self
+        # Works on snapshots of the position and the bank, so it can be called from
+        # another thread while the gantry moves (see asyncboard.py)
+        if start is None:
+            start = tuple(s.stepsToInches(s.motorSteps))
+        bank = s.bank.copy()
+        occupied = set(position.piece_map()) | set(bank.occupiedSlots())
+        legs = moveLegs(position, move, bank)
+        legs, _, _ = sequence(s, legs, start)
+
+        breakdown = []
+        total = 0.0
+        here = start
+        for fromIndex, toIndex, symbol in legs:
+            a = tuple(s.squareCoords[fromIndex + BANK_SIZE])
+            hop = s.pathDuration([a], here)
+            key = s.routeCache.key(fromIndex, toIndex, symbol, occupied)
+            train, waypoints = s.routeCache.peek(key)
+            if train is not None:
+                carry = train.duration
+            elif waypoints is not None:
+                carry = s.pathDuration([s.stepsToInches(np.array(w)) for w in waypoints], a)
+            else:
+                route = s.router.fastest(fromIndex, toIndex, symbol, occupied)
+                carry = s.pathDuration(route[1:], a)
+            leg = {"from": fromIndex, "to": toIndex, "symbol": symbol, "hop": hop*1e6, \
+                   "settle": s.pipeline.settle*1e6, "carry": carry*1e6}
+            breakdown.append(leg)
+            total += leg["hop"] + leg["settle"] + leg["carry"]
+            occupied = (occupied - {fromIndex}) | {toIndex}
+            here = tuple(s.squareCoords[toIndex + BANK_SIZE])
+        return {"total": total, "legs": breakdown}
+
+    def withBank(self, occupied):
+        """
+        Occupancy (set of square indices) of the board plus the piece bank
+        """
+        if hasattr(occupied, "occupied"):
+            occupied = occupied.occupied
+        if isinstance(occupied, (int, np.integer)):
+            occupied = [sq for sq in range(64) if (int(occupied) >> sq) & 1]
+        return set(occupied) | set(self.bank.occupiedSlots())
+
+    def carryPiece(self, fromSquare, toSquare, symbol, occupied = None):
+        """
+        Picks up the piece on fromSquare with the magnet and drags it to toSquare.
+        Squares can be board squares or bank slots.
+        """
+        #Take the quickest path in motor time. Knights detour along a lane, and
+        #if the occupancy is known every piece is routed around the others.
+        self.runLegs([(fromSquare, toSquare, symbol)], occupied)
+
+    @traced()
+    def setupPosition(self, fen, current):
+        """
+        Sets up a whole position: picks which physical piece goes to which square, and in
+        which order, for the least gantry time (see arrange.py). Spare pieces go to the bank.
+        Inputs:
+            fen = position to set up (FEN string or chess.Board), e.g. chess.STARTING_FEN
+            current = what's physically on the board now (chess.Board, FEN or {square: symbol})
+        Outputs:
+            missing = {square: symbol} of pieces that have to be placed by hand
+        """
+        s = self
+        moves, missing = planSetup(s, current, fen)
+        moves, expected, naive = sequence(s, moves)
+        occupied = set(pieceMap(current))
+        print(f"Setting up the position: {len(moves)} moves, expected {expected:.1f}s (greedy order: {naive:.1f}s)")
+
+        occupied = s.withBank(occupied)
+        problems = validateLegs(s, moves, occupied)
+        if problems:
+            raise InvalidPlan("; ".join(problems))
+        s.runLegs(moves, occupied, s.bankLeg)
+        for square, symbol in missing.items():
+            print(f"No {symbol} available, place it on square {square} by hand")
+        return missing
@@ -0,0 +1,38 @@
+import numpy as np
+import chess
+from arrange import travelTimes
+
+################
+# Predictive parking: while the players think, move the gantry to where the next
+# physical move is most likely to start, so that move begins with a short hop.
+#   - if an engine's predicted reply (ponder move) is known, park on its source square
+#   - otherwise weight every square by how many legal moves start there, and park on
+#     the square center with the least expected magnet-off motor time to them
+#   - with no legal moves (game over) fall back to the side to move's pieces
+# Parking always ends on a square center, so the next hop can come from the route cache.
+################
+
+def parkingSquare(board, position, ponder = None):
+    """
+    Inputs:
+        board = realBoard (geometry and motion profile)
+        position = chess.Board, with the side to move about to play
+        ponder = optional chess.Move predicted to be played next
+    Outputs:
+        square index (0-63) to park on, or None if there's nothing to predict
+    """
+    if ponder is not None and ponder in position.legal_moves:
+        return ponder.from_square
+
+    weights = np.zeros(64)
+    for move in position.legal_moves:
+        weights[move.from_square] += 1
+    if not weights.any():
+        for square in chess.SquareSet(position.occupied_co[position.turn]):
+            weights[square] = 1
+    if not weights.any():
+        return None
+
+    origins = np.flatnonzero(weights)
+    expected = travelTimes(board, range(64), origins) @ weights[origins]
+    return int(np.argmin(expected))
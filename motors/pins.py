@@ -0,0 +1,236 @@
+import numpy as np
+
+################
+# Pin drivers: everything realBoard does to the hardware goes through one of these.
+#
+# A driver provides:
+#     HIGH, LOW          = pin values (HIGH is also the CW direction)
+#     attach(board)      = called once by realBoard, before any pin is set up
+#     setupOutput(pin)   = configures an output pin
+#     output(pin, value) = drives an output pin
+#     switch(pin)        = a limit switch with is_pressed and a when_pressed callback
+#                          (the gpiozero.Button interface)
+#     cleanup()          = releases the pins
+#     stepperFactory     = pin factory for the realtime stepping process (see
+#                          rtstepper.py), or None if the driver can't run there
+# and optionally
+#     playTrain(train, start, begin, end) = plays a range of a StepTrain's ticks at
+#                          once on a virtual clock (see StepExecutor)
+#
+#   RPiDriver = the real thing (RPi.GPIO and gpiozero, only imported when it's created)
+#   SimDriver = a simulated CoreXY gantry for any Linux box, see below
+################
+
+class RPiDriver():
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        from gpiozero import Button
+        from rtstepper import gpioOutput
+        s = self
+        s.GPIO = GPIO
+        s.Button = Button
+        s.HIGH = GPIO.HIGH
+        s.LOW = GPIO.LOW
+        s.output = GPIO.output # no wrapper: this is called for every step pulse
+        s.stepperFactory = gpioOutput
+        GPIO.setmode(GPIO.BCM)
+
+    def attach(self, board):
+        pass
+
+    def setupOutput(self, pin):
+        self.GPIO.setup(pin, self.GPIO.OUT)
+
+    def switch(self, pin):
+        return self.Button(pin)
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class SimSwitch():
+    """
+    Simulated limit switch (same interface as gpiozero.Button)
+    """
+    def __init__(self, driver, axis):
+        self.driver = driver
+        self.axis = axis
+        self.when_pressed = None
+
+    @property
+    def is_pressed(self):
+        return self.driver.position()[self.axis] <= 0
+
+
+class SimDriver():
+    ################
+    # Simulated CoreXY gantry.
+    #
+    # Rising edges on the STEP pins are integrated into a true motor step count, in the
+    # direction the DIR pin says (HIGH = CW = +1). The limit switches sit at the real
+    # zero: the x switch is pressed whenever the true x <= 0, the y switch when y <= 0,
+    # and their when_pressed callbacks fire on the step that closes them, just like
+    # gpiozero's edge callbacks.
+    #
+    # Every step pulse and magnet change is recorded with a timestamp from clock
+    # (nanoseconds), see pulses().
+    #
+    # On a virtual clock, StepExecutor hands whole stretches of a StepTrain to
+    # playTrain, which integrates them with numpy (cumulative sums of the signed steps)
+    # instead of a Python call per pulse. Only while a limit switch has a when_pressed
+    # callback (homing) and the stretch could close it are the pulses sent one by one,
+    # so the callback still fires on the right step.
+    ################
+
+    HIGH = 1
+    LOW = 0
+    stepperFactory = None # the stepping process couldn't update this object's state
+
+    def __init__(self, start = (6.0, 6.0), clock = None, record = True):
+        """
+        Inputs:
+            start = true gantry position at power up (inches from the real zero)
+            clock = function returning the time in nanoseconds, used for the pulse log
+                (None = the board's clock, see simclock.py)
+            record = keep the pulse log
+        """
+        s = self
+        s.start = start
+        s.clock = clock
+        s.record = record
+        s.magnet = False
+        s.configured = set()
+        s.switches = []
+        s.clearLog()
+
+    def attach(self, board):
+        """
+        Learns the pin roles and the step size from the board
+        """
+        s = self
+        s.stepPins = {board.STEP_1: 0, board.STEP_2: 1}
+        s.dirPins = {board.DIR_1: 0, board.DIR_2: 1}
+        s.magPin = board.magPin
+        s.switchAxes = {board.xSwitchPin: 0, board.ySwitchPin: 1}
+        s.inchPerStep = board.inchPerStep
+        if s.clock is None:
+            s.clock = board.clock.now
+        x, y = s.start
+        s.steps = [int(m) for m in np.rint([-(x + y)/s.inchPerStep, (y - x)/s.inchPerStep])]
+        s.dirs = [0, 0]
+        s.levels = [0, 0]
+
+    def setupOutput(self, pin):
+        self.configured.add(pin)
+
+    def output(self, pin, value):
+        s = self
+        i = s.stepPins.get(pin)
+        if i is not None:
+            if value and not s.levels[i]:
+                before = s.pressed()
+                s.steps[i] += 1 if s.dirs[i] else -1
+                if s.record:
+                    s.log.append((s.clock(), pin, s.dirs[i]))
+                after = s.pressed()
+                for switch in s.switches:
+                    if after[switch.axis] and not before[switch.axis] and switch.when_pressed is not None:
+                        switch.when_pressed()
+            s.levels[i] = value
+            return None
+        i = s.dirPins.get(pin)
+        if i is not None:
+            s.dirs[i] = 1 if value else 0
+        elif pin == s.magPin:
+            s.magnet = bool(value)
+            if s.record:
+                s.log.append((s.clock(), pin, int(s.magnet)))
+
+    def switch(self, pin):
+        switch = SimSwitch(self, self.switchAxes[pin])
+        self.switches.append(switch)
+        return switch
+
+    def cleanup(self):
+        pass
+
+    def playTrain(self, train, start, begin = 0, end = None):
+        """
+        Plays ticks begin..end of a StepTrain in one pass: the same steps, direction
+        pins and pulse log as pulsing them one by one.
+        Inputs:
+            train = StepTrain (see planner.py)
+            start = clock time (ns) the train's tick times count from
+        Outputs:
+            False if a limit switch with a when_pressed callback could close during
+            these ticks: nothing is done, they have to be pulsed one by one
+        """
+        s = self
+        ticks = slice(begin, end)
+        lMask, rMask = train.lMask[ticks], train.rMask[ticks]
+        lDir, rDir = train.lDir[ticks], train.rDir[ticks]
+        if len(lMask) == 0:
+            return True
+        l = s.steps[0] + np.cumsum(np.where(lDir, 1, -1)*lMask)
+        r = s.steps[1] + np.cumsum(np.where(rDir, 1, -1)*rMask)
+        if any(switch.when_pressed is not None for switch in s.switches):
+            # x <= 0 when l + r >= 0, y <= 0 when r <= l
+            if (l + r >= 0).any() or (r <= l).any():
+                return False
+        s.steps = [int(l[-1]), int(r[-1])]
+        s.dirs = [int(lDir[-1]), int(rDir[-1])]
+
+        if s.record:
+            # Left before right on a shared tick, like StepExecutor
+            left, right = np.flatnonzero(lMask), np.flatnonzero(rMask)
+            order = np.argsort(np.concatenate((2*left, 2*right + 1)), kind="stable")
+            times = start + train.times[ticks]
+            stepL, stepR = list(s.stepPins)
+            s.addBlock(np.concatenate((times[left], times[right]))[order], \
+                np.concatenate((np.full(len(left), stepL), np.full(len(right), stepR)))[order], \
+                np.concatenate((lDir[left], rDir[right])).astype(int)[order])
+        return True
+
+    #----- Simulated state
+    def position(self):
+        """
+        True gantry position (x, y) in inches from the real zero
+        """
+        s = self
+        l, r = s.steps
+        return (-(l + r)/2*s.inchPerStep, (r - l)/2*s.inchPerStep)
+
+    def pressed(self):
+        x, y = self.position()
+        return (x <= 0, y <= 0)
+
+    def clearLog(self):
+        self.log = []       # events of single pulses: (time, pin, value)
+        self.blocks = []    # earlier events as (times, pins, values) arrays
+
+    def addBlock(self, times, pins, values):
+        s = self
+        s.flushLog()
+        s.blocks.append((times, pins, values))
+
+    def flushLog(self):
+        s = self
+        if len(s.log) > 0:
+            times, pins, values = zip(*s.log)
+            s.blocks.append((np.array(times, dtype=np.int64), np.array(pins), np.array(values)))
+            s.log = []
+
+    def pulses(self):
+        """
+        The pulse log as numpy arrays:
+            times = int64 ns (from clock)
+            pins  = pin of every event (a STEP pin, or the magnet pin)
+            values = the direction (1 = CW) for steps, the new magnet state for the magnet
+        """
+        s = self
+        s.flushLog()
+        if len(s.blocks) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        if len(s.blocks) > 1:
+            s.blocks = [tuple(np.concatenate(arrays) for arrays in zip(*s.blocks))]
+        return s.blocks[0]
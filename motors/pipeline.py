@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+from bank import BANK_SIZE
+from tracing import span
+
+class LegPipeline():
+    ################
+    # Two-stage pipeline for carrying pieces.
+    #
+    #   compile stage (worker thread): routes and compiles the pulse trains of every
+    #       magnet-off hop and magnet-on carry, in order, into a bounded queue
+    #   execute stage (calling thread): takes the trains off the queue and pulses them
+    #
+    # So while leg N is on the motors, leg N+1 is already being routed and compiled, and
+    # the gantry only waits on the compiler if a train takes longer to build than the
+    # previous one takes to run. Every leg starts and ends on a square (or bank slot)
+    # center, so the compile stage knows where each train starts without waiting.
+    #
+    # prefetch() compiles a queued move's board carries into the route cache while the
+    # current move is still running, so the next move usually starts with cache hits.
+    #
+    # Per-stage timings (s) of the last run are in s.timings, totals in stats().
+    ################
+
+    STAGES = ("compile", "wait", "execute")
+
+    def __init__(self, board, depth = 2, settle = 0.15):
+        """
+        Inputs:
+            board = realBoard
+            depth = how many compiled trains can wait for the motors
+            settle = pause before switching the magnet on (s)
+        """
+        s = self
+        s.board = board
+        s.depth = depth
+        s.settle = settle
+        s.timings = {stage: [] for stage in s.STAGES}
+        s.totals = {stage: 0.0 for stage in s.STAGES}
+        s.counts = {stage: 0 for stage in s.STAGES}
+        s.prefetches = queue.Queue()
+        s.prefetcher = None
+
+    def _record(self, stage, seconds):
+        s = self
+        s.timings[stage].append(seconds)
+        s.totals[stage] += seconds
+        s.counts[stage] += 1
+
+    def stats(self):
+        """
+        {stage: {"count", "total", "mean", "max"}} over every run so far
+        (max is over the last run)
+        """
+        s = self
+        out = {}
+        for stage in s.STAGES:
+            n = s.counts[stage]
+            out[stage] = {"count": n, "total": s.totals[stage], \
+                          "mean": s.totals[stage]/n if n else 0.0, \
+                          "max": max(s.timings[stage], default=0.0)}
+        return out
+
+    #----- Compile stage
+    def _jobs(self, legs, occupied):
+        """
+        The trains of a leg list, in order: (kind, leg, build) with build() -> StepTrain
+        """
+        b = self.board
+        jobs = []
+        here = b.centerIndex.get(tuple(b.motorSteps))
+        start = b.motorSteps.copy()
+        for leg in legs:
+            fromIndex, toIndex, symbol = leg
+            if here is not None:
+                jobs.append(("hop", leg, lambda a=here, c=fromIndex: b.compileCarry(a, c, None)))
+            else:
+                target = b.inchesToSteps(*b.squareCoords[fromIndex + BANK_SIZE])
+                jobs.append(("hop", leg, lambda t=target, st=start: b.compileStepPath([t - st], st)))
+            jobs.append(("carry", leg, lambda f=fromIndex, t=toIndex, sym=symbol, occ=occupied: \
+                b.compileCarry(f, t, sym, occ)))
+            if occupied is not None:
+                occupied = (occupied - {fromIndex}) | {toIndex}
+            here = toIndex
+        return jobs
+
+    def _compile(self, jobs, out, cancel):
+        s = self
+        for kind, leg, build in jobs:
+            t0 = time.perf_counter()
+            try:
+                with span("compile", "pipeline", kind=kind, leg=str(leg)):
+                    item = (kind, leg, build())
+            except BaseException as e:
+                item = (kind, leg, e)
+            s._record("compile", time.perf_counter() - t0)
+            while not cancel.is_set():
+                try:
+                    out.put(item, timeout=0.05)
+                    break
+                except queue.Full:
+                    pass
+            if cancel.is_set() or isinstance(item[2], BaseException):
+                return None
+
+    #----- Execute stage
+    def run(self, legs, occupied = None, onLeg = None):
+        """
+        Carries pieces one after the other (see realBoard.runLegs).
+        Inputs:
+            legs = list of (fromIndex, toIndex, symbol)
+            occupied = optional set of occupied squares and bank slots
+            onLeg = optional onLeg(i, leg), called once leg i has been put down
+        """
+        s = self
+        b = s.board
+        s.timings = {stage: [] for stage in s.STAGES}
+        jobs = s._jobs(legs, occupied)
+        out = queue.Queue(s.depth)
+        cancel = threading.Event()
+        worker = threading.Thread(target=s._compile, args=(jobs, out, cancel), \
+                                  name="compile", daemon=True)
+        worker.start()
+        try:
+            for i in range(len(jobs)):
+                t0 = time.perf_counter()
+                with span("wait", "pipeline"):
+                    kind, leg, train = out.get()
+                s._record("wait", time.perf_counter() - t0)
+                if isinstance(train, BaseException):
+                    raise train
+                t0 = time.perf_counter()
+                if kind == "hop":
+                    b.reportProgress(i/len(jobs), f"carry {i//2 + 1}/{len(legs)}")
+                    b.runCompiled(train)
+                    with span("settle", "pipeline"):
+                        b.clock.sleep(s.settle)
+                else:
+                    s._carry(train)
+                    if onLeg is not None:
+                        onLeg(i//2, leg)
+                s._record("execute", time.perf_counter() - t0)
+        finally:
+            cancel.set()
+            worker.join()
+
+    def _carry(self, train):
+        b = self.board
+        b.turnMagnetOn()
+        try:
+            b.runCompiled(train)
+        finally:
+            # Even after a MoveAborted: never leave a piece stuck to the magnet
+            b.turnMagnetOff()
+
+    #----- Prefetching queued moves
+    def prefetch(self, legs, occupied = None):
+        """
+        Compiles carries into the route cache in the background.
+        Inputs:
+            legs = list of (fromIndex, toIndex, symbol). Only legs between board squares
+                are worth passing: the bank slot a capture or promotion uses depends on
+                the moves still queued ahead of it, so those legs are compiled when the
+                move runs (MotionExecutor.movePiece leaves them out).
+            occupied = optional set of occupied squares and bank slots
+        """
+        s = self
+        s.prefetches.put((legs, occupied))
+        if s.prefetcher is None:
+            s.prefetcher = threading.Thread(target=s._prefetch, name="prefetch", daemon=True)
+            s.prefetcher.start()
+
+    def _prefetch(self):
+        s = self
+        while True:
+            legs, occupied = s.prefetches.get()
+            for fromIndex, toIndex, symbol in legs:
+                try:
+                    s.board.compileCarry(fromIndex, toIndex, symbol, occupied)
+                except Exception as e:
+                    # Only a guess at the next move: report it and keep the thread going
+                    print(f"Could not prefetch {symbol} {fromIndex}->{toIndex}: {e}")
+                    break
+                if occupied is not None:
+                    occupied = (occupied - {fromIndex}) | {toIndex}
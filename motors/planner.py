@@ -0,0 +1,211 @@
+import numpy as np
+from interpolate import lineSteps
+
+class StepTrain():
+    """
+    A compiled pulse train for the two coreXY motors. Every array has one entry per pulse tick:
+        times = int64 numpy array, nanoseconds from the start of the motion at which the tick fires
+        lMask = bool array, True if the left motor steps on this tick
+        rMask = bool array, True if the right motor steps on this tick
+        lDir  = bool array, True if the left motor turns CW on this tick
+        rDir  = bool array, True if the right motor turns CW on this tick
+    """
+    def __init__(self, times, lMask, rMask, lDir, rDir):
+        s = self
+        s.times = times
+        s.lMask = lMask
+        s.rMask = rMask
+        s.lDir  = lDir
+        s.rDir  = rDir
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, ticks):
+        """
+        Ticks 'ticks' (a slice) of the train, with their times unchanged
+        """
+        s = self
+        return StepTrain(s.times[ticks], s.lMask[ticks], s.rMask[ticks], s.lDir[ticks], s.rDir[ticks])
+
+    @property
+    def duration(self):
+        """
+        Length of the train (s)
+        """
+        if len(self.times) == 0:
+            return 0.0
+        return self.times[-1]/1e9
+
+    def netSteps(self, count = None):
+        """
+        Signed number of steps each motor makes over the whole train,
+        or over its first 'count' ticks.
+        Outputs: (lSteps, rSteps)
+        """
+        s = self
+        lMask, rMask = s.lMask[:count], s.rMask[:count]
+        lDir, rDir = s.lDir[:count], s.rDir[:count]
+        lSteps = np.count_nonzero(lMask & lDir) - np.count_nonzero(lMask & ~lDir)
+        rSteps = np.count_nonzero(rMask & rDir) - np.count_nonzero(rMask & ~rDir)
+        return int(lSteps), int(rSteps)
+
+    def stoppingTail(self, done, brake):
+        """
+        The ticks that bring the motors to a stop when the train is interrupted after
+        'done' ticks: the rest of the same path, slowed down along a braking ramp instead
+        of halting at full speed (which would skip steps and lose the position).
+        Inputs:
+            done = ticks already sent
+            brake = delays (ns) of a full stop, see MotionProfile.brakeDelays
+        Outputs:
+            StepTrain, with tick times counted from the moment it is started.
+            Empty if the motors were already slow enough to stop on the spot.
+        """
+        s = self
+        n = len(s.times)
+        if done <= 0 or done >= n:
+            return s[done:done]
+        # Join the ramp at the current speed: its first delay at least as long as the last one
+        last = s.times[done - 1] - (s.times[done - 2] if done > 1 else 0)
+        delays = brake[np.searchsorted(brake, last):][:n - done]
+        end = done + len(delays)
+        # Never faster than planned either (e.g. slowing into a corner)
+        delays = np.maximum(delays, np.diff(s.times[done - 1:end]))
+        tail = s[done:end]
+        tail.times = np.cumsum(delays).astype(np.int64)
+        return tail
+
+
+class Segment():
+    """
+    One straight coreXY move inside the planner queue.
+        lSteps, rSteps = signed motor steps
+        nSteps = steps of the major motor (= number of pulse ticks)
+        unit = per-motor velocity when the major motor runs at speed 1
+        vEntry, vExit = planned junction speeds (steps/s of the major motor)
+        vEntryMax = junction speed limit with the previous segment
+    """
+    def __init__(self, lSteps, rSteps):
+        s = self
+        s.lSteps = int(lSteps)
+        s.rSteps = int(rSteps)
+        s.nSteps = max(abs(s.lSteps), abs(s.rSteps))
+        if s.nSteps > 0:
+            s.unit = np.array([s.lSteps, s.rSteps])/s.nSteps
+        else:
+            s.unit = np.zeros(2)
+        s.vEntryMax = 0.0
+        s.vEntry = 0.0
+        s.vExit  = 0.0
+
+
+class Planner():
+    ################
+    # Look-ahead planner buffer, in the style of 3D printer firmware.
+    #
+    # Segments are queued with addSegment, then plan() computes how fast the gantry
+    # can pass through every junction:
+    #   - the junction limit only allows each motor's speed to jump by maxJump
+    #     (steps/s) when the direction changes ("classic jerk")
+    #   - a backward pass makes sure every segment can still slow down in time for
+    #     the next one, and the path ends at standstill
+    #   - a forward pass makes sure every segment can actually reach its exit speed
+    # compile() then turns the whole queue into a single continuous StepTrain.
+    ################
+
+    def __init__(self, profile, maxJump = None):
+        """
+        Inputs:
+            profile = MotionProfile used to time every segment
+            maxJump = largest instantaneous speed change per motor at a junction (steps/s).
+                Defaults to the profile's start velocity.
+        """
+        s = self
+        s.profile = profile
+        s.maxJump = profile.vStart if maxJump is None else maxJump
+        s.queue = []
+
+    def clear(self):
+        self.queue = []
+
+    def addSegment(self, lSteps, rSteps):
+        """
+        Appends a straight move of (lSteps, rSteps) motor steps to the queue.
+        Zero-length segments are dropped.
+        """
+        s = self
+        seg = Segment(lSteps, rSteps)
+        if seg.nSteps == 0:
+            return None
+        prof = s.profile
+        if len(s.queue) == 0:
+            seg.vEntryMax = prof.vStart
+        else:
+            jump = np.max(np.abs(seg.unit - s.queue[-1].unit))
+            if jump == 0:
+                seg.vEntryMax = prof.vMax
+            else:
+                seg.vEntryMax = min(prof.vMax, max(prof.vStart, s.maxJump/jump))
+        s.queue.append(seg)
+        return seg
+
+    def plan(self):
+        """
+        Computes vEntry/vExit for every queued segment (look-ahead over the whole queue).
+        """
+        s = self
+        prof = s.profile
+        if len(s.queue) == 0:
+            return None
+
+        #----- Backward pass: end at standstill, and never enter faster than we can stop
+        vNext = prof.vStart
+        for seg in reversed(s.queue):
+            seg.vExit = vNext
+            seg.vEntry = min(seg.vEntryMax, prof.reachableVelocity(vNext, seg.nSteps))
+            vNext = seg.vEntry
+
+        #----- Forward pass: never exit faster than we can accelerate to
+        vPrev = prof.vStart
+        for seg in s.queue:
+            seg.vEntry = min(seg.vEntry, vPrev)
+            seg.vExit = min(seg.vExit, prof.reachableVelocity(seg.vEntry, seg.nSteps))
+            vPrev = seg.vExit
+
+    def duration(self):
+        """
+        Planned time (s) of the whole queue. plan() must have been called.
+        """
+        return sum(self.profile.duration(seg.nSteps, seg.vEntry, seg.vExit) for seg in self.queue)
+
+    def compile(self):
+        """
+        Plans the queue and compiles it into one continuous StepTrain.
+        """
+        s = self
+        s.plan()
+        times, lMasks, rMasks, lDirs, rDirs = [], [], [], [], []
+        offset = 0.0
+        lDir = rDir = False
+        for seg in s.queue:
+            lMask, rMask = lineSteps(seg.lSteps, seg.rSteps)
+            # A motor that doesn't move in this segment keeps its previous direction
+            if seg.lSteps != 0:
+                lDir = seg.lSteps > 0
+            if seg.rSteps != 0:
+                rDir = seg.rSteps > 0
+            t = s.profile.stepTimes(seg.nSteps, seg.vEntry, seg.vExit) + offset
+            offset = t[-1]
+            times.append(t)
+            lMasks.append(lMask)
+            rMasks.append(rMask)
+            lDirs.append(np.full(seg.nSteps, lDir))
+            rDirs.append(np.full(seg.nSteps, rDir))
+
+        if len(times) == 0:
+            empty = np.zeros(0, dtype=bool)
+            return StepTrain(np.zeros(0, dtype=np.int64), empty, empty, empty, empty)
+        return StepTrain(np.rint(np.concatenate(times)*1e9).astype(np.int64), \
+            np.concatenate(lMasks), np.concatenate(rMasks), \
+            np.concatenate(lDirs), np.concatenate(rDirs))
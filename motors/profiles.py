@@ -0,0 +1,211 @@
+import numpy as np
+
+class MotionProfile():
+    ################
+    # Builds per-step timing tables for a single motion along the major coreXY motor.
+    #
+    # Shapes:
+    #   "constant"  - every step at maxVelocity (the old fixed motDelay behaviour)
+    #   "trapezoid" - constant-acceleration ramps up to maxVelocity and back down
+    #   "scurve"    - jerk-limited ramps (smoothstep velocity curve), so the
+    #                 acceleration itself ramps in and out instead of jumping
+    #
+    # All settings are given in inches (coreXY plane) and converted to steps with
+    # stepsPerInch, so "velocity" here is the speed of the motor doing the most steps.
+    ################
+
+    SHAPES = ("constant", "trapezoid", "scurve")
+
+    def __init__(self, stepsPerInch, maxVelocity = 6.0, acceleration = 20.0, \
+        jerk = 400.0, startVelocity = 1.0, shape = "trapezoid"):
+        """
+        Inputs:
+            stepsPerInch = motor steps per inch of belt travel
+            maxVelocity = cruise speed (inches/s)
+            acceleration = maximum acceleration (inches/s^2)
+            jerk = maximum jerk (inches/s^3), only used by the "scurve" shape
+            startVelocity = speed the motors can jump to from standstill without
+                skipping steps (inches/s). Moves start and end at this speed.
+            shape = "constant", "trapezoid" or "scurve"
+        """
+        if shape not in self.SHAPES:
+            raise ValueError(f"Unknown motion profile shape '{shape}', expected one of {self.SHAPES}")
+        s = self
+        s.shape = shape
+        s.stepsPerInch = stepsPerInch
+
+        #----- Convert everything to steps
+        s.vMax   = maxVelocity*stepsPerInch   #steps/s
+        s.accel  = acceleration*stepsPerInch  #steps/s^2
+        s.jerk   = jerk*stepsPerInch          #steps/s^3
+        s.vStart = min(startVelocity*stepsPerInch, s.vMax) #steps/s
+
+    #----- Ramp geometry (all in steps and seconds)
+    def rampTime(self, v0, v1):
+        """
+        Time (s) needed to change speed from v0 to v1 (steps/s).
+        """
+        s = self
+        dv = abs(v1 - v0)
+        if s.shape == "constant" or dv == 0:
+            return 0.0
+        if s.shape == "trapezoid":
+            return dv/s.accel
+        # Smoothstep ramp: peak acceleration is 1.5*dv/T, peak jerk is 6*dv/T^2
+        return max(1.5*dv/s.accel, np.sqrt(6*dv/s.jerk))
+
+    def rampDistance(self, v0, v1):
+        """
+        Number of steps covered while changing speed from v0 to v1 (steps/s).
+        Both ramp shapes are symmetric, so this is the mean speed times the ramp time.
+        """
+        return 0.5*(v0 + v1)*self.rampTime(v0, v1)
+
+    def reachableVelocity(self, v0, nSteps):
+        """
+        Highest speed (steps/s) that can be reached from v0 within nSteps.
+        """
+        s = self
+        if s.shape == "constant" or s.rampDistance(v0, s.vMax) <= nSteps:
+            return s.vMax
+        lo, hi = v0, s.vMax
+        for i in range(50):
+            mid = 0.5*(lo + hi)
+            if s.rampDistance(v0, mid) <= nSteps:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def peakVelocity(self, nSteps, v0, v1):
+        """
+        Cruise speed (steps/s) of an nSteps move entered at v0 and left at v1.
+        """
+        s = self
+        if s.shape == "constant":
+            return s.vMax
+        if s.rampDistance(v0, s.vMax) + s.rampDistance(s.vMax, v1) <= nSteps:
+            return s.vMax
+        lo, hi = max(v0, v1), s.vMax
+        for i in range(50):
+            mid = 0.5*(lo + hi)
+            if s.rampDistance(v0, mid) + s.rampDistance(mid, v1) <= nSteps:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def limitVelocities(self, nSteps, v0, v1):
+        """
+        Clamps the entry/exit speeds (steps/s) to values that are reachable within nSteps.
+        Outputs: (v0, v1)
+        """
+        s = self
+        if s.shape == "constant":
+            return s.vMax, s.vMax
+        v0 = min(max(v0, s.vStart), s.vMax)
+        v1 = min(max(v1, s.vStart), s.vMax)
+        if v1 > v0:
+            v1 = min(v1, s.reachableVelocity(v0, nSteps))
+        elif v0 > v1:
+            v0 = min(v0, s.reachableVelocity(v1, nSteps))
+        return v0, v1
+
+    #----- Per-step tables
+    def _rampTimes(self, positions, v0, v1):
+        """
+        Time (s) at which each position (steps from ramp start) is reached during a v0 -> v1 ramp.
+        """
+        s = self
+        T = s.rampTime(v0, v1)
+        if T == 0:
+            return positions/v0
+        dv = v1 - v0
+        if s.shape == "trapezoid":
+            a = dv/T
+            # Stable form of (sqrt(v0^2 + 2*a*x) - v0)/a
+            root = np.sqrt(np.maximum(v0*v0 + 2*a*positions, 0.0))
+            return 2*positions/(v0 + root)
+        # S-curve: x(u) = T*(v0*u + dv*(u^3 - u^4/2)) is monotonic, invert by interpolation
+        u = np.linspace(0.0, 1.0, 4097)
+        x = T*(v0*u + dv*(u**3 - 0.5*u**4))
+        return T*np.interp(positions, x, u)
+
+    def stepTimes(self, nSteps, v0 = None, v1 = None):
+        """
+        Computes when each step of a move should happen.
+        Inputs:
+            nSteps = number of steps of the major motor
+            v0 = entry speed (steps/s). Defaults to startVelocity (from standstill)
+            v1 = exit speed (steps/s). Defaults to startVelocity (to standstill)
+        Outputs:
+            times = numpy array of length nSteps: seconds from the start of the move
+                at which step k (1..nSteps) is taken
+        """
+        s = self
+        nSteps = int(nSteps)
+        if nSteps <= 0:
+            return np.zeros(0)
+        k = np.arange(1, nSteps + 1, dtype=float)
+        if s.shape == "constant":
+            return k/s.vMax
+
+        v0 = s.vStart if v0 is None else v0
+        v1 = s.vStart if v1 is None else v1
+        v0, v1 = s.limitVelocities(nSteps, v0, v1)
+        vp = s.peakVelocity(nSteps, v0, v1)
+
+        #----- Phase boundaries (steps)
+        dUp   = min(s.rampDistance(v0, vp), nSteps)
+        dDown = min(s.rampDistance(vp, v1), nSteps - dUp)
+        dCruise = nSteps - dUp - dDown
+        tUp = s.rampTime(v0, vp)
+        tCruise = dCruise/vp
+
+        times = np.empty(nSteps)
+        up = k <= dUp
+        down = k > dUp + dCruise
+        cruise = ~(up | down)
+        times[up] = s._rampTimes(k[up], v0, vp)
+        times[cruise] = tUp + (k[cruise] - dUp)/vp
+        times[down] = tUp + tCruise + s._rampTimes(k[down] - dUp - dCruise, vp, v1)
+        return times
+
+    def stepDelays(self, nSteps, v0 = None, v1 = None):
+        """
+        Same as stepTimes, but returns the delay (s) before each step instead of absolute times.
+        """
+        times = self.stepTimes(nSteps, v0, v1)
+        return np.diff(times, prepend=0.0)
+
+    def brakeDelays(self):
+        """
+        Delays (ns) between the steps of a stop from maxVelocity down to startVelocity,
+        the quickest the motors can be halted without skipping steps (see
+        StepTrain.stoppingTail). Speed only goes down, so the delays only go up.
+        Empty for the "constant" shape, which never goes faster than it can stop.
+        """
+        s = self
+        if s.shape == "constant":
+            return np.zeros(0, dtype=np.int64)
+        nSteps = int(np.ceil(s.rampDistance(s.vMax, s.vStart)))
+        return np.rint(s.stepDelays(nSteps, s.vMax, s.vStart)*1e9).astype(np.int64)
+
+    def duration(self, nSteps, v0 = None, v1 = None):
+        """
+        Total time (s) of an nSteps move, without building the step table.
+        """
+        s = self
+        nSteps = int(nSteps)
+        if nSteps <= 0:
+            return 0.0
+        if s.shape == "constant":
+            return nSteps/s.vMax
+        v0 = s.vStart if v0 is None else v0
+        v1 = s.vStart if v1 is None else v1
+        v0, v1 = s.limitVelocities(nSteps, v0, v1)
+        vp = s.peakVelocity(nSteps, v0, v1)
+        dUp = s.rampDistance(v0, vp)
+        dDown = s.rampDistance(vp, v1)
+        dCruise = max(nSteps - dUp - dDown, 0.0)
+        return s.rampTime(v0, vp) + dCruise/vp + s.rampTime(vp, v1)
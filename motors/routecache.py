@@ -0,0 +1,271 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from bank import BANK_SIZE
+
+def trainBytes(train):
+    """
+    Memory held by a StepTrain's arrays
+    """
+    return sum(a.nbytes for a in (train.times, train.lMask, train.rMask, train.lDir, train.rDir))
+
+
+class RouteCache():
+    ################
+    # LRU cache of routes between square (or bank slot) centers.
+    #
+    # A carry from one center to another always starts from the same whole motor step
+    # count, so its route only depends on
+    #     (from, to, piece class, occupancy signature)
+    # where the piece class is "n" for knights, "-" for magnet-off hops and "x" for
+    # everything else, and the signature is a bit mask of the occupied squares and bank
+    # slots (-1 if unknown). Two levels:
+    #   - routes: the waypoints (absolute motor steps) of every route found. A few
+    #     numbers each, so up to 'capacity' of them are kept and saved to disk. A hit
+    #     skips routing; the train is compiled again from the waypoints.
+    #   - trains: the compiled StepTrains of the most recently used routes, in memory
+    #     only, up to maxBytes. A hit skips routing, planning and compiling altogether.
+    #
+    # On disk the routes are one JSON line each in <path>.jsonl, after a first line
+    # holding the settings they were built with. save() only appends the routes found
+    # since the last save. Replaced and dropped routes stay in the file until it holds
+    # twice as many lines as routes kept; the next save then rewrites it.
+    ################
+
+    def __init__(self, capacity = 4096, maxBytes = 64 << 20, path = None, settings = None):
+        """
+        Inputs:
+            capacity = most routes kept (least recently used ones are dropped first)
+            maxBytes = memory the compiled trains may take
+            path = file prefix to load from and save to (None = memory only)
+            settings = anything the routes depend on (geometry, motion profile). A saved
+                cache built with other settings is ignored.
+        """
+        s = self
+        s.capacity = capacity
+        s.maxBytes = maxBytes
+        s.path = path
+        s.settings = settings
+        s.routes = OrderedDict()    # key -> (start steps, waypoint steps)
+        s.trains = OrderedDict()    # key -> StepTrain
+        s.trainBytes = 0
+        s.lock = threading.Lock()   # the pipeline compiles on worker threads
+        s.hits = 0
+        s.routeHits = 0
+        s.misses = 0
+        s.pending = []              # routes found since the last save
+        s.lines = 0                 # lines in the file after the settings
+        s.rewrite = True            # the file has to be written from scratch
+        if path is not None:
+            s.load()
+
+    @property
+    def dirty(self):
+        return self.rewrite and len(self.routes) > 0 or len(self.pending) > 0
+
+    @staticmethod
+    def key(fromIndex, toIndex, symbol, occupied = None):
+        """
+        Cache key of a carry (symbol = None for a magnet-off hop)
+        Inputs:
+            occupied = iterable of occupied squares / bank slots, or None if unknown
+        """
+        if symbol is None:
+            pieceClass = "-"
+        elif symbol.lower() == "n":
+            pieceClass = "n"
+        else:
+            pieceClass = "x"
+        if occupied is None:
+            signature = -1
+        else:
+            signature = 0
+            for index in occupied:
+                signature |= 1 << (index + BANK_SIZE)
+        return (int(fromIndex), int(toIndex), pieceClass, signature)
+
+    def get(self, key, start):
+        """
+        Looks a carry up. start = motor steps the train has to start from.
+        Outputs:
+            (StepTrain, waypoints): the compiled train if it's still in memory, else None;
+            and the route's waypoints (list of absolute motor steps) if it's known, else None
+        """
+        s = self
+        start = tuple(int(m) for m in start)
+        with s.lock:
+            route = s.routes.get(key)
+            if route is None or route[0] != start:
+                s.misses += 1
+                return None, None
+            s.routes.move_to_end(key)
+            train = s.trains.get(key)
+            if train is None:
+                s.routeHits += 1
+            else:
+                s.trains.move_to_end(key)
+                s.hits += 1
+            return train, route[1]
+
+    def peek(self, key):
+        """
+        Same as get, without counting a hit or a miss or checking the start
+        """
+        with self.lock:
+            route = self.routes.get(key)
+            return self.trains.get(key), None if route is None else route[1]
+
+    def put(self, key, start, waypoints, train = None):
+        """
+        Inputs:
+            start = motor steps the route starts from
+            waypoints = list of absolute motor steps the route goes through
+            train = its compiled StepTrain, if any
+        """
+        s = self
+        route = (tuple(int(m) for m in start), [tuple(int(m) for m in w) for w in waypoints])
+        with s.lock:
+            if s.routes.get(key) != route:
+                s.pending.append((key, route))
+            s.routes[key] = route
+            s.routes.move_to_end(key)
+            while len(s.routes) > s.capacity:
+                old, _ = s.routes.popitem(last=False)
+                s.dropTrain(old)
+            if train is not None:
+                s.dropTrain(key)
+                s.trains[key] = train
+                s.trainBytes += trainBytes(train)
+                while s.trainBytes > s.maxBytes and len(s.trains) > 1:
+                    s.dropTrain(next(iter(s.trains)))
+
+    def dropTrain(self, key):
+        # Call with s.lock held
+        train = self.trains.pop(key, None)
+        if train is not None:
+            self.trainBytes -= trainBytes(train)
+
+    def clear(self):
+        s = self
+        with s.lock:
+            s.routes.clear()
+            s.trains.clear()
+            s.trainBytes = 0
+            s.pending = []
+            s.rewrite = True
+
+    def stats(self):
+        s = self
+        total = s.hits + s.routeHits + s.misses
+        return {"entries": len(s.routes), "trains": len(s.trains), "trainBytes": s.trainBytes, \
+                "hits": s.hits, "routeHits": s.routeHits, "misses": s.misses, \
+                "hitRate": (s.hits + s.routeHits)/total if total else 0.0}
+
+    #----- Disk persistence
+    @staticmethod
+    def row(key, route):
+        start, waypoints = route
+        return json.dumps(list(key) + [list(start), [list(w) for w in waypoints]]) + "\n"
+
+    def save(self, path = None):
+        """
+        Appends the routes found since the last save to <path>.jsonl, or writes the
+        whole file (atomically) if it's new, was built with other settings or is due
+        to be compacted.
+        """
+        s = self
+        path = path or s.path
+        if path is None:
+            return None
+        with s.lock:
+            rewrite = s.rewrite or path != s.path or not os.path.exists(path + ".jsonl")
+            rows = list(s.routes.items()) if rewrite else s.pending
+            s.pending = []
+        lines = "".join(s.row(key, route) for key, route in rows)
+        if rewrite:
+            with open(path + ".jsonl.tmp", "w") as f:
+                f.write(json.dumps({"settings": s.settings}) + "\n")
+                f.write(lines)
+            os.replace(path + ".jsonl.tmp", path + ".jsonl")
+            s.lines = len(rows)
+        else:
+            with open(path + ".jsonl", "a") as f:
+                f.write(lines)
+            s.lines += len(rows)
+        if path == s.path:
+            s.rewrite = s.lines > 2*max(len(s.routes), 1)
+
+    def load(self, path = None):
+        """
+        Reads the saved routes. Their trains are compiled when first used.
+        Outputs: number of routes loaded
+        """
+        s = self
+        path = path or s.path
+        routes = OrderedDict()
+        lines = 0
+        try:
+            with open(path + ".jsonl") as f:
+                if json.loads(f.readline()).get("settings") != s.settings:
+                    return 0
+                for line in f:
+                    try:
+                        fromIndex, toIndex, pieceClass, signature, start, waypoints = json.loads(line)
+                    except ValueError:
+                        continue # a line cut short when the power went
+                    lines += 1
+                    key = (fromIndex, toIndex, pieceClass, signature)
+                    routes.pop(key, None)
+                    routes[key] = (tuple(start), [tuple(w) for w in waypoints])
+        except (OSError, ValueError, AttributeError):
+            return 0
+        with s.lock:
+            s.routes.update(routes)
+            while len(s.routes) > s.capacity:
+                old, _ = s.routes.popitem(last=False)
+                s.dropTrain(old)
+            if path == s.path:
+                s.lines = lines
+                s.rewrite = lines > 2*max(len(s.routes), 1)
+        return len(routes)
+
+
+def warmFromPGN(board, pgnPath, maxGames = None):
+    """
+    Fills board.routeCache with the carries and magnet-off hops of every move in a
+    PGN file, played the way realBoard.movePiece would play them from the starting
+    position with an empty piece bank.
+    Outputs: number of trains compiled (or found already cached)
+    """
+    import chess.pgn
+    from sequencing import sequence
+    from legs import moveLegs
+    count = 0
+    with open(pgnPath) as f:
+        games = 0
+        while maxGames is None or games < maxGames:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            games += 1
+            position = game.board()
+            bank = board.bank.copy()
+            bank.clear()
+            here = None
+            for move in game.mainline_moves():
+                occupied = set(position.piece_map()) | set(bank.occupiedSlots())
+                legs = moveLegs(position, move, bank)
+                start = board.squareCoords[(legs[0][0] if here is None else here) + BANK_SIZE]
+                legs, _, _ = sequence(board, legs, start)
+                for fromIndex, toIndex, symbol in legs:
+                    if here is not None and here != fromIndex:
+                        board.compileCarry(here, fromIndex, None)
+                        count += 1
+                    board.compileCarry(fromIndex, toIndex, symbol, occupied)
+                    occupied = (occupied - {fromIndex}) | {toIndex}
+                    here = toIndex
+                    count += 1
+                position.push(move)
+    return count
+
@@ -0,0 +1,273 @@
+import heapq
+import numpy as np
+
+def occupiedCells(occupied, cells):
+    """
+    Converts board occupancy to a set of (file, rank) cells.
+    Inputs:
+        occupied = a chess.Board, a 64-bit occupancy mask (like chess.Board.occupied),
+            or an iterable of square indices (0-63, or bank slots, see bank.py)
+        cells = {index: (file, rank)} of the board (realBoard.cells)
+    """
+    if hasattr(occupied, "occupied"):
+        occupied = occupied.occupied
+    if isinstance(occupied, (int, np.integer)):
+        occupied = [sq for sq in range(64) if (int(occupied) >> sq) & 1]
+    return {cells[sq] for sq in occupied}
+
+
+class Router():
+    ################
+    # A* piece router.
+    #
+    # The gantry area is modelled as a lattice with half-square spacing, so a node is
+    # either a square center, the middle of a square edge (the lanes between squares)
+    # or a square corner. Moves go to any of the 8 neighbouring nodes.
+    # A move is blocked if its midpoint falls inside an occupied square, so a piece can
+    # run along the lanes between occupied squares but never through one.
+    #
+    # Costs are in seconds of motor time: a CoreXY move takes max(|m1|, |m2|) steps,
+    # so 45 degree diagonals (one motor) are cheap and x/y moves (both motors) are not.
+    # Every change of heading adds the time lost slowing down to the junction speed
+    # the planner allows for that corner and speeding back up, so straight runs win.
+    # The heuristic (motor time of the straight line) never overestimates, so routes are optimal.
+    #
+    # fastest() then compares the A* route against a few other shapes (the route with
+    # corners cut, the straight line, the knight detours) using the real planner
+    # timing, acceleration and junctions included, and keeps whichever is quickest.
+    ################
+
+    HEADINGS = [(1,0), (1,1), (0,1), (-1,1), (-1,0), (-1,-1), (0,-1), (1,-1)]
+
+    def __init__(self, board):
+        """
+        Inputs:
+            board = realBoard whose geometry, limits and motion profile are used
+        """
+        s = self
+        s.board = board
+        s.half = board.squareSize/2
+
+        #----- Lattice extent (strictly inside the boundaries)
+        s.uMin = int(np.floor((board.xLoBound - board.xOrigin)/s.half)) + 1
+        s.uMax = int(np.ceil((board.xHiBound - board.xOrigin)/s.half)) - 1
+        s.vMin = int(np.floor((board.yLoBound - board.yOrigin)/s.half)) + 1
+        s.vMax = int(np.ceil((board.yHiBound - board.yOrigin)/s.half)) - 1
+
+        #----- Cost of one lattice move per heading, and of every heading change
+        prof = board.profile
+        s.stepCost = [s.motorTime(h[0]*s.half, h[1]*s.half) for h in s.HEADINGS]
+        units = []
+        for du, dv in s.HEADINGS:
+            m = board.coreXY((du, dv))
+            units.append(m/np.max(np.abs(m)))
+        s.turnCost = np.zeros((8, 8))
+        for i in range(8):
+            for j in range(8):
+                jump = np.max(np.abs(units[i] - units[j]))
+                if jump == 0:
+                    continue
+                vJ = min(prof.vMax, max(prof.vStart, board.planner.maxJump/jump))
+                # Time lost decelerating to vJ and accelerating back, vs cruising
+                s.turnCost[i, j] = (prof.vMax - vJ)**2/(prof.accel*prof.vMax)
+
+    def motorTime(self, dx, dy):
+        """
+        Seconds the motors need to move (dx, dy) inches at cruise speed
+        """
+        b = self.board
+        m = b.coreXY((dx*b.stepsPerInch, dy*b.stepsPerInch))
+        return np.max(np.abs(m))/b.profile.vMax
+
+    def squareNode(self, square):
+        """
+        Lattice node of a square's (or bank slot's) center
+        """
+        f, r = self.board.cells[square]
+        return (2*f + 1, 2*r + 1)
+
+    def nodeCoords(self, node):
+        """
+        Absolute (x, y) inches of a lattice node
+        """
+        b = self.board
+        return (b.xOrigin + node[0]*self.half, b.yOrigin + node[1]*self.half)
+
+    def inside(self, node):
+        s = self
+        return s.uMin <= node[0] <= s.uMax and s.vMin <= node[1] <= s.vMax
+
+    @staticmethod
+    def crossedCell(a, b):
+        """
+        The (file, rank) cell whose interior the move a -> b passes through,
+        or None if it runs along a lane.
+        """
+        su, sv = a[0] + b[0], a[1] + b[1]  # twice the midpoint, in half squares
+        if su % 4 == 0 or sv % 4 == 0:
+            return None
+        return (su // 4, sv // 4)
+
+    def isClear(self, nodes, blocked):
+        """
+        True if a polyline (lattice coordinates, not necessarily on lattice nodes) stays
+        inside the boundaries and never enters a blocked cell's interior.
+        """
+        s = self
+        eps = 1e-6
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            n = int(np.ceil(32*max(abs(b[0] - a[0]), abs(b[1] - a[1])))) + 1
+            t = np.linspace(0.0, 1.0, n + 1)
+            u = a[0] + (b[0] - a[0])*t
+            v = a[1] + (b[1] - a[1])*t
+            if u.min() < s.uMin or u.max() > s.uMax or v.min() < s.vMin or v.max() > s.vMax:
+                return False
+            # Points on a lane (even lattice coordinate) aren't inside any cell
+            inside = (np.abs(u/2 - np.round(u/2)) > eps) & (np.abs(v/2 - np.round(v/2)) > eps)
+            cells = zip(np.floor(u[inside]/2).astype(int), np.floor(v[inside]/2).astype(int))
+            if any(cell in blocked for cell in cells):
+                return False
+        return True
+
+    def shortcut(self, nodes, blocked):
+        """
+        Cuts corners off a route: joins each waypoint straight to the furthest later
+        waypoint it can see. The legs may end up at any angle, which in CoreXY is
+        never slower than the lattice legs they replace.
+        """
+        s = self
+        out = [nodes[0]]
+        i = 0
+        while i < len(nodes) - 1:
+            j = len(nodes) - 1
+            while j > i + 1 and not s.isClear([nodes[i], nodes[j]], blocked):
+                j -= 1
+            out.append(nodes[j])
+            i = j
+        return out
+
+    def knightShapes(self, start, end):
+        """
+        Detours for a knight that only ever touch the lane between its two files (or ranks):
+            - half a square sideways, along the lane, half a square sideways (the old routine)
+            - diagonally to the lane, along it, diagonally into the target (each
+              diagonal only turns one motor, and the corners are gentler)
+        Outputs: list of lattice-coordinate polylines
+        """
+        a, b = self.squareNode(start), self.squareNode(end)
+        du, dv = b[0] - a[0], b[1] - a[1]
+        if sorted((abs(du), abs(dv))) != [2, 4]:
+            return []
+        su, sv = int(np.sign(du)), int(np.sign(dv))
+        if abs(du) == 2:
+            # Long along y: the lane runs between the two files
+            lane = [(a[0] + su, a[1]), (a[0] + su, b[1])]
+            diag = [(a[0] + su, a[1] + sv), (a[0] + su, b[1] - sv)]
+        else:
+            lane = [(a[0], a[1] + sv), (b[0], a[1] + sv)]
+            diag = [(a[0] + su, a[1] + sv), (b[0] - su, a[1] + sv)]
+        return [[a] + lane + [b], [a] + diag + [b]]
+
+    def fastest(self, start, end, movingPiece, occupied = None):
+        """
+        Picks the quickest path for a piece, timed with the board's planner.
+        Inputs:
+            start, end = square indices (0-63, or bank slots)
+            movingPiece = symbol of the moving piece
+            occupied = board occupancy (see occupiedCells). If None, the other pieces
+                are unknown: knights take one of their lane detours and everything
+                else goes straight.
+        Outputs:
+            list of absolute (x, y) waypoints in inches, from start to end center
+        """
+        s = self
+        a, b = s.squareNode(start), s.squareNode(end)
+        isKnight = movingPiece.lower() == "n"
+        if occupied is None:
+            candidates = s.knightShapes(start, end) if isKnight else []
+            blocked = set()
+        else:
+            blocked = occupiedCells(occupied, s.board.cells) - {(a[0]//2, a[1]//2), (b[0]//2, b[1]//2)}
+            candidates = [s.latticeRoute(a, b, blocked)]
+            candidates.append(s.shortcut(candidates[0], blocked))
+            candidates += s.knightShapes(start, end)
+            candidates = [c for c in candidates if s.isClear(c, blocked)]
+        if not isKnight and s.isClear([a, b], blocked):
+            candidates.append([a, b])
+        if len(candidates) == 0:
+            raise RuntimeError(f"No route from square {start} to square {end}")
+
+        start = s.nodeCoords(a)
+        paths = [[s.nodeCoords(node) for node in c] for c in candidates]
+        times = [s.board.pathDuration(path[1:], start) for path in paths]
+        return paths[int(np.argmin(times))]
+
+    def route(self, start, end, occupied = ()):
+        """
+        Finds the fastest collision-free route for a piece.
+        Inputs:
+            start, end = square indices (0-63)
+            occupied = board occupancy (see occupiedCells). The start and end squares
+                are always treated as free.
+        Outputs:
+            list of absolute (x, y) waypoints in inches, from start to end center,
+            with straight runs merged into single legs
+        """
+        s = self
+        a, goal = s.squareNode(start), s.squareNode(end)
+        free = {(a[0]//2, a[1]//2), (goal[0]//2, goal[1]//2)}
+        blocked = occupiedCells(occupied, s.board.cells) - free
+        return [s.nodeCoords(node) for node in s.latticeRoute(a, goal, blocked)]
+
+    def latticeRoute(self, a, goal, blocked):
+        """
+        A* search between two lattice nodes.
+        Outputs: list of lattice nodes where the heading changes (start and goal included)
+        """
+        s = self
+
+        def h(node):
+            return s.motorTime((goal[0] - node[0])*s.half, (goal[1] - node[1])*s.half)
+
+        #----- A* over (node, heading) states
+        startState = (a, -1)
+        best = {startState: 0.0}
+        parent = {startState: None}
+        heap = [(h(a), 0.0, a, -1)]
+        found = None
+        while heap:
+            f, g, node, heading = heapq.heappop(heap)
+            if g > best.get((node, heading), np.inf):
+                continue
+            if node == goal:
+                found = (node, heading)
+                break
+            for i, (du, dv) in enumerate(s.HEADINGS):
+                nxt = (node[0] + du, node[1] + dv)
+                if not s.inside(nxt) or s.crossedCell(node, nxt) in blocked:
+                    continue
+                cost = g + s.stepCost[i]
+                if heading >= 0:
+                    cost += s.turnCost[heading, i]
+                state = (nxt, i)
+                if cost < best.get(state, np.inf):
+                    best[state] = cost
+                    parent[state] = (node, heading)
+                    heapq.heappush(heap, (cost + h(nxt), cost, nxt, i))
+
+        if found is None:
+            raise RuntimeError(f"No route from {s.nodeCoords(a)} to {s.nodeCoords(goal)}")
+
+        #----- Walk back, keeping only the nodes where the heading changes
+        states = []
+        state = found
+        while state is not None:
+            states.append(state)
+            state = parent[state]
+        states.reverse()
+        nodes = [states[0][0]]
+        for k in range(1, len(states)):
+            last = k == len(states) - 1
+            if last or states[k + 1][1] != states[k][1]:
+                nodes.append(states[k][0])
+        return nodes
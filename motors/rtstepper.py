@@ -0,0 +1,287 @@
+import gc
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from time import sleep, perf_counter
+import numpy as np
+from planner import StepTrain
+from stepper import StepExecutor
+
+################
+# Optional motion backend: steps the motors from a dedicated process.
+#
+# The main process (GUI, planner) compiles StepTrains and streams their ticks into
+# a ring buffer in shared memory. The stepping process pins itself to one CPU,
+# asks for SCHED_FIFO priority, turns off the garbage collector and plays the
+# ticks with a StepExecutor. Progress, lateness and the stop flag come back
+# through a small header in the same shared memory block.
+#
+# Without CAP_SYS_NICE (or root) the SCHED_FIFO request fails and the process
+# simply runs at normal priority; s.isRealtime() tells which one we got.
+################
+
+#----- Tick record bits
+STEP_L = 1
+STEP_R = 2
+DIR_L  = 4
+DIR_R  = 8
+START  = 16  # first tick of a new train: restart the clock
+
+#----- Header slots (int64)
+HEAD      = 0   # ticks written by the main process (total)
+TAIL      = 1   # ticks consumed by the stepping process (total)
+EXECUTED  = 2   # ticks actually pulsed (total)
+STOP      = 3   # main -> stepper: abort the current train. Cleared by the stepper once flushed.
+QUIT      = 4   # main -> stepper: exit
+READY     = 5   # stepper -> main: set up and polling
+REALTIME  = 6   # stepper -> main: 1 if SCHED_FIFO was granted
+CPU       = 7   # stepper -> main: cpu it is pinned to (-1 if affinity failed)
+TICKS     = 8   # lateness stats, copied from the stepper's StepExecutor
+LATE_SUM  = 9
+LATE_MAX  = 10
+SLIPS     = 11
+HEADER_SIZE = 16
+
+# The stepper hands ticks back (advances TAIL) every 1/SUBCHUNKS of the ring, so the
+# main process can refill a train longer than the ring while the rest is still pulsing
+SUBCHUNKS = 8
+
+def packTrain(train):
+    """
+    Packs a StepTrain's masks and directions into one uint8 per tick (STEP_L, STEP_R, DIR_L, DIR_R).
+    """
+    bits = train.lMask.astype(np.uint8)*STEP_L
+    bits |= train.rMask.astype(np.uint8)*STEP_R
+    bits |= train.lDir.astype(np.uint8)*DIR_L
+    bits |= train.rDir.astype(np.uint8)*DIR_R
+    if len(bits) > 0:
+        bits[0] |= START
+    return bits
+
+def unpackTrain(times, bits):
+    """
+    Inverse of packTrain.
+    """
+    return StepTrain(times, (bits & STEP_L) != 0, (bits & STEP_R) != 0, \
+        (bits & DIR_L) != 0, (bits & DIR_R) != 0)
+
+def gpioOutput(stepPins, dirPins):
+    """
+    Default pin factory for the stepping process: sets up RPi.GPIO in the child process.
+    Outputs: (output function, high, low)
+    """
+    import RPi.GPIO as GPIO
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    for pin in tuple(stepPins) + tuple(dirPins):
+        GPIO.setup(pin, GPIO.OUT)
+    return GPIO.output, GPIO.HIGH, GPIO.LOW
+
+
+class _SharedFlag():
+    """
+    Lets the StepExecutor poll the shared STOP slot like a threading.Event
+    """
+    def __init__(self, header):
+        self.header = header
+
+    def is_set(self):
+        return self.header[STOP] != 0
+
+
+def _layout(buf, capacity):
+    header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=buf)
+    times  = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=HEADER_SIZE*8)
+    bits   = np.ndarray((capacity,), dtype=np.uint8, buffer=buf, offset=HEADER_SIZE*8 + capacity*8)
+    return header, times, bits
+
+def _stepperMain(shmName, capacity, stepPins, dirPins, cpu, priority, outputFactory):
+    """
+    Entry point of the stepping process.
+    """
+    shm = shared_memory.SharedMemory(name=shmName)
+    header, times, bits = _layout(shm.buf, capacity)
+
+    #----- Real-time setup, each step falls back quietly if not permitted
+    header[CPU] = -1
+    try:
+        os.sched_setaffinity(0, {cpu})
+        header[CPU] = cpu
+    except (AttributeError, OSError, ValueError):
+        pass
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        header[REALTIME] = 1
+    except (AttributeError, OSError):
+        header[REALTIME] = 0
+    gc.disable()
+
+    output, high, low = outputFactory(stepPins, dirPins)
+    executor = StepExecutor(output, stepPins, dirPins, high, low)
+    stop = _SharedFlag(header)
+    header[READY] = 1
+
+    chunkBits = None
+    maxChunk = max(1, capacity//SUBCHUNKS)
+    try:
+        while header[QUIT] == 0:
+            if header[STOP] != 0:
+                # Drop everything queued and acknowledge
+                header[TAIL] = header[HEAD]
+                header[STOP] = 0
+                continue
+            tail, head = int(header[TAIL]), int(header[HEAD])
+            if head == tail:
+                sleep(0.0005)
+                continue
+
+            #----- Take a contiguous chunk, ending at the wrap, before the next train or
+            # after maxChunk ticks (its slots are freed as soon as it's pulsed)
+            i = tail % capacity
+            n = min(head - tail, capacity - i, maxChunk)
+            chunkBits = bits[i:i + n]
+            starts = np.flatnonzero(chunkBits[1:] & START)
+            if len(starts) > 0:
+                n = int(starts[0]) + 1
+                chunkBits = chunkBits[:n]
+            chunk = unpackTrain(times[i:i + n].copy(), chunkBits.copy())
+            resume = (chunkBits[0] & START) == 0
+
+            done = executor.run(chunk, stop, resume)
+            header[EXECUTED] += done
+            header[TAIL] = tail + n
+            header[TICKS] = executor.ticks
+            header[LATE_SUM] = executor.totalLateNs
+            header[LATE_MAX] = executor.maxLateNs
+            header[SLIPS] = executor.slips
+    finally:
+        del header, times, bits, chunkBits
+        shm.close()
+
+
+class RealtimeStepper():
+    ################
+    # Main-process handle on the stepping process. run() has the same signature as
+    # StepExecutor.run, so realBoard can use either one as s.stepper.
+    ################
+
+    def __init__(self, stepPins, dirPins, capacity = 1 << 16, cpu = None, \
+        priority = 50, outputFactory = gpioOutput, timeout = 10.0):
+        """
+        Inputs:
+            stepPins, dirPins = (left, right) STEP and DIR pins
+            capacity = ring buffer size (ticks)
+            cpu = cpu to pin the stepping process to. Defaults to the last one.
+            priority = SCHED_FIFO priority (1-99)
+            outputFactory = picklable function(stepPins, dirPins) -> (output, high, low),
+                called inside the stepping process to get its pin driver
+            timeout = seconds to wait for the stepping process to come up
+        """
+        s = self
+        s.capacity = capacity
+        if cpu is None:
+            cpu = (os.cpu_count() or 1) - 1
+        size = HEADER_SIZE*8 + capacity*9
+        s.shm = shared_memory.SharedMemory(create=True, size=size)
+        s.header, s.times, s.bits = _layout(s.shm.buf, capacity)
+        s.header[:] = 0
+
+        ctx = mp.get_context("spawn")
+        s.process = ctx.Process(target=_stepperMain, daemon=True, \
+            args=(s.shm.name, capacity, tuple(stepPins), tuple(dirPins), cpu, priority, outputFactory))
+        s.process.start()
+
+        deadline = perf_counter() + timeout
+        while s.header[READY] == 0:
+            if not s.process.is_alive() or perf_counter() > deadline:
+                s.close()
+                raise RuntimeError("Stepping process failed to start")
+            sleep(0.001)
+
+    def isRealtime(self):
+        """
+        True if the stepping process got SCHED_FIFO priority
+        """
+        return bool(self.header[REALTIME])
+
+    def progress(self):
+        """
+        Outputs: (ticks written, ticks consumed, ticks pulsed) since the process started
+        """
+        h = self.header
+        return int(h[HEAD]), int(h[TAIL]), int(h[EXECUTED])
+
+    def stats(self):
+        """
+        Same report as StepExecutor.stats, read back from the stepping process
+        """
+        h = self.header
+        ticks = int(h[TICKS])
+        meanLate = h[LATE_SUM]/ticks if ticks else 0.0
+        return {"ticks": ticks, "totalLateUs": h[LATE_SUM]/1e3, \
+                "meanLateUs": meanLate/1e3, "maxLateUs": h[LATE_MAX]/1e3, \
+                "slips": int(h[SLIPS]), "realtime": self.isRealtime()}
+
+    def run(self, train, stop = None):
+        """
+        Streams a StepTrain to the stepping process and waits until it has been pulsed.
+        Inputs:
+            train = StepTrain (see planner.py)
+            stop = optional threading.Event that aborts the train
+        Outputs:
+            number of ticks that were sent
+        """
+        s = self
+        h = s.header
+        cap = s.capacity
+        times = train.times
+        bits = packTrain(train)
+        n = len(times)
+        base = int(h[EXECUTED])
+        written = 0
+
+        while True:
+            if stop is not None and stop.is_set():
+                h[STOP] = 1
+                while h[STOP] != 0 and s.process.is_alive():
+                    sleep(0.0005)
+                break
+
+            #----- Write as much as fits
+            if written < n:
+                head = int(h[HEAD])
+                free = cap - (head - int(h[TAIL]))
+                if free > 0:
+                    i = head % cap
+                    k = min(free, n - written, cap - i)
+                    s.times[i:i + k] = times[written:written + k]
+                    s.bits[i:i + k] = bits[written:written + k]
+                    written += k
+                    h[HEAD] = head + k
+                    continue
+            elif h[TAIL] == h[HEAD]:
+                break
+
+            if not s.process.is_alive():
+                raise RuntimeError("Stepping process died")
+            sleep(0.001)
+
+        return int(h[EXECUTED]) - base
+
+    def close(self):
+        """
+        Stops the stepping process and frees the shared memory
+        """
+        s = self
+        if s.shm is None:
+            return None
+        if s.process is not None and s.process.is_alive():
+            s.header[QUIT] = 1
+            s.process.join(timeout=2)
+            if s.process.is_alive():
+                s.process.terminate()
+        s.process = None
+        del s.header, s.times, s.bits
+        s.shm.close()
+        s.shm.unlink()
+        s.shm = None
@@ -0,0 +1,171 @@
+import numpy as np
+from bank import BANK_SIZE
+from arrange import travelTimes
+
+################
+# Ordering the legs of a multi-piece operation.
+#
+# A leg is one magnet-on carry: (fromIndex, toIndex, symbol), with squares or bank slots
+# as indices. Castling, en passant, captures, promotions and board setups are several
+# legs joined by magnet-off hops, and only the hops depend on the order. Picking the
+# order is a travelling salesman problem over the hops, with precedence constraints:
+# a leg that touches a square (or slot) an earlier leg touches has to stay after it
+# (the square must be vacated before it's filled, a piece must arrive before it leaves).
+#   - up to EXACT_LEGS legs: exact Held-Karp dynamic programming over subsets
+#   - more (board setups): nearest feasible leg first, then moving single legs to
+#     better places while that keeps helping
+################
+
+EXACT_LEGS = 12
+
+def precedence(legs):
+    """
+    before[j] = bit mask of the legs that have to run before leg j
+    """
+    before = [0]*len(legs)
+    for j in range(len(legs)):
+        touched = {legs[j][0], legs[j][1]}
+        for i in range(j):
+            if touched & {legs[i][0], legs[i][1]}:
+                before[j] |= 1 << i
+    return before
+
+
+def hopCosts(board, legs, start):
+    """
+    Motor time (s) of the magnet-off hops:
+        first[j] = from the gantry start position to the start of leg j
+        hop[i, j] = from the end of leg i to the start of leg j
+    """
+    starts = [leg[0] for leg in legs]
+    ends = [leg[1] for leg in legs]
+    hop = travelTimes(board, ends, starts)
+    d = board.squareCoords[np.array(starts) + BANK_SIZE] - np.asarray(start)
+    m = board.coreXY((d[:, 0]*board.stepsPerInch, d[:, 1]*board.stepsPerInch))
+    first = np.max(np.abs(m), axis=0)/board.profile.vMax
+    return first, hop
+
+
+def orderCost(order, first, hop):
+    if len(order) == 0:
+        return 0.0
+    order = np.asarray(order)
+    return first[order[0]] + hop[order[:-1], order[1:]].sum()
+
+
+def feasible(order, before):
+    done = 0
+    for j in order:
+        if before[j] & ~done:
+            return False
+        done |= 1 << j
+    return True
+
+
+def exactOrder(first, hop, before):
+    """
+    Held-Karp over (set of legs done, last leg), only extending sets by legs whose
+    predecessors are all done.
+    """
+    n = len(first)
+    full = (1 << n) - 1
+    cost = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=int)
+    for j in range(n):
+        if before[j] == 0:
+            cost[1 << j, j] = first[j]
+    for mask in range(1, full):
+        row = cost[mask]
+        if not np.isfinite(row).any():
+            continue
+        for j in range(n):
+            if mask & (1 << j) or before[j] & ~mask:
+                continue
+            total = row + hop[:, j]
+            last = int(np.argmin(total))
+            nxt = mask | (1 << j)
+            if total[last] < cost[nxt, j]:
+                cost[nxt, j] = total[last]
+                parent[nxt, j] = last
+    last = int(np.argmin(cost[full]))
+    order = []
+    mask = full
+    while last >= 0:
+        order.append(last)
+        last, mask = parent[mask, last], mask & ~(1 << last)
+    return order[::-1]
+
+
+def heuristicOrder(first, hop, before):
+    """
+    Nearest feasible leg first, then relocating single legs while it helps.
+    """
+    n = len(first)
+    order = []
+    done = 0
+    dist = first
+    for _ in range(n):
+        ready = [j for j in range(n) if not done & (1 << j) and not before[j] & ~done]
+        j = ready[int(np.argmin(dist[ready]))]
+        order.append(j)
+        done |= 1 << j
+        dist = hop[j]
+
+    best = orderCost(order, first, hop)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n):
+            rest = order[:i] + order[i + 1:]
+            for k in range(n):
+                if k == i:
+                    continue
+                trial = rest[:k] + [order[i]] + rest[k:]
+                c = orderCost(trial, first, hop)
+                if c < best - 1e-9 and feasible(trial, before):
+                    order, best, improved = trial, c, True
+                    break
+            if improved:
+                break
+    return order
+
+
+def travelDuration(board, legs, start):
+    """
+    Planned time (s) of a leg order: the magnet-off hops plus the legs themselves
+    (legs timed as straight lines, the real route may detour around pieces).
+    """
+    total = 0.0
+    here = start
+    for fromIndex, toIndex, _ in legs:
+        a = tuple(board.squareCoords[fromIndex + BANK_SIZE])
+        b = tuple(board.squareCoords[toIndex + BANK_SIZE])
+        total += board.pathDuration([a], here) + board.pathDuration([b], a)
+        here = b
+    return total
+
+
+def sequence(board, legs, start = None):
+    """
+    Reorders legs to minimise empty travel, keeping every precedence constraint.
+    Inputs:
+        board = realBoard
+        legs = list of (fromIndex, toIndex, symbol) in a valid (naive) order
+        start = (x, y) gantry position in inches. Defaults to the current position.
+    Outputs:
+        (legs in the new order, expected duration (s), naive duration (s))
+    """
+    if start is None:
+        start = (board.currentX, board.currentY)
+    legs = list(legs)
+    if len(legs) < 2:
+        naive = travelDuration(board, legs, start)
+        return legs, naive, naive
+    before = precedence(legs)
+    first, hop = hopCosts(board, legs, start)
+    if len(legs) <= EXACT_LEGS:
+        order = exactOrder(first, hop, before)
+    else:
+        order = heuristicOrder(first, hop, before)
+    ordered = [legs[j] for j in order]
+    return ordered, travelDuration(board, ordered, start), travelDuration(board, legs, start)
@@ -0,0 +1,56 @@
+import time
+
+################
+# Clocks for the motion stack. Everything that waits on physical time (the pulse
+# deadlines in StepExecutor, the settle pause before the magnet grabs a piece) asks
+# board.clock instead of the time module.
+#
+#   WallClock = real time (the default, what the motors need)
+#   SimClock  = virtual time for simulation (with pins.SimDriver): waiting just moves
+#               the clock forward, so a whole game of movePiece calls runs as fast as
+#               it can be computed, while now() still tells exactly how long it would
+#               have taken on the real gantry.
+#
+# Both give now() in nanoseconds, like time.perf_counter_ns.
+################
+
+class WallClock():
+    virtual = False
+
+    def now(self):
+        return time.perf_counter_ns()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class SimClock():
+    virtual = True
+
+    def __init__(self, start = 0):
+        """
+        Inputs:
+            start = initial time (ns)
+        """
+        self.t = int(start)
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.t += int(round(seconds*1e9))
+
+    def advanceTo(self, t):
+        """
+        Moves the clock forward to t (ns). It never goes back.
+        """
+        if t > self.t:
+            self.t = int(t)
+
+    def elapsed(self, since = 0):
+        """
+        Virtual seconds since 'since' (ns)
+        """
+        return (self.t - since)/1e9
@@ -0,0 +1,217 @@
+from time import perf_counter_ns, sleep
+
+class StepExecutor():
+    ################
+    # Sends a compiled StepTrain to the motors on absolute deadlines.
+    #
+    # sleep() on Linux overshoots by tens of microseconds (more with GIL hand-offs),
+    # which at our step rates is a large share of every period. Instead, every tick
+    # has an absolute deadline (perf_counter_ns), and we:
+    #   1) sleep until spinTime before the deadline, then
+    #   2) busy-wait the rest of the way.
+    # Lateness is measured on every tick. If a tick comes out so late that the
+    # following deadlines have already passed (e.g. a long GC pause), the schedule
+    # is shifted instead of firing a burst of catch-up pulses, which would skip steps.
+    #
+    # With a virtual clock (simclock.SimClock) there is nothing to wait for: every
+    # tick just moves the clock to its deadline, so it is never late. If the pin
+    # driver can play ticks in bulk (player, e.g. pins.SimDriver.playTrain), the train
+    # goes to it CHUNK ticks at a time. A train run with a stop event is still pulsed
+    # tick by tick, so it stops on exactly the tick the real loop would.
+    #
+    # Setting s.recorder to a jitter.JitterRecorder records every tick's deadline and
+    # actual STEP edge time (off by default).
+    ################
+
+    CHUNK = 4096 # ticks handed to the player at once (see _runVirtual)
+
+    def __init__(self, output, stepPins, dirPins, high, low, \
+        spinTime = 0.0002, pulseWidth = 0.000003, maxSlip = 0.0005, clock = None, player = None):
+        """
+        Inputs:
+            output = function(pin, value) that drives a pin (e.g. GPIO.output)
+            stepPins = (left STEP pin, right STEP pin)
+            dirPins = (left DIR pin, right DIR pin)
+            high, low = pin values. high is also the CW direction.
+            spinTime = how long before a deadline to stop sleeping and start spinning (s)
+            pulseWidth = how long the STEP pins are held high (s)
+            maxSlip = lateness (s) above which the rest of the schedule is shifted
+            clock = simclock clock (None = real time, perf_counter_ns)
+            player = optional function(train, start, begin, end) -> bool playing ticks
+                begin..end at once, or returning False if they must be pulsed one by one.
+                Only used on a virtual clock, without a recorder or a stop event.
+        """
+        s = self
+        s.output = output
+        s.stepPins = stepPins
+        s.dirPins = dirPins
+        s.high = high
+        s.low = low
+        s.spinNs  = int(spinTime*1e9)
+        s.pulseNs = int(pulseWidth*1e9)
+        s.slipNs  = int(maxSlip*1e9)
+        s.clock = clock
+        s.player = player
+        s.recorder = None  # optional jitter.JitterRecorder
+        s.start = None  # clock origin (perf_counter_ns) of the train being run
+        s.resetStats()
+
+    def resetStats(self):
+        """
+        Clears the accumulated lateness counters.
+        """
+        s = self
+        s.ticks = 0          # pulse ticks sent
+        s.totalLateNs = 0    # sum of every tick's lateness
+        s.maxLateNs = 0      # worst single tick
+        s.slips = 0          # number of times the schedule had to be shifted
+
+    def stats(self):
+        """
+        Outputs: dictionary with the accumulated lateness since the last resetStats()
+        """
+        s = self
+        meanLate = s.totalLateNs/s.ticks if s.ticks else 0.0
+        return {"ticks": s.ticks, "totalLateUs": s.totalLateNs/1e3, \
+                "meanLateUs": meanLate/1e3, "maxLateUs": s.maxLateNs/1e3, "slips": s.slips}
+
+    def run(self, train, stop = None, resume = False):
+        """
+        Runs a StepTrain.
+        Inputs:
+            train = StepTrain (see planner.py) with tick times in ns from the start of the motion
+            stop = optional threading.Event. If it gets set, the train stops after the current tick.
+            resume = if True, the tick times continue the clock of the previous run() call
+                instead of starting now (used to stream one motion in several chunks)
+        Outputs:
+            number of ticks that were sent
+        """
+        s = self
+        if s.clock is not None and s.clock.virtual:
+            return s._runVirtual(train, stop, resume)
+        output = s.output
+        high, low = s.high, s.low
+        stepL, stepR = s.stepPins
+        dirL, dirR = s.dirPins
+        times = train.times.tolist()
+        lMask, rMask = train.lMask.tolist(), train.rMask.tolist()
+        lDir, rDir = train.lDir.tolist(), train.rDir.tolist()
+        spinNs, pulseNs, slipNs = s.spinNs, s.pulseNs, s.slipNs
+        recorder = s.recorder
+        if recorder is not None:
+            recorder.startTrain()
+
+        lastDirL = lastDirR = None
+        if resume and s.start is not None:
+            start = s.start
+        else:
+            start = perf_counter_ns()
+        s.start = start
+        for i in range(len(times)):
+            #----- Direction changes go out as early as possible (driver setup time)
+            if lDir[i] != lastDirL:
+                lastDirL = lDir[i]
+                output(dirL, high if lastDirL else low)
+            if rDir[i] != lastDirR:
+                lastDirR = rDir[i]
+                output(dirR, high if lastDirR else low)
+
+            #----- Wait for the deadline: coarse sleep, then spin
+            deadline = start + times[i]
+            remaining = deadline - perf_counter_ns()
+            if remaining > spinNs:
+                sleep((remaining - spinNs)/1e9)
+            now = perf_counter_ns()
+            while now < deadline:
+                now = perf_counter_ns()
+
+            #----- Pulse
+            if lMask[i]:
+                output(stepL, high)
+            if rMask[i]:
+                output(stepR, high)
+            edge = perf_counter_ns()
+            pulseEnd = edge + pulseNs
+            while perf_counter_ns() < pulseEnd:
+                pass
+            if lMask[i]:
+                output(stepL, low)
+            if rMask[i]:
+                output(stepR, low)
+
+            #----- Bookkeeping
+            if recorder is not None:
+                recorder.record(deadline, edge)
+            late = now - deadline
+            s.ticks += 1
+            s.totalLateNs += late
+            if late > s.maxLateNs:
+                s.maxLateNs = late
+            if late > slipNs:
+                start += late
+                s.start = start
+                s.slips += 1
+            if stop is not None and stop.is_set():
+                return i + 1
+        return len(times)
+
+    def _runVirtual(self, train, stop, resume):
+        """
+        run() against a virtual clock: same pin sequence, no waiting
+        """
+        s = self
+        clock = s.clock
+        recorder = s.recorder
+        if recorder is not None:
+            recorder.startTrain()
+        if resume and s.start is not None:
+            start = s.start
+        else:
+            start = clock.now()
+        s.start = start
+
+        #----- In bulk, as long as the player can take the ticks
+        n = len(train.times)
+        first = 0
+        if s.player is not None and recorder is None and stop is None:
+            while first < n:
+                end = min(n, first + s.CHUNK)
+                if not s.player(train, start, first, end):
+                    break
+                clock.advanceTo(start + int(train.times[end - 1]))
+                s.ticks += end - first
+                first = end
+            if first == n:
+                return n
+
+        #----- One pulse at a time
+        output = s.output
+        high, low = s.high, s.low
+        stepL, stepR = s.stepPins
+        dirL, dirR = s.dirPins
+        times = train.times[first:].tolist()
+        lMask, rMask = train.lMask[first:].tolist(), train.rMask[first:].tolist()
+        lDir, rDir = train.lDir[first:].tolist(), train.rDir[first:].tolist()
+        lastDirL = lastDirR = None
+        for i in range(len(times)):
+            if lDir[i] != lastDirL:
+                lastDirL = lDir[i]
+                output(dirL, high if lastDirL else low)
+            if rDir[i] != lastDirR:
+                lastDirR = rDir[i]
+                output(dirR, high if lastDirR else low)
+            clock.advanceTo(start + times[i])
+            if recorder is not None:
+                recorder.record(start + times[i], clock.now())
+            if lMask[i]:
+                output(stepL, high)
+            if rMask[i]:
+                output(stepR, high)
+            if lMask[i]:
+                output(stepL, low)
+            if rMask[i]:
+                output(stepR, low)
+            s.ticks += 1
+            if stop is not None and stop.is_set():
+                return first + i + 1
+        return n
@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+# The motors modules import each other by name, the way the GUI runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movement import realBoard
+from pins import SimDriver
+from simclock import SimClock
+
+ORIGIN = (1, 2 + 9/16) # x,y inches, as set up in GUInew_pyfile.py
+
+def makeBoard(start = (6.0, 6.0), clock = None, origin = ORIGIN, **kwargs):
+    """
+    realBoard on the simulated gantry, homed from 'start' (inches from the real zero).
+    Nothing is read from or written to disk unless stateFile / routeCacheFile are given.
+    Outputs: board, SimDriver
+    """
+    kwargs.setdefault("stateFile", None)
+    kwargs.setdefault("warmStart", False)
+    kwargs.setdefault("routeCacheFile", None)
+    sim = SimDriver(start=start)
+    board = realBoard(origin, pins=sim, clock=SimClock() if clock is None else clock, **kwargs)
+    return board, sim
+
+
+@pytest.fixture
+def board():
+    return makeBoard()[0]
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+import numpy as np
+from asyncboard import AsyncRealBoard
+
+def waitFor(event, timeout = 5.0):
+    # Blocks the event loop on purpose: the worker keeps going meanwhile
+    assert event.wait(timeout)
+
+
+def test_late_cancel_does_not_abort_the_next_job(board):
+    front = AsyncRealBoard(board)
+    started, go = threading.Event(), threading.Event()
+
+    def second():
+        started.set()
+        go.wait(5)
+        return board.stopEvent.is_set()
+
+    async def main():
+        first = asyncio.create_task(front._run(lambda: "done"))
+        nxt = asyncio.create_task(front._run(second))
+        await asyncio.sleep(0)
+        # The first job has finished and the second is on the gantry, but the
+        # first task hasn't been resumed yet when it gets cancelled
+        waitFor(started)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        go.set()
+        return await nxt
+
+    try:
+        assert asyncio.run(main()) is False
+    finally:
+        front.executor.shutdown()
+
+
+def test_cancel_aborts_the_running_job(board):
+    front = AsyncRealBoard(board)
+    started = threading.Event()
+    seen = []
+
+    def job():
+        started.set()
+        stop = board.stopEvent
+        while not stop.is_set():
+            time.sleep(0.001)
+        seen.append(stop)
+
+    async def main():
+        task = asyncio.create_task(front._run(job))
+        await asyncio.sleep(0)
+        waitFor(started)
+        task.cancel()
+        result = await asyncio.gather(task, return_exceptions=True)
+        return result[0]
+
+    try:
+        assert isinstance(asyncio.run(main()), asyncio.CancelledError)
+        assert len(seen) == 1
+        assert board.stopEvent is None
+    finally:
+        front.executor.shutdown()
+
+
+def test_cancel_drops_a_queued_job(board):
+    front = AsyncRealBoard(board)
+    release = threading.Event()
+    ran = []
+
+    async def main():
+        first = asyncio.create_task(front._run(lambda: release.wait(5)))
+        second = asyncio.create_task(front._run(lambda: ran.append(1)))
+        await asyncio.sleep(0.05)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        release.set()
+        await first
+
+    try:
+        asyncio.run(main())
+        front.executor.shutdown()
+        assert ran == []
+    finally:
+        release.set()
+
+
+def test_a_cancelled_move_brakes_to_a_stop(board):
+    front = AsyncRealBoard(board)
+    sim = board.pins
+    x0 = sim.position()[0]
+    reached = threading.Event()
+
+    def output(pin, value):
+        sim.output(pin, value)
+        if not reached.is_set() and sim.position()[0] > x0 + 2.0:
+            # Cruising: hold the gantry here until the cancel has set the abort event
+            reached.set()
+            stop = board.stopEvent
+            deadline = time.monotonic() + 5
+            while not stop.is_set() and time.monotonic() < deadline:
+                time.sleep(0.001)
+    board.stepper.output = output
+
+    async def main():
+        task = asyncio.create_task(front.move_to_square(7))
+        await asyncio.sleep(0)
+        waitFor(reached)
+        task.cancel()
+        return (await asyncio.gather(task, return_exceptions=True))[0]
+
+    try:
+        sim.clearLog()
+        assert isinstance(asyncio.run(main()), asyncio.CancelledError)
+        assert x0 + 2.0 < sim.position()[0] < board.getSquareCoords(7)[0]
+        assert np.allclose(sim.position(), (board.currentX, board.currentY), atol=board.inchPerStep)
+        times, pins, values = sim.pulses()
+        delays = np.diff(times[pins == board.STEP_1])/1e9
+        assert 1/delays[-1] <= 1.05*board.profile.vStart
+    finally:
+        front.executor.shutdown()
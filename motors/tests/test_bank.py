@@ -0,0 +1,51 @@
+import threading
+import chess
+import numpy as np
+import pytest
+from bank import WHITE_SLOTS, BLACK_SLOTS, ALL_INDICES, BANK_SIZE, squareCell
+from conftest import makeBoard
+from legs import moveArguments
+from movement import MoveAborted
+
+#----- Every bank slot is reachable, in front of the limit switches
+def test_slots_are_reachable_with_the_gui_origin(board):
+    slots = board.squareCoords[np.array(WHITE_SLOTS + BLACK_SLOTS) + BANK_SIZE]
+    assert (slots[:, 0] > board.switchClearance).all()
+    assert (slots[:, 1] > board.switchClearance).all()
+    assert (slots[:, 0] > board.xLoBound).all() and (slots[:, 0] < board.xHiBound).all()
+    assert (slots[:, 1] > board.yLoBound).all() and (slots[:, 1] < board.yHiBound).all()
+    assert len({board.cells[i] for i in ALL_INDICES}) == len(ALL_INDICES)
+
+@pytest.mark.parametrize("slot", WHITE_SLOTS + BLACK_SLOTS)
+def test_slots_are_routable(board, slot):
+    path = board.router.fastest(chess.E4, slot, "Q", chess.Board().occupied)
+    assert np.allclose(path[-1], board.squareCoords[slot + BANK_SIZE])
+    x, y = np.array(path).T
+    assert (x > board.xLoBound).all() and (y > board.yLoBound).all()
+
+def test_side_files_when_there_is_room():
+    board, sim = makeBoard(origin = (5, 3))
+    for index in ALL_INDICES:
+        assert board.cells[index] == squareCell(index)
+
+def test_too_close_to_the_switches():
+    with pytest.raises(ValueError):
+        makeBoard(origin = (0, 0))
+
+
+def test_a_capture_fills_the_bank_once_the_piece_is_there(board):
+    position = chess.Board("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1")
+    args, kwargs = moveArguments(position, chess.Move.from_uci("e4d5"))
+
+    #----- Stopped before the captured pawn moved: the bank is untouched, and so is a retry's choice
+    board.stopEvent = threading.Event()
+    board.stopEvent.set()
+    with pytest.raises(MoveAborted):
+        board.movePiece(*args, **kwargs)
+    board.stopEvent = None
+    assert board.bank.contents == {}
+
+    board.movePiece(*args, **kwargs)
+    slot, = board.bank.contents
+    assert board.bank.contents[slot] == "p" and slot in BLACK_SLOTS
+    assert board.centerIndex.get(tuple(board.motorSteps)) == chess.D5
@@ -0,0 +1,23 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+MOTORS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PGN = '[Event "test"]\n\n1. e4 d5 2. exd5 Qxd5 3. Nc3 Qa5 4. d4 Nf6 5. Nf3 Bf5 6. Bc4 e6 7. O-O *\n'
+
+#----- Command line: stdout is nothing but the report
+def test_cli_stdout_is_json(tmp_path):
+    pgn = tmp_path/"game.pgn"
+    pgn.write_text(PGN)
+    done = subprocess.run([sys.executable, os.path.join(MOTORS, "benchmark.py"), str(pgn), \
+                           "--summary-only", "--max-velocity", "5.0"], \
+                          cwd=MOTORS, capture_output=True, text=True, timeout=300)
+    assert done.returncode == 0, done.stderr
+    report = json.loads(done.stdout)
+    assert report["summary"]["moves"] == 13 and report["summary"]["failedGames"] == 0
+    assert "mm per revolution" in done.stderr
+    # Settings come back in the units they were given in
+    assert report["settings"]["maxVelocity"] == pytest.approx(5.0)
+    assert report["settings"]["acceleration"] == pytest.approx(20.0)
@@ -0,0 +1,26 @@
+import chess
+import pytest
+from legs import moveArguments
+
+GAME = ["e4", "d5", "exd5", "Qxd5", "Nc3", "Qa5", "d4", "Nf6", "Nf3", "Bf5", "Bc4", "e6", "O-O"]
+
+#----- The estimate is the time the simulated gantry then takes
+def test_estimate_matches_the_simulated_move_time(board):
+    position = chess.Board()
+    for san in GAME:
+        move = position.parse_san(san)
+        estimate = board.estimateDuration(move, position)
+        args, kwargs = moveArguments(position, move)
+        t0 = board.clock.now()
+        board.movePiece(*args, **kwargs)
+        took = (board.clock.now() - t0)/1e3 # us
+        assert estimate["total"] == pytest.approx(took, abs=1.0), san
+        position.push(move)
+
+def test_estimate_leaves_the_board_alone(board):
+    position = chess.Board("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+    steps = board.motorSteps.copy()
+    estimate = board.estimateDuration(chess.Move.from_uci("e4d5"), position)
+    assert len(estimate["legs"]) == 2
+    assert board.bank.contents == {}
+    assert (board.motorSteps == steps).all()
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+from conftest import makeBoard
+
+@pytest.mark.parametrize("start", [(6.0, 6.0), (15.0, 2.0), (0.5, 14.0), (0.3, 0.3)])
+def test_homing_finds_the_real_zero(start):
+    board, sim = makeBoard(start=start)
+    # calibrate() ends on a1: the board's idea of where that is has to be where the gantry is
+    assert np.allclose(sim.position(), board.getSquareCoords(0), atol=2*board.inchPerStep)
+    assert np.allclose(sim.position(), (board.currentX, board.currentY), atol=2*board.inchPerStep)
+    assert not any(sim.pressed())
+
+
+def test_homing_leaves_the_switch_callbacks_unhooked(board):
+    assert board.xLimitSwitch.when_pressed is None
+    assert board.yLimitSwitch.when_pressed is None
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from interpolate import lineSteps
+
+@pytest.mark.parametrize("l, r", [(10, 3), (3, 10), (-7, 7), (1000, -999), (5, 0), (0, -4), (17, 16)])
+def test_every_step_is_taken_once_and_the_major_motor_pulses_every_tick(l, r):
+    lMask, rMask = lineSteps(l, r)
+    n = max(abs(l), abs(r))
+    assert len(lMask) == len(rMask) == n
+    assert lMask.sum() == abs(l) and rMask.sum() == abs(r)
+    assert (lMask if abs(l) >= abs(r) else rMask).all()
+
+
+def test_the_minor_motor_is_spread_evenly():
+    lMask, rMask = lineSteps(1000, 300)
+    gaps = np.diff(np.flatnonzero(rMask))
+    assert gaps.max() - gaps.min() <= 1
+    # Halfway through the line, both motors are halfway too (within one step)
+    assert abs(rMask[:500].sum() - 150) <= 1
+
+
+def test_no_steps_no_ticks():
+    lMask, rMask = lineSteps(0, 0)
+    assert len(lMask) == len(rMask) == 0
+
+
+def test_a_diagonal_move_interleaves_both_motors(board):
+    sim = board.pins
+    sim.clearLog()
+    before = list(sim.steps)
+    board.moveSteps((300, -120))
+    assert [sim.steps[0] - before[0], sim.steps[1] - before[1]] == [300, -120]
+
+    #----- The right motor's pulses sit between the left motor's, not after them
+    times, pins, values = sim.pulses()
+    right = times[pins == board.STEP_2]
+    left = times[pins == board.STEP_1]
+    assert len(left) == 300 and len(right) == 120
+    assert right[0] < left[-1] and right[-1] > left[len(left)//2]
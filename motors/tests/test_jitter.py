@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from jitter import JitterRecorder
+from conftest import makeBoard
+
+def test_the_ring_keeps_the_most_recent_ticks_oldest_first():
+    recorder = JitterRecorder(capacity=4)
+    recorder.startTrain()
+    for k in range(6):
+        recorder.record(1000*k, 1000*k + k)
+    deadlines, edges, trains = recorder.arrays()
+    assert deadlines.tolist() == [2000, 3000, 4000, 5000]
+    assert (edges - deadlines).tolist() == [2, 3, 4, 5]
+    assert recorder.report()["ticks"] == 6
+    assert recorder.report()["kept"] == 4
+
+
+def test_period_errors_stay_within_a_train():
+    recorder = JitterRecorder()
+    recorder.startTrain()
+    recorder.record(0, 0)
+    recorder.record(1000, 1500)   # 500 ns long
+    recorder.startTrain()
+    recorder.record(10**9, 10**9) # a new train: no period across the gap
+    recorder.record(10**9 + 1000, 10**9 + 800)
+    assert recorder.periodErrors().tolist() == [500, -200]
+
+
+def test_report_counts_missed_deadlines_and_the_longest_stall():
+    recorder = JitterRecorder(missTolerance=0.00005)
+    recorder.startTrain()
+    recorder.record(0, 0)
+    recorder.record(100000, 100000)
+    recorder.record(200000, 300000) # 100 us late
+    report = recorder.report(bins=10, limit=200)
+    assert report["missed"] == 1
+    assert report["trains"] == 1
+    assert report["lateUs"]["max"] == pytest.approx(100.0)
+    assert report["longestStallUs"] == pytest.approx(100.0)
+    assert sum(report["histogram"]["counts"]) == 2
+
+
+def test_an_empty_recorder_reports_zeros():
+    report = JitterRecorder().report()
+    assert report["ticks"] == 0
+    assert report["longestStallUs"] == 0.0
+    assert report["lateUs"]["max"] == 0.0
+
+
+def test_dump_saves_the_ticks(tmp_path):
+    recorder = JitterRecorder()
+    recorder.startTrain()
+    recorder.record(5, 7)
+    path = tmp_path / "ticks.npz"
+    recorder.dump(path)
+    data = np.load(path)
+    assert data["deadlines"].tolist() == [5]
+    assert data["edges"].tolist() == [7]
+    assert int(data["ticks"]) == 1
+
+
+def test_the_board_records_every_pulse_on_a_virtual_clock():
+    recorder = JitterRecorder()
+    board = makeBoard(jitter=recorder)[0]
+    recorder.reset()
+    board.stepper.resetStats()
+    board.moveInches((1.0, 0.5))
+    report = board.jitterReport(reset=True)
+    # Every tick is recorded (pulse by pulse), and a virtual clock is never late
+    assert report["ticks"] == board.stepper.ticks > 0
+    assert report["missed"] == 0
+    assert report["lateUs"]["max"] == 0.0
+    assert recorder.count == 0
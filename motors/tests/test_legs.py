@@ -0,0 +1,41 @@
+import chess
+import pytest
+from bank import WHITE_SLOTS, BLACK_SLOTS
+from legs import moveArguments, moveLegs
+
+def legsOf(board, fen, uci):
+    position = chess.Board(fen)
+    return moveLegs(position, chess.Move.from_uci(uci), board.bank.copy())
+
+def test_quiet_move(board):
+    assert legsOf(board, chess.STARTING_FEN, "e2e4") == [(chess.E2, chess.E4, "P")]
+
+def test_capture_goes_to_the_bank_first(board):
+    legs = legsOf(board, "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2", "e4d5")
+    assert legs[1] == (chess.E4, chess.D5, "P")
+    assert legs[0][0] == chess.D5 and legs[0][1] in BLACK_SLOTS and legs[0][2] == "p"
+
+def test_en_passant_takes_the_pawn_behind(board):
+    legs = legsOf(board, "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3", "e5f6")
+    assert legs[0][0] == chess.F5 and legs[0][2] == "p"
+    assert legs[1] == (chess.E5, chess.F6, "P")
+
+@pytest.mark.parametrize("uci, rook", [("e1g1", (chess.H1, chess.F1, "R")), ("e1c1", (chess.A1, chess.D1, "R"))])
+def test_castling_moves_the_rook(board, uci, rook):
+    legs = legsOf(board, "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", uci)
+    assert legs == [(chess.E1, chess.G1 if uci == "e1g1" else chess.C1, "K"), rook]
+
+def test_promotion_swaps_in_a_banked_piece(board):
+    fen = "8/4P3/8/8/8/8/k7/7K w - - 0 1"
+    assert legsOf(board, fen, "e7e8q") == [(chess.E7, chess.E8, "P")] # no queen in the bank
+    slot = board.bank.store("Q", chess.D1)
+    legs = legsOf(board, fen, "e7e8q")
+    assert legs[0] == (chess.E7, chess.E8, "P")
+    assert legs[1][0] == chess.E8 and legs[1][1] in WHITE_SLOTS and legs[1][2] == "P"
+    assert legs[2] == (slot, chess.E8, "Q")
+
+def test_move_arguments_match_the_legs(board):
+    position = chess.Board("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")
+    args, kwargs = moveArguments(position, chess.Move.from_uci("e5f6"))
+    assert args == (chess.E5, chess.F6, "P", True, "p")
+    assert kwargs["capturedSquare"] == chess.F5 and kwargs["occupied"] == position.occupied
@@ -0,0 +1,102 @@
+import queue
+import threading
+import chess
+import numpy as np
+import pytest
+from motionqueue import MotionExecutor
+from movement import MoveAborted
+
+def test_jobs_run_in_order_on_the_worker(board):
+    executor = MotionExecutor(board)
+    seen = []
+    handles = [executor.submit(lambda i=i: seen.append((i, threading.current_thread().name)) or i) \
+               for i in range(3)]
+    assert [h.result(5) for h in handles] == [0, 1, 2]
+    assert [i for i, _ in seen] == [0, 1, 2]
+    assert {name for _, name in seen} == {"motion"}
+    executor.shutdown()
+
+
+def test_errors_come_back_through_the_handle(board):
+    executor = MotionExecutor(board)
+    handle = executor.submit(board.moveInches, (100.0, 0.0))
+    with pytest.raises(RuntimeError, match="outside of boundary"):
+        handle.result(5)
+    executor.shutdown()
+
+
+def test_queued_jobs_can_be_cancelled_and_the_queue_is_bounded(board):
+    executor = MotionExecutor(board, maxsize=1)
+    release = threading.Event()
+    running = executor.submit(release.wait, 5)
+    while executor.current is None:
+        pass
+    queued = executor.submit(lambda: "ran")
+    with pytest.raises(queue.Full):
+        executor.submit(lambda: "no room")
+    assert queued.cancel()
+    release.set()
+    assert running.result(5) is True
+    executor.shutdown()
+    assert queued.cancelled()
+
+
+def test_progress_and_done_callbacks(board):
+    executor = MotionExecutor(board)
+    progress, done = [], threading.Event()
+    handle = executor.submit(board.movePiece, 12, 28, "P", False, None, occupied=0xFFFF00000000FFFF)
+    handle.whenProgress(lambda h, fraction, label: progress.append(fraction))
+    handle.whenDone(lambda h: done.set())
+    assert done.wait(10)
+    assert handle.progress == (1.0, "done")
+    assert progress[-1] == 1.0
+    executor.shutdown()
+
+
+def test_park_for_picks_the_square_on_the_worker(board):
+    executor = MotionExecutor(board)
+    position = chess.Board()
+    ponder = chess.Move.from_uci("g1f3")
+    handle = executor.parkFor(position, ponder)
+    position.push_san("e4") # the GUI keeps playing on its own board
+    assert handle.result(10) is None
+    assert board.centerIndex.get(tuple(board.motorSteps)) == chess.G1
+    executor.shutdown()
+
+
+def test_a_late_park_cancel_does_not_stop_the_next_park(board):
+    executor = MotionExecutor(board)
+    first = executor.park(0)
+    first.result(10)
+    stale = first.stop
+    second = executor.park(63)
+    stale.set() # as if cancelPark had raced the end of the first park
+    second.result(10)
+    assert board.centerIndex.get(tuple(board.motorSteps)) == 63
+    executor.shutdown()
+
+
+class PastX():
+    # Stop event that is set once the simulated gantry passes x
+    def __init__(self, sim, x):
+        self.sim, self.x = sim, x
+
+    def is_set(self):
+        return self.sim.position()[0] > self.x
+
+
+def test_a_stopped_park_brakes_instead_of_halting_at_speed(board):
+    sim = board.pins
+    sim.clearLog()
+    board.stopEvent = PastX(sim, sim.position()[0] + 2.0)
+    with pytest.raises(MoveAborted):
+        board.moveToSquare(7)
+    board.stopEvent = None
+    # The tracked position is where the gantry really is
+    assert np.allclose(sim.position(), (board.currentX, board.currentY), atol=board.inchPerStep)
+    # Left motor pulse by pulse: the speed never drops by more than the acceleration allows
+    times, pins, values = sim.pulses()
+    delays = np.diff(times[pins == board.STEP_1])/1e9
+    speeds = 1/delays
+    assert (np.diff(speeds) >= -board.profile.accel*delays[1:]*1.05).all()
+    assert speeds[-1] <= 1.05*board.profile.vStart
@@ -0,0 +1,111 @@
+import threading
+import numpy as np
+import pytest
+from pins import SimDriver
+from movement import realBoard, MoveAborted
+from simclock import SimClock
+from conftest import makeBoard, ORIGIN
+
+def pulse(sim, pin, n = 1):
+    for _ in range(n):
+        sim.output(pin, sim.HIGH)
+        sim.output(pin, sim.LOW)
+
+#----- Step integration
+def test_steps_move_the_gantry_like_corexy(board):
+    sim = board.pins
+    x0, y0 = sim.position()
+    # Both motors CW: -x
+    sim.output(board.DIR_1, sim.HIGH)
+    sim.output(board.DIR_2, sim.HIGH)
+    pulse(sim, board.STEP_1, 100)
+    pulse(sim, board.STEP_2, 100)
+    x, y = sim.position()
+    assert np.isclose(x, x0 - 100*board.inchPerStep) and np.isclose(y, y0)
+    # Left CCW, right CW: +y
+    sim.output(board.DIR_1, sim.LOW)
+    pulse(sim, board.STEP_1, 100)
+    pulse(sim, board.STEP_2, 100)
+    x, y = sim.position()
+    assert np.isclose(x, x0 - 100*board.inchPerStep) and np.isclose(y, y0 + 100*board.inchPerStep)
+
+def test_only_rising_edges_count(board):
+    sim = board.pins
+    steps = list(sim.steps)
+    sim.output(board.STEP_1, sim.HIGH)
+    sim.output(board.STEP_1, sim.HIGH)
+    sim.output(board.STEP_1, sim.LOW)
+    assert sim.steps[0] == steps[0] - 1 and sim.steps[1] == steps[1]
+
+#----- Switches
+def test_switch_fires_once_on_the_closing_step(board):
+    sim = board.pins
+    n = int(sim.position()[0]/board.inchPerStep) + 40
+    x = sim.switch(board.xSwitchPin)
+    fired = []
+    x.when_pressed = lambda: fired.append(sim.position())
+    assert not x.is_pressed
+    sim.output(board.DIR_1, sim.HIGH)
+    sim.output(board.DIR_2, sim.HIGH)
+    for _ in range(n):
+        pulse(sim, board.STEP_1)
+        pulse(sim, board.STEP_2)
+    assert x.is_pressed
+    assert len(fired) == 1 and fired[0][0] <= 0
+
+#----- Log
+def test_pulse_log(board):
+    sim = board.pins
+    sim.clearLog()
+    board.turnMagnetOn()
+    board.moveInches((1.0, 0.0))
+    board.turnMagnetOff()
+    times, pins, values = sim.pulses()
+    assert (np.diff(times) >= 0).all()
+    assert list(values[pins == board.magPin]) == [1, 0]
+    steps = int((pins == board.STEP_1).sum())
+    assert steps == int((pins == board.STEP_2).sum()) == round(1.0/board.inchPerStep)
+    assert times[-1] - times[0] > 0
+
+def test_no_log_when_not_recording():
+    sim = SimDriver(record=False)
+    board = realBoard(ORIGIN, pins=sim, clock=SimClock(), stateFile=None, warmStart=False, routeCacheFile=None)
+    board.moveInches((1.0, 1.0))
+    assert len(sim.pulses()[0]) == 0
+    assert np.allclose(sim.position(), (board.currentX, board.currentY), atol=board.inchPerStep)
+
+#----- Playing a train in bulk is the same as pulsing it
+def test_bulk_play_matches_pulse_by_pulse():
+    runs = []
+    for bulk in (True, False):
+        board, sim = makeBoard()
+        if not bulk:
+            board.stepper.player = None
+        sim.clearLog()
+        board.moveThrough([(8.0, 5.0), (3.0, 9.5), (12.0, 12.0), (2.5, 4.0)])
+        board.turnMagnetOn()
+        board.moveInches((1.0, -0.5))
+        board.turnMagnetOff()
+        runs.append((sim.pulses(), list(sim.steps), list(sim.dirs), board.clock.now()))
+    (bulk, steps, dirs, now), (single, steps1, dirs1, now1) = runs
+    for a, b in zip(bulk, single):
+        assert np.array_equal(a, b)
+    assert (steps, dirs, now) == (steps1, dirs1, now1)
+
+def test_a_stop_event_stops_on_the_tick_like_the_real_loop(board):
+    board.stepper.CHUNK = 100
+    stop = threading.Event()
+    stop.set()
+    train = board.compileStepPath([board.coreXY((2000, 0)).astype(int)])
+    assert board.stepper.run(train, stop) == 1
+
+def test_a_move_stopped_before_it_starts_barely_moves(board):
+    sim = board.pins
+    before = sim.position()
+    board.stopEvent = threading.Event()
+    board.stopEvent.set()
+    with pytest.raises(MoveAborted):
+        board.movePiece(12, 28, "P", False, None, occupied=0xFFFF00000000FFFF)
+    # One tick, plus at most a braking step (not a whole chunk)
+    assert np.allclose(sim.position(), before, atol=3*board.inchPerStep)
+    assert np.allclose(sim.position(), (board.currentX, board.currentY), atol=board.inchPerStep)
@@ -0,0 +1,26 @@
+import time
+import chess
+
+def waitFor(condition, timeout = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+#----- The prefetch thread outlives a leg it can't compile
+def test_prefetch_keeps_going_after_an_error(board, capsys):
+    occupied = set(chess.Board().piece_map())
+    board.pipeline.prefetch([(chess.E2, 500, "P")], occupied) # not a square
+    board.pipeline.prefetch([(chess.G1, chess.F3, "N")], occupied)
+    key = board.routeCache.key(chess.G1, chess.F3, "N", occupied)
+    waitFor(lambda: board.routeCache.peek(key)[0] is not None)
+    assert board.pipeline.prefetcher.is_alive()
+    assert "Could not prefetch" in capsys.readouterr().out
+
+def test_prefetched_carries_are_cache_hits(board):
+    occupied = set(chess.Board().piece_map())
+    board.pipeline.prefetch([(chess.E2, chess.E4, "P")], occupied)
+    key = board.routeCache.key(chess.E2, chess.E4, "P", occupied)
+    waitFor(lambda: board.routeCache.peek(key)[0] is not None)
+    board.movePiece(chess.E2, chess.E4, "P", False, None, occupied=chess.Board().occupied)
+    assert board.routeCache.stats()["hits"] >= 1
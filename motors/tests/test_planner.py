@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from planner import Planner
+from profiles import MotionProfile
+from conftest import makeBoard
+
+def planner(shape = "trapezoid", maxJump = None):
+    return Planner(MotionProfile(1016, shape=shape), maxJump)
+
+
+def test_collinear_segments_run_through_their_junction():
+    split, whole = planner(), planner()
+    split.addSegment(3000, 1000)
+    split.addSegment(3000, 1000)
+    whole.addSegment(6000, 2000)
+    split.plan()
+    whole.plan()
+    first, second = split.queue
+    assert first.vExit == second.vEntry > split.profile.vStart
+    assert split.duration() == pytest.approx(whole.duration(), rel=1e-6)
+
+
+def test_corners_slow_down_to_the_junction_limit():
+    plan = planner(maxJump=500.0)
+    plan.addSegment(5000, 0)
+    plan.addSegment(0, 5000)  # the left motor stops, the right one starts: a jump of 1 per unit speed
+    plan.plan()
+    first, second = plan.queue
+    assert second.vEntryMax == pytest.approx(max(500.0, plan.profile.vStart))
+    assert first.vExit == second.vEntry <= second.vEntryMax
+    assert plan.queue[-1].vExit == plan.profile.vStart
+
+
+def test_a_path_is_quicker_than_its_legs_one_by_one():
+    legs = [(4000, 1000), (3500, 1500), (3000, 2000)]
+    plan = planner()
+    separate = 0.0
+    for leg in legs:
+        plan.addSegment(*leg)
+        alone = planner()
+        alone.addSegment(*leg)
+        alone.plan()
+        separate += alone.duration()
+    plan.plan()
+    assert plan.duration() < separate
+
+
+def test_zero_length_segments_are_dropped():
+    plan = planner()
+    assert plan.addSegment(0, 0) is None
+    assert len(plan.compile()) == 0
+
+
+def test_compile_makes_one_continuous_train():
+    plan = planner()
+    plan.addSegment(2000, -500)
+    plan.addSegment(0, 800)   # the left motor keeps its last direction
+    plan.addSegment(-1500, -1500)
+    train = plan.compile()
+    assert len(train) == 2000 + 800 + 1500
+    assert (np.diff(train.times) > 0).all()
+    assert train.netSteps() == (500, -1200)
+    assert train.netSteps(2000) == (2000, -500)
+    assert train.duration == pytest.approx(plan.duration(), rel=1e-6)
+
+
+def test_move_path_matches_the_planned_duration():
+    board, sim = makeBoard()
+    x, y = board.stepsToInches(board.motorSteps)
+    duration = board.pathDuration([(x + 1.0, y), (x + 1.0, y + 1.0), (x + 0.5, y + 0.5)])
+    x0, y0 = sim.position()
+    start = board.clock.now()
+    board.movePath([(1.0, 0.0), (0.0, 1.0), (-0.5, -0.5)])
+    x, y = sim.position()
+    assert (x - x0, y - y0) == pytest.approx((0.5, 0.5), abs=2*board.inchPerStep)
+    assert board.clock.elapsed(start) == pytest.approx(duration, rel=1e-3)
+
+
+def test_a_stopped_train_brakes_along_its_path():
+    plan = planner()
+    plan.addSegment(20000, 5000)
+    train = plan.compile()
+    brake = plan.profile.brakeDelays()
+    done = 10000 # cruising
+    tail = train.stoppingTail(done, brake)
+    assert 0 < len(tail) < len(train) - done
+    delays = np.diff(tail.times, prepend=0)
+    assert delays[0] >= train.times[done - 1] - train.times[done - 2]
+    assert (np.diff(delays) >= 0).all()
+    assert 1e9/delays[-1] == pytest.approx(plan.profile.vStart, rel=0.05)
+    # Same path: the tail's steps are the train's next ones
+    assert (tail.lMask == train.lMask[done:done + len(tail)]).all()
+    # Already slow (or done): next to nothing to brake
+    assert len(train.stoppingTail(1, brake)) <= 1
+    assert len(train.stoppingTail(len(train), brake)) == 0
+    assert len(train.stoppingTail(done, planner("constant").profile.brakeDelays())) == 0
@@ -0,0 +1,27 @@
+import numpy as np
+
+def test_relative_moves_do_not_drift(board):
+    start = board.motorSteps.copy()
+    for _ in range(30):
+        board.moveInches((1/3, 0.1))
+    for _ in range(30):
+        board.moveInches((-1/3, -0.1))
+    assert np.array_equal(board.motorSteps, start)
+
+
+def test_position_is_whole_steps_and_matches_the_gantry(board):
+    sim = board.pins
+    x0, y0 = board.currentX, board.currentY
+    for _ in range(30):
+        board.moveInches((1/3, 0))
+    assert board.motorSteps.dtype == np.int64
+    assert abs(board.currentX - (x0 + 10)) <= board.inchPerStep
+    assert abs(board.currentY - y0) <= board.inchPerStep
+    assert np.allclose(sim.position(), (board.currentX, board.currentY))
+
+
+def test_square_moves_land_exactly_on_centers(board):
+    for square in (0, 63, 7, 56, 27):
+        board.moveToSquare(square)
+        assert np.array_equal(board.motorSteps, board.inchesToSteps(*board.getSquareCoords(square)))
+    assert np.allclose(board.pins.position(), board.getSquareCoords(27), atol=board.inchPerStep)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from profiles import MotionProfile
+from conftest import makeBoard
+
+STEPS_PER_INCH = 1016
+
+def profile(shape, **kwargs):
+    return MotionProfile(STEPS_PER_INCH, shape=shape, **kwargs)
+
+
+def test_unknown_shapes_are_refused():
+    with pytest.raises(ValueError, match="Unknown motion profile"):
+        profile("sine")
+
+
+@pytest.mark.parametrize("shape", MotionProfile.SHAPES)
+@pytest.mark.parametrize("nSteps", [1, 50, 2000, 20000])
+def test_step_times_are_increasing_and_match_the_duration(shape, nSteps):
+    prof = profile(shape)
+    times = prof.stepTimes(nSteps)
+    assert len(times) == nSteps
+    assert (np.diff(times, prepend=0.0) > 0).all()
+    assert times[-1] == pytest.approx(prof.duration(nSteps), rel=1e-3)
+
+
+@pytest.mark.parametrize("shape", ["trapezoid", "scurve"])
+def test_ramps_never_exceed_the_limits(shape):
+    prof = profile(shape)
+    delays = prof.stepDelays(20000)
+    speeds = 1/delays
+    assert speeds.max() <= prof.vMax*1.001
+    # Starts and ends near the start velocity, cruises at vMax in the middle
+    assert speeds[0] < 2*prof.vStart and speeds[-1] < 2*prof.vStart
+    assert speeds[10000] == pytest.approx(prof.vMax, rel=1e-3)
+
+
+def test_short_moves_never_reach_cruise_speed():
+    prof = profile("trapezoid")
+    nSteps = 200
+    assert prof.rampDistance(prof.vStart, prof.vMax) > nSteps
+    speeds = 1/prof.stepDelays(nSteps)
+    assert speeds.max() < prof.vMax
+
+
+def test_ramped_moves_take_longer_than_constant_speed_but_are_continuous():
+    constant, trapezoid, scurve = (profile(shape) for shape in ("constant", "trapezoid", "scurve"))
+    nSteps = 5000
+    assert constant.duration(nSteps) == pytest.approx(nSteps/constant.vMax)
+    assert constant.duration(nSteps) < trapezoid.duration(nSteps) < scurve.duration(nSteps)
+    # The s-curve's acceleration ramps in: the first speed change is gentler
+    t, s = (1/p.stepDelays(nSteps)[:50] for p in (trapezoid, scurve))
+    assert s[1] - s[0] < t[1] - t[0]
+
+
+def test_the_board_moves_take_the_profile_duration():
+    board, sim = makeBoard(motionProfile="trapezoid")
+    start = board.clock.now()
+    board.moveSteps((4000, 0))
+    assert board.clock.elapsed(start) == pytest.approx(board.profile.duration(4000), abs=1e-6)
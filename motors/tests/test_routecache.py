@@ -0,0 +1,81 @@
+import chess
+import numpy as np
+from routecache import RouteCache
+from conftest import makeBoard
+
+START = set(chess.Board().piece_map())
+
+#----- Keys
+def test_keys():
+    key = RouteCache.key
+    assert key(1, 18, "N", START) == key(1, 18, "n", START)
+    assert key(1, 18, "N", START) != key(1, 18, "B", START)
+    assert key(1, 18, "B", START) == key(1, 18, "Q", START)
+    assert key(1, 18, None, START)[2] == "-"
+    assert key(1, 18, "B", None)[3] == -1
+    assert key(1, 18, "B", START) != key(1, 18, "B", START - {11})
+    # Bank slots count in the signature too
+    assert key(1, 18, "B", START) != key(1, 18, "B", START | {-1})
+    assert key(1, 18, "B", {-16})[3] == 1
+
+#----- Hits
+def test_a_repeated_carry_is_a_hit(board):
+    train = board.compileCarry(chess.B1, chess.C3, "N", START)
+    assert board.routeCache.stats()["misses"] == 1
+    assert board.compileCarry(chess.B1, chess.C3, "N", START) is train
+    assert board.routeCache.stats()["hits"] == 1
+
+def test_trains_are_capped_by_bytes_routes_are_kept(board):
+    cache = board.routeCache
+    first = board.compileCarry(chess.A1, chess.H8, "B", set())
+    cache.maxBytes = 1
+    board.compileCarry(chess.H1, chess.A8, "B", set())
+    assert cache.stats()["trains"] == 1 and cache.stats()["entries"] == 2
+    again = board.compileCarry(chess.A1, chess.H8, "B", set())
+    assert cache.stats()["routeHits"] == 1
+    assert np.array_equal(again.times, first.times)
+
+#----- On disk
+def test_saved_routes_compile_to_the_same_trains(tmp_path):
+    path = str(tmp_path/"routes")
+    board, sim = makeBoard(routeCacheFile=path)
+    trains = [board.compileCarry(chess.B1, chess.C3, "N", START), \
+              board.compileCarry(chess.E2, chess.E4, "P", START), \
+              board.compileCarry(chess.E4, chess.A1, None)]
+    board.routeCache.save()
+
+    other, sim = makeBoard(routeCacheFile=path)
+    assert other.routeCache.stats()["entries"] == 3
+    assert other.routeCache.stats()["trains"] == 0 # compiled when first used
+    again = [other.compileCarry(chess.B1, chess.C3, "N", START), \
+             other.compileCarry(chess.E2, chess.E4, "P", START), \
+             other.compileCarry(chess.E4, chess.A1, None)]
+    assert other.routeCache.stats()["routeHits"] == 3
+    for a, b in zip(trains, again):
+        assert np.array_equal(a.times, b.times) and np.array_equal(a.lMask, b.lMask) \
+           and np.array_equal(a.rDir, b.rDir)
+
+def test_save_only_appends_new_routes(tmp_path):
+    path = str(tmp_path/"routes")
+    board, sim = makeBoard(routeCacheFile=path)
+    board.compileCarry(chess.B1, chess.C3, "N", START)
+    board.routeCache.save()
+    assert not board.routeCache.dirty
+    board.compileCarry(chess.B1, chess.C3, "N", START)
+    assert not board.routeCache.dirty
+    board.compileCarry(chess.G1, chess.F3, "N", START)
+    board.routeCache.save()
+    with open(path + ".jsonl") as f:
+        assert len(f.readlines()) == 3 # settings + 2 routes
+
+def test_other_settings_or_a_cut_line_are_ignored(tmp_path):
+    path = str(tmp_path/"routes")
+    board, sim = makeBoard(routeCacheFile=path)
+    board.compileCarry(chess.B1, chess.C3, "N", START)
+    board.compileCarry(chess.G1, chess.F3, "N", START)
+    board.routeCache.save()
+    with open(path + ".jsonl", "a") as f:
+        f.write('[1, 18, "n", 5, [1')
+    assert makeBoard(routeCacheFile=path)[0].routeCache.stats()["entries"] == 2
+    faster, sim = makeBoard(routeCacheFile=path, maxVelocity=8.0)
+    assert faster.routeCache.stats()["entries"] == 0
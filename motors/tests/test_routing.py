@@ -0,0 +1,59 @@
+import chess
+import numpy as np
+import pytest
+from bank import BANK_SIZE
+
+START = chess.Board().occupied
+
+def cellsVisited(board, path, samples = 50):
+    """
+    (file, rank) cells whose interior a waypoint path passes through
+    """
+    sq = board.squareSize
+    cells = set()
+    for (x0, y0), (x1, y1) in zip(path[:-1], path[1:]):
+        for t in np.linspace(0, 1, samples):
+            u = (x0 + t*(x1 - x0) - board.xOrigin)/sq
+            v = (y0 + t*(y1 - y0) - board.yOrigin)/sq
+            # On a lane (a square edge) the piece is between cells, not inside one
+            if min(abs(u - round(u)), abs(v - round(v))) < 1e-6:
+                continue
+            cells.add((int(np.floor(u)), int(np.floor(v))))
+    return cells
+
+def occupiedCells(occupied):
+    return {(sq % 8, sq//8) for sq in range(64) if (occupied >> sq) & 1}
+
+#----- A* routes go around the other pieces
+@pytest.mark.parametrize("start, end, piece", [(chess.B1, chess.C3, "N"), (chess.G8, chess.F6, "n"), \
+                                               (chess.A1, chess.A4, "R"), (chess.D1, chess.H5, "Q")])
+def test_route_avoids_occupied_squares(board, start, end, piece):
+    occupied = START & ~(1 << end)
+    path = board.router.route(start, end, occupied)
+    ends = {(start % 8, start//8), (end % 8, end//8)}
+    assert cellsVisited(board, path) & (occupiedCells(occupied) - ends) == set()
+    assert np.allclose(path[0], board.squareCoords[start + BANK_SIZE])
+    assert np.allclose(path[-1], board.squareCoords[end + BANK_SIZE])
+
+def test_route_goes_straight_on_an_empty_board(board):
+    path = board.router.route(chess.A1, chess.H8, 0)
+    assert len(path) == 2
+
+#----- fastest() keeps the quickest candidate, by planner time
+@pytest.mark.parametrize("start, end, piece", [(chess.B1, chess.C3, "N"), (chess.E2, chess.E4, "P"), \
+                                               (chess.D1, chess.H5, "Q"), (chess.F1, chess.C4, "B")])
+def test_fastest_is_no_slower_than_astar(board, start, end, piece):
+    occupied = START & ~(1 << end)
+    if piece != "N":
+        # Clear the way the piece moves in a real game
+        occupied &= ~(1 << chess.E2) & ~(1 << chess.D2)
+    origin = tuple(board.squareCoords[start + BANK_SIZE])
+    fast = board.router.fastest(start, end, piece, occupied)
+    astar = board.router.route(start, end, occupied)
+    assert board.pathDuration(fast[1:], origin) <= board.pathDuration(astar[1:], origin) + 1e-9
+    ends = {(start % 8, start//8), (end % 8, end//8)}
+    assert cellsVisited(board, fast) & (occupiedCells(occupied) - ends) == set()
+
+def test_fastest_without_occupancy_goes_straight(board):
+    path = board.router.fastest(chess.A1, chess.H8, "B")
+    assert len(path) == 2
@@ -0,0 +1,63 @@
+import threading
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+from planner import StepTrain
+from rtstepper import RealtimeStepper, packTrain, unpackTrain, START
+
+def nullOutput(stepPins, dirPins):
+    """
+    Pin factory for the stepping process that drives nothing (must be picklable)
+    """
+    return (lambda pin, value: None), 1, 0
+
+
+def train(n, period = 20000):
+    ticks = np.arange(n)
+    return StepTrain(((ticks + 1)*period).astype(np.int64), np.ones(n, dtype=bool), ticks % 3 == 0, \
+                     ticks % 2 == 0, np.zeros(n, dtype=bool))
+
+
+def test_pack_and_unpack_round_trip():
+    original = train(50)
+    bits = packTrain(original)
+    assert bits[0] & START and not (bits[1:] & START).any()
+    back = unpackTrain(original.times, bits)
+    for name in ("lMask", "rMask", "lDir", "rDir"):
+        assert (getattr(back, name) == getattr(original, name)).all()
+
+
+@pytest.fixture
+def stepper():
+    try:
+        stepper = RealtimeStepper((1, 2), (3, 4), capacity=256, outputFactory=nullOutput)
+    except (RuntimeError, OSError) as e:
+        pytest.skip(f"no stepping process here: {e}")
+    yield stepper
+    stepper.close()
+
+
+def test_trains_longer_than_the_ring_are_streamed(stepper):
+    assert stepper.run(train(2000)) == 2000
+    assert stepper.run(train(300)) == 300
+    assert stepper.progress() == (2300, 2300, 2300)
+    assert stepper.stats()["ticks"] == 2300
+
+
+def test_the_stop_event_aborts_the_train(stepper):
+    stop = threading.Event()
+    threading.Timer(0.05, stop.set).start()
+    done = stepper.run(train(100000), stop) # 2 s of ticks
+    assert 0 < done < 100000
+    # The ring was flushed: the next train runs from its start
+    assert stepper.run(train(10)) == 10
+
+
+def test_close_frees_the_shared_memory(stepper):
+    name = stepper.shm.name
+    process = stepper.process
+    stepper.close()
+    assert not process.is_alive()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    stepper.close() # twice is fine
@@ -0,0 +1,48 @@
+import itertools
+import numpy as np
+import pytest
+from sequencing import precedence, hopCosts, orderCost, feasible, exactOrder, heuristicOrder, sequence
+
+def bruteForce(first, hop, before):
+    orders = [list(p) for p in itertools.permutations(range(len(first))) if feasible(p, before)]
+    return min(orderCost(order, first, hop) for order in orders)
+
+#----- Held-Karp finds the best feasible order
+@pytest.mark.parametrize("seed", range(6))
+def test_exact_order_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = 7
+    first = rng.uniform(0, 2, n)
+    hop = rng.uniform(0, 2, (n, n))
+    before = [0]*n
+    for j in range(n):
+        for i in range(j):
+            if rng.random() < 0.2:
+                before[j] |= 1 << i
+    order = exactOrder(first, hop, before)
+    assert sorted(order) == list(range(n))
+    assert feasible(order, before)
+    assert orderCost(order, first, hop) == pytest.approx(bruteForce(first, hop, before))
+
+def test_heuristic_order_is_feasible():
+    rng = np.random.default_rng(1)
+    n = 20
+    first = rng.uniform(0, 2, n)
+    hop = rng.uniform(0, 2, (n, n))
+    before = [(1 << j) - 1 if j % 5 == 0 else 0 for j in range(n)]
+    order = heuristicOrder(first, hop, before)
+    assert sorted(order) == list(range(n))
+    assert feasible(order, before)
+
+#----- On the board: a leg that vacates a square stays before the leg that fills it
+def test_sequence_keeps_precedence(board):
+    legs = [(11, 27, "P"), (3, 11, "Q"), (-1, 3, "Q"), (52, 36, "p"), (62, 45, "n")]
+    ordered, expected, naive = sequence(board, legs)
+    assert sorted(ordered) == sorted(legs)
+    assert ordered.index((11, 27, "P")) < ordered.index((3, 11, "Q")) < ordered.index((-1, 3, "Q"))
+    assert expected <= naive + 1e-9
+    start = (board.currentX, board.currentY)
+    first, hop = hopCosts(board, legs, start)
+    before = precedence(legs)
+    order = [legs.index(leg) for leg in ordered]
+    assert orderCost(order, first, hop) == pytest.approx(bruteForce(first, hop, before))
@@ -0,0 +1,81 @@
+import chess
+import numpy as np
+from arrange import pieceMap
+
+def recordLegs(board):
+    """
+    Keeps a list of every leg board.runLegs is asked to carry
+    """
+    legs = []
+    runLegs = board.runLegs
+    def recording(moves, occupied = None, onLeg = None):
+        legs.extend(moves)
+        return runLegs(moves, occupied, onLeg)
+    board.runLegs = recording
+    return legs
+
+def replay(pieces, legs):
+    """
+    Plays legs on a {index: symbol} map, checking each one picks up the right piece
+    and puts it down on an empty square or slot
+    """
+    pieces = dict(pieces)
+    for fromIndex, toIndex, symbol in legs:
+        assert pieces.get(fromIndex) == symbol
+        assert toIndex not in pieces
+        pieces[toIndex] = pieces.pop(fromIndex)
+    return pieces
+
+def onBoard(pieces):
+    return {sq: sym for sq, sym in pieces.items() if 0 <= sq < 64}
+
+def magnetPickups(board, sim):
+    times, pins, values = sim.pulses()
+    return int(((pins == board.magPin) & (values > 0)).sum())
+
+#----- Swapped pieces wait on each other: one of them goes through the bank
+def test_swapped_king_and_queen(board):
+    sim = board.pins
+    current = chess.Board("rnbkqbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBKQBNR w - - 0 1")
+    legs = recordLegs(board)
+    sim.clearLog()
+    missing = board.setupPosition(chess.STARTING_FEN, current)
+    assert missing == {}
+    assert onBoard(replay(pieceMap(current), legs)) == pieceMap(chess.Board())
+    assert len(legs) == 6 # two 2-cycles, each broken by a trip through the bank
+    assert magnetPickups(board, sim) == len(legs)
+    assert board.bank.contents == {}
+
+def test_rotated_back_rank(board):
+    current = chess.Board("nbqkbnrr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1")
+    legs = recordLegs(board)
+    board.setupPosition(chess.STARTING_FEN, current)
+    assert onBoard(replay(pieceMap(current), legs)) == pieceMap(chess.Board())
+
+#----- Reset after a game: captured pieces come back out of the bank
+def test_reset_from_a_game_with_banked_pieces(board):
+    position = chess.Board()
+    for san in ("e4", "d5", "exd5", "Qxd5", "Nc3", "Qxg2"):
+        move = position.parse_san(san)
+        isCapture = position.is_capture(move)
+        captured = position.piece_at(move.to_square).symbol() if isCapture else None
+        board.movePiece(move.from_square, move.to_square, position.piece_at(move.from_square).symbol(), \
+                        isCapture, captured, occupied=position.occupied)
+        position.push(move)
+    assert sorted(board.bank.contents.values()) == ["P", "P", "p"]
+
+    pieces = dict(pieceMap(position))
+    pieces.update(board.bank.contents)
+    legs = recordLegs(board)
+    missing = board.setupPosition(chess.STARTING_FEN, position)
+    assert missing == {}
+    assert onBoard(replay(pieces, legs)) == pieceMap(chess.Board())
+    assert board.bank.contents == {}
+    assert np.allclose((board.currentX, board.currentY), board.pins.position(), atol=board.inchPerStep)
+
+def test_missing_pieces_are_reported(board):
+    current = chess.Board("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNB1KBNR w - - 0 1")
+    legs = recordLegs(board)
+    missing = board.setupPosition(chess.STARTING_FEN, current)
+    assert missing == {chess.D1: "Q"}
+    assert legs == []
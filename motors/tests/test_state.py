@@ -0,0 +1,63 @@
+import json
+import numpy as np
+from conftest import makeBoard
+from motionqueue import MotionExecutor
+
+def coldBoard(tmp_path):
+    stateFile = str(tmp_path/"state.json")
+    board, sim = makeBoard(start=(7.3, 5.1), stateFile=stateFile)
+    # The executor saves the position once its queue runs empty
+    executor = MotionExecutor(board)
+    executor.submit(board.movePiece, 12, 28, "P", False, None, occupied=0xFFFF00000000FFFF).result(10)
+    executor.shutdown()
+    return stateFile, board, sim
+
+
+def test_warm_start_skips_homing(tmp_path, capsys):
+    stateFile, board, sim = coldBoard(tmp_path)
+    warm, warmSim = makeBoard(start=sim.position(), stateFile=stateFile, warmStart=True)
+    assert "Restored saved position" in capsys.readouterr().out
+    assert np.array_equal(warm.motorSteps, board.motorSteps)
+    assert warm.clock.elapsed() < 5
+    assert np.allclose(warmSim.position(), (warm.currentX, warm.currentY), atol=2*warm.inchPerStep)
+
+
+def test_gantry_moved_by_hand_falls_back_to_homing(tmp_path, capsys):
+    stateFile, board, sim = coldBoard(tmp_path)
+    x, y = sim.position()
+    warm, warmSim = makeBoard(start=(x + 1.0, y + 0.5), stateFile=stateFile, warmStart=True)
+    assert "Restored saved position" not in capsys.readouterr().out
+    assert np.allclose(warmSim.position(), warm.getSquareCoords(0), atol=2*warm.inchPerStep)
+
+
+def test_busy_or_mismatched_state_is_not_trusted(tmp_path, capsys):
+    stateFile, board, sim = coldBoard(tmp_path)
+    board.saveState(busy=True)
+    makeBoard(start=sim.position(), stateFile=stateFile, warmStart=True)
+    assert "Restored saved position" not in capsys.readouterr().out
+
+    board.saveState()
+    with open(stateFile) as f:
+        state = json.load(f)
+    state["squareSize"] += 0.1
+    with open(stateFile, "w") as f:
+        json.dump(state, f)
+    makeBoard(start=sim.position(), stateFile=stateFile, warmStart=True)
+    assert "Restored saved position" not in capsys.readouterr().out
+
+
+def test_a_direct_move_marks_the_state_busy(tmp_path, capsys):
+    stateFile = str(tmp_path/"state.json")
+    board, sim = makeBoard(stateFile=stateFile) # saved idle on a1
+    board.moveInches((2.0, 0.0)) # x only: the y switch touch of a warm start can't see it
+    with open(stateFile) as f:
+        assert json.load(f)["busy"]
+    warm, warmSim = makeBoard(start=sim.position(), stateFile=stateFile, warmStart=True)
+    assert "Restored saved position" not in capsys.readouterr().out
+    assert np.allclose(warmSim.position(), warm.getSquareCoords(0), atol=2*warm.inchPerStep)
+
+
+def test_homing_removes_an_idle_state(tmp_path):
+    stateFile, board, sim = coldBoard(tmp_path)
+    board.home()
+    assert not (tmp_path/"state.json").exists()
@@ -0,0 +1,88 @@
+import threading
+import time
+import numpy as np
+from planner import StepTrain
+from stepper import StepExecutor
+from simclock import SimClock
+
+STEP, DIR = (1, 2), (3, 4)
+
+def train(n, period = 100000, lDir = True, rDir = False):
+    """
+    n ticks, period ns apart: the left motor on every tick, the right one on every other
+    """
+    ticks = np.arange(n)
+    return StepTrain(((ticks + 1)*period).astype(np.int64), np.ones(n, dtype=bool), ticks % 2 == 0, \
+                     np.full(n, lDir), np.full(n, rDir))
+
+
+def executor(clock = None, **kwargs):
+    events = []
+    stepper = StepExecutor(lambda pin, value: events.append((pin, value)), STEP, DIR, 1, 0, clock=clock, **kwargs)
+    return stepper, events
+
+
+def test_virtual_clock_runs_to_the_last_deadline():
+    clock = SimClock(start=1000)
+    stepper, events = executor(clock)
+    assert stepper.run(train(10)) == 10
+    assert clock.now() == 1000 + 10*100000
+    #----- Directions first, then every pulse high and low, left before right
+    assert events[:2] == [(DIR[0], 1), (DIR[1], 0)]
+    assert events[2:6] == [(STEP[0], 1), (STEP[1], 1), (STEP[0], 0), (STEP[1], 0)]
+    assert sum(1 for pin, value in events if pin == STEP[0] and value == 1) == 10
+    assert sum(1 for pin, value in events if pin == STEP[1] and value == 1) == 5
+    assert stepper.stats()["maxLateUs"] == 0.0
+
+
+def test_resume_continues_the_previous_clock():
+    clock = SimClock()
+    stepper, events = executor(clock)
+    stepper.run(train(4))
+    stepper.run(train(8), resume=True) # the same tick times: only the last 4 lie ahead
+    assert clock.now() == 8*100000
+    stepper.run(train(4))
+    assert clock.now() == 12*100000
+
+
+def test_the_stop_event_ends_the_train_after_the_current_tick():
+    stop = threading.Event()
+    clock = SimClock()
+    stepper, events = executor(clock)
+
+    def output(pin, value):
+        events.append((pin, value))
+        if len(events) > 20:
+            stop.set()
+    stepper.output = output
+    done = stepper.run(train(100), stop)
+    assert 0 < done < 100
+    assert clock.now() == done*100000
+    assert stepper.stats()["ticks"] == done
+
+
+def test_real_time_pulses_go_out_on_their_deadlines():
+    stepper, events = executor(spinTime=0.0001)
+    start = time.perf_counter_ns()
+    assert stepper.run(train(20, period=200000)) == 20
+    assert time.perf_counter_ns() - start >= 20*200000
+    stats = stepper.stats()
+    assert stats["ticks"] == 20
+    assert stats["meanLateUs"] >= 0
+
+
+def test_a_long_stall_shifts_the_schedule_instead_of_bursting():
+    stepper, events = executor(maxSlip=0.0005)
+    stalled = []
+
+    def output(pin, value):
+        if pin == STEP[0] and value == 1 and not stalled:
+            stalled.append(True)
+            time.sleep(0.005)
+        events.append((pin, value))
+    stepper.output = output
+    # The stall is in the first tick's pulse, so the second tick is the late one
+    stepper.run(train(5, period=100000))
+    stats = stepper.stats()
+    assert stats["slips"] >= 1
+    assert stats["maxLateUs"] > 500
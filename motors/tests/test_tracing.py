@@ -0,0 +1,89 @@
+import json
+import threading
+from tracing import Tracer, NO_SPAN
+
+def test_nothing_is_recorded_while_disabled():
+    tracer = Tracer()
+    calls = []
+
+    @tracer.traced()
+    def work(x):
+        calls.append(x)
+        return x*2
+
+    assert work(3) == 6
+    assert tracer.span("idle") is NO_SPAN
+    tracer.instant("tick")
+    assert calls == [3]
+    assert len(tracer.events) == 0
+
+
+def test_spans_instants_and_traced_calls():
+    tracer = Tracer()
+    tracer.enable()
+
+    @tracer.traced(category="gui")
+    def work():
+        return "done"
+
+    with tracer.span("settle", square=12):
+        pass
+    tracer.instant("grab")
+    assert work() == "done"
+    names = [(event[0], event[1]) for event in tracer.events]
+    assert names == [("settle", "board"), ("grab", "board"), ("test_spans_instants_and_traced_calls.<locals>.work", "gui")]
+    name, category, start, end, tid, args = tracer.events[0]
+    assert end >= start
+    assert args == {"square": 12}
+    assert tracer.events[1][2] == tracer.events[1][3]
+
+
+def test_a_failing_traced_call_is_still_recorded():
+    tracer = Tracer()
+    tracer.enable()
+
+    @tracer.traced("boom")
+    def fail():
+        raise RuntimeError("no")
+
+    try:
+        fail()
+    except RuntimeError:
+        pass
+    assert [event[0] for event in tracer.events] == ["boom"]
+
+
+def test_capacity_keeps_the_most_recent_spans():
+    tracer = Tracer(capacity=3)
+    tracer.enable()
+    for k in range(5):
+        tracer.instant(f"e{k}")
+    assert [event[0] for event in tracer.events] == ["e2", "e3", "e4"]
+    tracer.enable(capacity=2)
+    assert [event[0] for event in tracer.events] == ["e3", "e4"]
+    tracer.clear()
+    assert len(tracer.events) == 0
+
+
+def test_export_writes_chrome_trace_events(tmp_path):
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span("compile", "pipeline", leg=(12, 28, "P")):
+        pass
+    worker = threading.Thread(target=tracer.instant, args=("park",), name="motion")
+    worker.start()
+    worker.join()
+
+    path = tmp_path / "trace.json"
+    count = tracer.export(path)
+    events = json.loads(path.read_text())["traceEvents"]
+    assert count == len(events) == 4
+
+    threads = {event["args"]["name"] for event in events if event["ph"] == "M"}
+    assert {"MainThread", "motion"} <= threads
+    compile, = [event for event in events if event["name"] == "compile"]
+    assert compile["ph"] == "X" and compile["cat"] == "pipeline"
+    assert compile["dur"] >= 0
+    assert compile["args"] == {"leg": "(12, 28, 'P')"} # not JSON friendly: stringified
+    park, = [event for event in events if event["name"] == "park"]
+    assert park["ph"] == "i"
@@ -0,0 +1,40 @@
+import chess
+import chess.pgn
+import io
+import pytest
+from bank import BANK_SIZE
+from validate import validateLegs, validateMove, validateGame, InvalidPlan
+
+GAME = "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Bxc6 dxc6 5. O-O f6 6. d4 exd4 7. Nxd4 c5 8. Nb3 Qxd1 9. Rxd1 *"
+
+def test_a_real_game_is_clean(board):
+    game = chess.pgn.read_game(io.StringIO(GAME))
+    assert validateGame(board, game) == []
+
+def test_a_piece_in_the_way_is_reported(board):
+    occupied = set(chess.Board().piece_map())
+    # A straight carry from a1 to a4 would run over the pawn on a2
+    legs = [(chess.A1, chess.A4, "R")]
+    assert validateLegs(board, legs, occupied) == [] # routed around it
+    problems = validateLegs(board, legs, occupied, pieceRadius=board.squareSize)
+    assert any("runs into the piece" in p for p in problems)
+
+def test_a_waypoint_out_of_bounds_is_reported(board):
+    start = (board.xHiBound + 1.0, board.yLoBound + 2.0)
+    problems = validateLegs(board, [(chess.E2, chess.E4, "P")], None, start)
+    assert any("outside the boundaries" in p for p in problems)
+
+def test_validate_move_uses_a_bank_copy(board):
+    position = chess.Board("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+    assert validateMove(board, chess.Move.from_uci("e4d5"), position) == []
+    assert board.bank.contents == {}
+
+def test_an_invalid_plan_moves_nothing(board):
+    sim = board.pins
+    steps = board.motorSteps.copy()
+    sim.clearLog()
+    board.xHiBound = board.squareCoords[chess.H1 + BANK_SIZE][0] - 0.1 # h-file out of reach
+    with pytest.raises(InvalidPlan):
+        board.movePiece(chess.G1, chess.H3, "N", False, None, occupied=chess.Board().occupied)
+    assert len(sim.pulses()[0]) == 0
+    assert (board.motorSteps == steps).all()
@@ -0,0 +1,148 @@
+import os
+import json
+import atexit
+import threading
+import functools
+from collections import deque
+from time import perf_counter_ns
+
+class Tracer():
+    ################
+    # Span tracing, exported in the Chrome trace format (chrome://tracing, or
+    # https://ui.perfetto.dev which opens the same JSON).
+    #
+    # Spans are buffered in memory (the most recent 'capacity' of them) as plain tuples
+    # and only turned into JSON by export(). While tracing is off, a traced function
+    # costs one attribute check and span() hands back a shared do-nothing context
+    # manager, so the instrumentation can stay in place.
+    #
+    # Tracing is off until enable() is called, or the CHESS_TRACE environment variable
+    # names a file: then it's on from the start and exported there at exit.
+    ################
+
+    def __init__(self, capacity = 200000):
+        s = self
+        s.enabled = False
+        s.capacity = capacity
+        s.events = deque(maxlen=capacity)   # (name, category, start ns, end ns, tid, args)
+        s.threads = {}                      # tid -> thread name
+        s.pid = os.getpid()
+
+    def enable(self, capacity = None):
+        s = self
+        if capacity is not None and capacity != s.capacity:
+            s.capacity = capacity
+            s.events = deque(s.events, maxlen=capacity)
+        s.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+
+    def record(self, name, category, start, end, args = None):
+        s = self
+        tid = threading.get_ident()
+        if tid not in s.threads:
+            s.threads[tid] = threading.current_thread().name
+        s.events.append((name, category, start, end, tid, args))
+
+    def span(self, name, category = "board", **args):
+        """
+        Context manager timing a block:  with tracer.span("settle"): ...
+        """
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, category, args or None)
+
+    def instant(self, name, category = "board", **args):
+        """
+        Records a point in time (zero length span)
+        """
+        if self.enabled:
+            now = perf_counter_ns()
+            self.record(name, category, now, now, args or None)
+
+    def traced(self, name = None, category = "board"):
+        """
+        Decorator timing every call of a function (named after its qualified name by default)
+        """
+        def decorate(fn):
+            label = name or fn.__qualname__
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = perf_counter_ns()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(label, category, start, perf_counter_ns())
+            return wrapper
+        return decorate
+
+    #----- Export
+    def traceEvents(self):
+        """
+        The buffered spans as Chrome trace events (times in microseconds)
+        """
+        s = self
+        events = [{"name": "thread_name", "ph": "M", "pid": s.pid, "tid": tid, "args": {"name": name}} \
+                  for tid, name in list(s.threads.items())]
+        for name, category, start, end, tid, args in list(s.events):
+            event = {"name": name, "cat": category, "pid": s.pid, "tid": tid, "ts": start/1e3}
+            if end == start:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=(end - start)/1e3)
+            if args:
+                event["args"] = {k: v if isinstance(v, (int, float, str, bool, type(None))) else str(v) \
+                                 for k, v in args.items()}
+            events.append(event)
+        return events
+
+    def export(self, path):
+        """
+        Writes the buffered spans to a Chrome trace JSON file. Outputs: number of spans
+        """
+        events = self.traceEvents()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+class Span():
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.category, self.start, perf_counter_ns(), self.args)
+        return False
+
+
+class NoSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_SPAN = NoSpan()
+
+#----- The process-wide tracer
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+instant = tracer.instant
+
+if os.environ.get("CHESS_TRACE"):
+    tracer.enable()
+    atexit.register(tracer.export, os.environ["CHESS_TRACE"])
@@ -0,0 +1,164 @@
+import numpy as np
+from bank import BANK_SIZE
+from sequencing import sequence
+from legs import moveLegs
+
+class InvalidPlan(RuntimeError):
+    """
+    Raised when a move (or game) is rejected before any pulse is sent
+    """
+    pass
+
+################
+# Dry-run validation.
+#
+# A move is turned into its full segment list up front (the magnet-off hop to every
+# piece and the magnet-on route it's carried along), then checked with array operations:
+#   - bounds: every waypoint, rounded to whole motor steps like the real move, has to be
+#     strictly inside xLoBound/xHiBound/yLoBound/yHiBound
+#   - footprints: pieces are discs of pieceRadius. Along every magnet-on segment
+#     (sampled every SAMPLE inches) the carried piece must never overlap another piece.
+#     With the default radius (a quarter square) that's the router's own rule: never
+#     enter another piece's square.
+################
+
+SAMPLE = 0.05 #inches
+
+def planSegments(board, legs, occupied = None, start = None):
+    """
+    Segment list of a leg order, the way the pipeline would run it.
+    Inputs:
+        legs = list of (fromIndex, toIndex, symbol), in execution order
+        occupied = set of occupied squares and bank slots before the first leg (None = unknown)
+        start = (x, y) gantry position in inches (defaults to the current position)
+    Outputs:
+        segments = (n x 4) array of x0, y0, x1, y1 (inches)
+        magnet = bool array, True for magnet-on segments
+        leg = int array, index of the leg each segment belongs to
+    """
+    if start is None:
+        start = (board.currentX, board.currentY)
+    rows, magnet, legIndex = [], [], []
+    here = tuple(start)
+    for i, (fromIndex, toIndex, symbol) in enumerate(legs):
+        a = tuple(board.squareCoords[fromIndex + BANK_SIZE])
+        rows.append(here + a)
+        magnet.append(False)
+        legIndex.append(i)
+        route = board.router.fastest(fromIndex, toIndex, symbol, occupied)
+        for p, q in zip(route[:-1], route[1:]):
+            rows.append(tuple(p) + tuple(q))
+            magnet.append(True)
+            legIndex.append(i)
+        if occupied is not None:
+            occupied = (occupied - {fromIndex}) | {toIndex}
+        here = tuple(board.squareCoords[toIndex + BANK_SIZE])
+    return np.array(rows, dtype=float).reshape(-1, 4), np.array(magnet, dtype=bool), \
+        np.array(legIndex, dtype=int)
+
+
+def checkSegments(board, legs, segments, magnet, legIndex, occupied = None, pieceRadius = None):
+    """
+    Checks a segment list (see planSegments).
+    Outputs: list of problems (strings), empty if the plan is good
+    """
+    problems = []
+
+    #----- Bounds, on the whole-step positions the motors will actually reach
+    points = segments.reshape(-1, 2)
+    m = np.rint(board.coreXY((points[:, 0]*board.stepsPerInch, points[:, 1]*board.stepsPerInch)))
+    x, y = board.inverseCoreXY(m)*board.inchPerStep
+    outside = (x <= board.xLoBound) | (x >= board.xHiBound) | (y <= board.yLoBound) | (y >= board.yHiBound)
+    for k in np.flatnonzero(outside):
+        problems.append(f"leg {legIndex[k//2]} {legs[legIndex[k//2]][:2]}: waypoint " \
+                        f"({x[k]:.3f}, {y[k]:.3f}) is outside the boundaries")
+
+    #----- Footprints
+    if occupied is None:
+        return problems
+    if pieceRadius is None:
+        pieceRadius = board.squareSize/4
+    clearance = 2*pieceRadius - 1e-6
+    for i, (fromIndex, toIndex, symbol) in enumerate(legs):
+        others = np.array(sorted(occupied - {fromIndex}), dtype=int)
+        segs = segments[magnet & (legIndex == i)]
+        if len(others) and len(segs):
+            centers = board.squareCoords[others + BANK_SIZE]
+            length = np.hypot(segs[:, 2] - segs[:, 0], segs[:, 3] - segs[:, 1])
+            n = np.ceil(length/SAMPLE).astype(int) + 1
+            seg = np.repeat(np.arange(len(segs)), n)
+            t = (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n))/np.repeat(np.maximum(n - 1, 1), n)
+            px = segs[seg, 0] + (segs[seg, 2] - segs[seg, 0])*t
+            py = segs[seg, 1] + (segs[seg, 3] - segs[seg, 1])*t
+            d = np.hypot(px[:, None] - centers[None, :, 0], py[:, None] - centers[None, :, 1])
+            hit = np.flatnonzero((d < clearance).any(axis=0))
+            for k in hit:
+                problems.append(f"leg {i} {symbol} {fromIndex}->{toIndex}: runs into the piece on {others[k]}")
+        occupied = (occupied - {fromIndex}) | {toIndex}
+    return problems
+
+
+def validateLegs(board, legs, occupied = None, start = None, pieceRadius = None):
+    """
+    Dry-runs a leg order. Outputs: list of problems (empty if it's safe to run)
+    """
+    try:
+        segments, magnet, legIndex = planSegments(board, legs, occupied, start)
+    except RuntimeError as e:
+        return [str(e)]
+    return checkSegments(board, legs, segments, magnet, legIndex, occupied, pieceRadius)
+
+
+def validateMove(board, move, position, start = None, bank = None):
+    """
+    Dry-runs a chess move as movePiece would play it.
+    Inputs:
+        move = chess.Move
+        position = chess.Board before the move
+        bank = PieceBank to reserve slots in (defaults to a copy of board.bank)
+    Outputs: list of problems
+    """
+    return _validateMove(board, move, position, start, bank)[0]
+
+
+def _validateMove(board, move, position, start, bank):
+    if start is None:
+        start = (board.currentX, board.currentY)
+    if bank is None:
+        bank = board.bank.copy()
+    occupied = set(position.piece_map()) | set(bank.occupiedSlots())
+    try:
+        legs = moveLegs(position, move, bank)
+    except RuntimeError as e:
+        return [str(e)], []
+    legs, _, _ = sequence(board, legs, start)
+    return validateLegs(board, legs, occupied, start), legs
+
+
+def validateGame(board, game):
+    """
+    Dry-runs every move of a game from its starting position, with an empty piece bank.
+    Inputs:
+        game = chess.pgn.Game, or the path of a PGN file (its first game)
+    Outputs:
+        list of (ply, SAN, problems) for every move with problems
+    """
+    if isinstance(game, str):
+        import chess.pgn
+        with open(game) as f:
+            game = chess.pgn.read_game(f)
+    position = game.board()
+    bank = board.bank.copy()
+    bank.clear()
+    here = None
+    report = []
+    for ply, move in enumerate(game.mainline_moves()):
+        if here is None:
+            here = tuple(board.squareCoords[move.from_square + BANK_SIZE])
+        problems, legs = _validateMove(board, move, position, here, bank)
+        if problems:
+            report.append((ply, position.san(move), problems))
+        if legs:
+            here = tuple(board.squareCoords[legs[-1][1] + BANK_SIZE])
+        position.push(move)
+    return report